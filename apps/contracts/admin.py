@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Contract
+from .models import Contract, BillingRun, EmulatorRun, TrafficMetricRollup
 
 
 @admin.register(Contract)
@@ -68,3 +68,82 @@ class ContractAdmin(admin.ModelAdmin):
         """Оптимизация запросов с select_related"""
         qs = super().get_queryset(request)
         return qs.select_related('customer', 'tariff')
+
+
+@admin.register(BillingRun)
+class BillingRunAdmin(admin.ModelAdmin):
+    """Админ-панель для прогонов биллинга"""
+
+    list_display = (
+        'id',
+        'run_date',
+        'range_start',
+        'range_end',
+        'status',
+        'last_contract_id',
+        'charged',
+        'failed',
+        'started_at',
+        'finished_at',
+    )
+
+    list_filter = (
+        'status',
+        'run_date',
+    )
+
+    readonly_fields = (
+        'started_at',
+        'finished_at',
+        'updated_at',
+    )
+
+    ordering = ('-run_date', 'range_start')
+    date_hierarchy = 'run_date'
+    list_per_page = 50
+
+
+@admin.register(EmulatorRun)
+class EmulatorRunAdmin(admin.ModelAdmin):
+    """Админ-панель для прогонов эмулятора трафика"""
+
+    list_display = (
+        'id',
+        'status',
+        'ticks_done',
+        'ticks_total',
+        'throughput',
+        'created_by',
+        'created_at',
+        'finished_at',
+    )
+
+    list_filter = (
+        'status',
+    )
+
+    readonly_fields = (
+        'created_at',
+        'started_at',
+        'finished_at',
+        'updated_at',
+    )
+
+    ordering = ('-created_at',)
+    list_per_page = 50
+
+
+@admin.register(TrafficMetricRollup)
+class TrafficMetricRollupAdmin(admin.ModelAdmin):
+    """Сводки метрик трафика (только просмотр; пересчет — rebuild_traffic_rollups)"""
+
+    list_display = ('resolution', 'bucket', 'calls', 'sms', 'data_mb', 'topups', 'charges', 'samples')
+    list_filter = ('resolution',)
+    date_hierarchy = 'bucket'
+    ordering = ('-bucket',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -1,3 +1,5 @@
+import json
+
 from django import forms
 
 
@@ -15,3 +17,34 @@ class TrafficEmulatorForm(forms.Form):
     topup_amount = forms.DecimalField(min_value=1, max_value=10000, initial=500, decimal_places=2, label='Сумма автопополнения (с)')
 
     ticks = forms.IntegerField(min_value=1, max_value=100, initial=5, label='Количество тиков симуляции')
+
+    generator = forms.ChoiceField(
+        choices=[('random', 'Равномерный'), ('numpy', 'Нагрузочный (NumPy: Пуассон / лог-нормальное)')],
+        initial='random',
+        label='Генератор нагрузки',
+    )
+    seed = forms.IntegerField(
+        min_value=0,
+        required=False,
+        label='Seed',
+        help_text='Одинаковый seed на одних и тех же данных повторяет прогон',
+    )
+    data_sigma = forms.FloatField(min_value=0, max_value=5, initial=1.0, label='Разброс трафика (sigma)')
+    profiles = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={'rows': 3}),
+        label='Профили тарифов (JSON)',
+        help_text='{"Название или id тарифа": {"call_rate": 4, "sms_rate": 1, "data_mean": 200, "data_sigma": 1.2}}',
+    )
+
+    def clean_profiles(self):
+        raw = self.cleaned_data.get('profiles', '').strip()
+        if not raw:
+            return {}
+        try:
+            profiles = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise forms.ValidationError(f'Некорректный JSON: {e}')
+        if not isinstance(profiles, dict) or not all(isinstance(value, dict) for value in profiles.values()):
+            raise forms.ValidationError('Ожидается объект {тариф: {параметр: значение}}')
+        return profiles
@@ -0,0 +1,84 @@
+"""
+Воспроизводимый нагрузочный прогон эмулятора трафика.
+
+Пример:
+    python manage.py emulate_traffic --clients 100000 --ticks 10 --seed 42
+    python manage.py emulate_traffic --clients 50000 --ticks 20 --seed 7 --profiles profiles.json
+"""
+import json
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.contracts.services.traffic_emulator import GENERATORS, EmulatorConfig, TrafficEmulator
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный прогон эмулятора трафика (NumPy, seed, профили тарифов)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000, help='Договоров в такте')
+        parser.add_argument('--ticks', type=int, default=10, help='Количество тактов')
+        parser.add_argument('--seed', type=int, help='Seed генератора (повтор прогона на тех же данных)')
+        parser.add_argument('--generator', choices=GENERATORS, default='numpy', help='Генератор нагрузки')
+        parser.add_argument('--call-rate', type=int, default=2, help='Среднее звонков за такт')
+        parser.add_argument('--sms-rate', type=int, default=3, help='Среднее SMS за такт')
+        parser.add_argument('--data-rate', default='25', help='Средний трафик за такт, МБ')
+        parser.add_argument('--data-sigma', type=float, default=1.0, help='Sigma лог-нормального трафика')
+        parser.add_argument('--call-price', default='5', help='Цена звонка, с')
+        parser.add_argument('--sms-price', default='1', help='Цена SMS, с')
+        parser.add_argument('--data-price', default='0.5', help='Цена 1 МБ, с')
+        parser.add_argument('--topup-threshold', default='0', help='Порог автопополнения, с')
+        parser.add_argument('--topup-amount', default='500', help='Сумма автопополнения, с')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Договоров в транзакции (по умолчанию settings.EMULATOR_BATCH_SIZE)'
+        )
+        parser.add_argument('--profiles', help='JSON-файл профилей тарифов {тариф: {параметр: значение}}')
+        parser.add_argument('--per-row', action='store_true', help='Поштучная запись платежей')
+
+    def handle(self, *args, **options):
+        profiles = {}
+        if options['profiles']:
+            path = Path(options['profiles'])
+            if not path.is_file():
+                raise CommandError(f'Файл не найден: {path}')
+            try:
+                profiles = json.loads(path.read_text(encoding='utf-8'))
+            except json.JSONDecodeError as e:
+                raise CommandError(f'Некорректный JSON профилей: {e}')
+
+        config = EmulatorConfig(
+            clients=max(1, options['clients']),
+            call_rate=options['call_rate'],
+            sms_rate=options['sms_rate'],
+            data_rate=Decimal(options['data_rate']),
+            call_price=Decimal(options['call_price']),
+            sms_price=Decimal(options['sms_price']),
+            data_price=Decimal(options['data_price']),
+            topup_threshold=Decimal(options['topup_threshold']),
+            topup_amount=Decimal(options['topup_amount']),
+            ticks=max(1, options['ticks']),
+            seed=options['seed'],
+            generator=options['generator'],
+            data_sigma=options['data_sigma'],
+            batch_size=options['batch_size'],
+            profiles=profiles,
+        )
+
+        started = time.monotonic()
+        summary = TrafficEmulator(config).run(bulk=not options['per_row'])
+        elapsed = time.monotonic() - started
+        events = summary['total_calls'] + summary['total_sms']
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Звонки {summary['total_calls']}, SMS {summary['total_sms']}, трафик {summary['total_data']} МБ, "
+            f"пополнений {summary['topups']}, списания {summary['charges']} с"
+        ))
+        self.stdout.write(
+            f"Время: {elapsed:.3f} с, событий (звонки и SMS): {events}, "
+            f"{events / elapsed if elapsed > 0 else 0:.0f} событий/с"
+        )
@@ -0,0 +1,60 @@
+"""
+Загрузка CDR-файлов медиации.
+
+Пример:
+    python manage.py ingest_cdrs cdr_2025-11-30.csv cdr_2025-11-30_data.jsonl --batch-size 10000
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.contracts.services.cdr_ingest import ingest_cdr_file
+
+
+class Command(BaseCommand):
+    help = 'Потоковая загрузка и тарификация CDR (CSV/JSONL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Пути к CDR-файлам')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Формат файлов (по умолчанию — по расширению)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Размер пакета записей (по умолчанию settings.CDR_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--usage-date',
+            help='Дата потребления YYYY-MM-DD для выбора расчетного периода (по умолчанию — сегодня)'
+        )
+
+    def handle(self, *args, **options):
+        usage_date = None
+        if options['usage_date']:
+            try:
+                usage_date = date.fromisoformat(options['usage_date'])
+            except ValueError:
+                raise CommandError('Дата должна быть в формате YYYY-MM-DD')
+
+        for path in options['paths']:
+            try:
+                stats = ingest_cdr_file(
+                    path,
+                    fmt=options['format'],
+                    batch_size=options['batch_size'],
+                    usage_date=usage_date,
+                )
+            except FileNotFoundError:
+                raise CommandError(f'Файл не найден: {path}')
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{path}: записей {stats['records']}, протарифицировано {stats['rated']}, "
+                f"ошибочных {stats['invalid']}, неизвестных MSISDN {stats['unknown_msisdn']}, "
+                f"списаний {stats['charged_contracts']} на {stats['charges']} с"
+            ))
+            self.stdout.write(
+                f"Время: {stats['elapsed']} с, пропускная способность: {stats['records_per_sec']} записей/с"
+            )
@@ -0,0 +1,36 @@
+"""
+Пересчет сводок метрик трафика (TrafficMetricRollup) по сырым метрикам.
+
+Пример:
+    python manage.py rebuild_traffic_rollups
+    python manage.py rebuild_traffic_rollups --since 2025-11-30T00:00
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.contracts.services.traffic_metrics import rebuild_traffic_rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчет минутных, часовых и суточных сводок метрик трафика'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Начало периода YYYY-MM-DDTHH:MM (по умолчанию — с самой ранней хранящейся метрики)'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError('Время должно быть в формате YYYY-MM-DDTHH:MM')
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        stats = rebuild_traffic_rollups(since=since)
+        self.stdout.write(self.style.SUCCESS(
+            f"Строк сводки: по минутам {stats['minute']}, по часам {stats['hour']}, по суткам {stats['day']}"
+        ))
@@ -0,0 +1,191 @@
+# Generated by Django 5.0 on 2026-10-17 02:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contracts", "0003_merge_20251126_2237"),
+        ("payments", "0003_alter_payment_payment_method"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BillingRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "run_date",
+                    models.DateField(
+                        help_text="Дата, на которую списывается абонентская плата",
+                        verbose_name="Дата прогона",
+                    ),
+                ),
+                (
+                    "range_start",
+                    models.BigIntegerField(
+                        default=0, verbose_name="Начало диапазона id"
+                    ),
+                ),
+                (
+                    "range_end",
+                    models.BigIntegerField(
+                        blank=True,
+                        help_text="Не включается; пусто — без верхней границы",
+                        null=True,
+                        verbose_name="Конец диапазона id",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("running", "Выполняется"), ("completed", "Завершен")],
+                        default="running",
+                        max_length=20,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "last_contract_id",
+                    models.BigIntegerField(
+                        default=0, verbose_name="Последний обработанный договор"
+                    ),
+                ),
+                (
+                    "charged",
+                    models.PositiveIntegerField(default=0, verbose_name="Списано"),
+                ),
+                (
+                    "failed",
+                    models.PositiveIntegerField(default=0, verbose_name="Ошибок"),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата запуска"
+                    ),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Дата завершения"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+            ],
+            options={
+                "verbose_name": "Прогон биллинга",
+                "verbose_name_plural": "Прогоны биллинга",
+                "ordering": ["-run_date", "range_start"],
+            },
+        ),
+        migrations.CreateModel(
+            name="BillingRunItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.DateField(
+                        help_text="Дата списания (next_billing_date на момент списания)",
+                        verbose_name="Период",
+                    ),
+                ),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=10, verbose_name="Сумма (с)"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата создания"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Списание абонплаты",
+                "verbose_name_plural": "Списания абонплаты",
+                "ordering": ["-period"],
+            },
+        ),
+        migrations.AlterField(
+            model_name="trafficmetric",
+            name="source",
+            field=models.CharField(
+                choices=[
+                    ("emulator", "Эмулятор"),
+                    ("phone", "Телефон"),
+                    ("import", "Импорт"),
+                ],
+                default="emulator",
+                max_length=20,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="billingrun",
+            constraint=models.UniqueConstraint(
+                fields=("run_date", "range_start"), name="unique_billing_run_partition"
+            ),
+        ),
+        migrations.AddField(
+            model_name="billingrunitem",
+            name="contract",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="billing_items",
+                to="contracts.contract",
+                verbose_name="Договор",
+            ),
+        ),
+        migrations.AddField(
+            model_name="billingrunitem",
+            name="payment",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="payments.payment",
+                verbose_name="Платеж",
+            ),
+        ),
+        migrations.AddField(
+            model_name="billingrunitem",
+            name="run",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="items",
+                to="contracts.billingrun",
+                verbose_name="Прогон",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="billingrunitem",
+            constraint=models.UniqueConstraint(
+                fields=("contract", "period"), name="unique_billing_period"
+            ),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.0 on 2026-10-17 02:10
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contracts", "0004_billingrun"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UsageRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("period_start", models.DateField(verbose_name="Начало периода")),
+                ("period_end", models.DateField(verbose_name="Конец периода")),
+                (
+                    "minutes",
+                    models.PositiveIntegerField(default=0, verbose_name="Минуты"),
+                ),
+                ("sms", models.PositiveIntegerField(default=0, verbose_name="SMS")),
+                (
+                    "data_mb",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        max_digits=14,
+                        verbose_name="Интернет (МБ)",
+                    ),
+                ),
+                (
+                    "is_closed",
+                    models.BooleanField(default=False, verbose_name="Период закрыт"),
+                ),
+                (
+                    "overage_cost",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        help_text="Заполняется при закрытии периода",
+                        max_digits=12,
+                        null=True,
+                        verbose_name="Стоимость превышений (с)",
+                    ),
+                ),
+                (
+                    "closed_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Дата закрытия"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                (
+                    "contract",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="usage_records",
+                        to="contracts.contract",
+                        verbose_name="Договор",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Потребление за период",
+                "verbose_name_plural": "Потребление за периоды",
+                "ordering": ["-period_start"],
+                "indexes": [
+                    models.Index(
+                        fields=["contract", "-period_start"],
+                        name="contracts_u_contrac_069456_idx",
+                    ),
+                    models.Index(
+                        fields=["is_closed", "period_end"],
+                        name="contracts_u_is_clos_511d0c_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="usagerecord",
+            constraint=models.UniqueConstraint(
+                fields=("contract", "period_start"), name="unique_usage_period"
+            ),
+        ),
+    ]
@@ -0,0 +1,151 @@
+# Generated by Django 5.0 on 2026-10-17 02:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contracts", "0005_usagerecord"),
+        ("payments", "0003_alter_payment_payment_method"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contract",
+            name="journal_seq",
+            field=models.PositiveBigIntegerField(
+                default=0, editable=False, verbose_name="Номер записи журнала баланса"
+            ),
+        ),
+        migrations.CreateModel(
+            name="BalanceSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("period", models.DateField(verbose_name="Месяц")),
+                (
+                    "balance",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=10, verbose_name="Баланс (с)"
+                    ),
+                ),
+                (
+                    "last_seq",
+                    models.PositiveBigIntegerField(
+                        verbose_name="Номер последней записи журнала"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата создания"
+                    ),
+                ),
+                (
+                    "contract",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balance_snapshots",
+                        to="contracts.contract",
+                        verbose_name="Договор",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Снимок баланса",
+                "verbose_name_plural": "Снимки баланса",
+                "ordering": ["-period"],
+            },
+        ),
+        migrations.CreateModel(
+            name="BalanceJournalEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("seq", models.PositiveBigIntegerField(verbose_name="Номер записи")),
+                (
+                    "delta",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=12, verbose_name="Изменение (с)"
+                    ),
+                ),
+                (
+                    "balance_after",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=10, verbose_name="Баланс после (с)"
+                    ),
+                ),
+                (
+                    "description",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="Описание"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Дата операции"
+                    ),
+                ),
+                (
+                    "contract",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balance_journal",
+                        to="contracts.contract",
+                        verbose_name="Договор",
+                    ),
+                ),
+                (
+                    "payment",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="payments.payment",
+                        verbose_name="Платеж",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Запись журнала баланса",
+                "verbose_name_plural": "Журнал баланса",
+                "ordering": ["contract", "seq"],
+                "indexes": [
+                    models.Index(
+                        fields=["contract", "created_at"],
+                        name="contracts_b_contrac_4e338b_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="balancejournalentry",
+            constraint=models.UniqueConstraint(
+                fields=("contract", "seq"), name="unique_balance_journal_seq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="balancesnapshot",
+            constraint=models.UniqueConstraint(
+                fields=("contract", "period"), name="unique_balance_snapshot_period"
+            ),
+        ),
+    ]
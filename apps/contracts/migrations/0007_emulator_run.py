@@ -0,0 +1,103 @@
+# Generated by Django 5.0 on 2026-10-17 02:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contracts", "0006_balance_journal"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmulatorRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("config", models.JSONField(verbose_name="Параметры")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "В очереди"),
+                            ("running", "Выполняется"),
+                            ("completed", "Завершен"),
+                            ("cancelled", "Отменен"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "ticks_total",
+                    models.PositiveIntegerField(verbose_name="Тактов всего"),
+                ),
+                (
+                    "ticks_done",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Тактов выполнено"
+                    ),
+                ),
+                ("throughput", models.FloatField(default=0, verbose_name="Тактов/с")),
+                (
+                    "cancel_requested",
+                    models.BooleanField(default=False, verbose_name="Запрошена отмена"),
+                ),
+                (
+                    "summary",
+                    models.JSONField(blank=True, default=dict, verbose_name="Сводка"),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Ошибка")),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата создания"
+                    ),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Дата запуска"
+                    ),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Дата завершения"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="emulator_runs",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Запустил",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Прогон эмулятора",
+                "verbose_name_plural": "Прогоны эмулятора",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 5.0 on 2026-10-17 02:54
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
+
+
+def fill_rollups(apps, schema_editor):
+    """Начальное заполнение сводок по существующим метрикам (как rebuild_traffic_rollups)."""
+    TrafficMetric = apps.get_model("contracts", "TrafficMetric")
+    TrafficMetricRollup = apps.get_model("contracts", "TrafficMetricRollup")
+    fields = ("calls", "sms", "data_mb", "topups", "charges")
+    for resolution, trunc in (("minute", TruncMinute), ("hour", TruncHour), ("day", TruncDay)):
+        rows = (
+            TrafficMetric.objects.annotate(bucket=trunc("timestamp"))
+            .order_by()
+            .values("bucket")
+            .annotate(samples=Count("id"), **{f"total_{name}": Sum(name) for name in fields})
+        )
+        TrafficMetricRollup.objects.bulk_create(
+            [
+                TrafficMetricRollup(
+                    resolution=resolution,
+                    bucket=row["bucket"],
+                    samples=row["samples"],
+                    **{name: row[f"total_{name}"] or 0 for name in fields},
+                )
+                for row in rows
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contracts", "0007_emulator_run"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrafficMetricRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "resolution",
+                    models.CharField(
+                        choices=[
+                            ("minute", "Минута"),
+                            ("hour", "Час"),
+                            ("day", "Сутки"),
+                        ],
+                        max_length=10,
+                        verbose_name="Разрешение",
+                    ),
+                ),
+                ("bucket", models.DateTimeField(verbose_name="Начало интервала")),
+                ("calls", models.PositiveIntegerField(default=0)),
+                ("sms", models.PositiveIntegerField(default=0)),
+                (
+                    "data_mb",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                ("topups", models.PositiveIntegerField(default=0)),
+                (
+                    "charges",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                (
+                    "samples",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Метрик в интервале"
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Сводка метрик трафика",
+                "verbose_name_plural": "Сводки метрик трафика",
+                "ordering": ["resolution", "bucket"],
+            },
+        ),
+        migrations.AlterField(
+            model_name="trafficmetric",
+            name="timestamp",
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AddConstraint(
+            model_name="trafficmetricrollup",
+            constraint=models.UniqueConstraint(
+                fields=("resolution", "bucket"), name="unique_traffic_metric_rollup"
+            ),
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
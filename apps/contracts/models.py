@@ -1,6 +1,7 @@
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from decimal import Decimal
 import uuid
 
@@ -91,6 +92,13 @@ class Contract(models.Model):
         help_text='Текущий баланс абонента'
     )
 
+    # Номер последней записи журнала баланса (BalanceJournalEntry.seq)
+    journal_seq = models.PositiveBigIntegerField(
+        'Номер записи журнала баланса',
+        default=0,
+        editable=False
+    )
+
     # Общая стоимость (сумма всех платежей - списаний)
     total_cost = models.DecimalField(
         'Общая стоимость (с)',
@@ -206,7 +214,7 @@ class Contract(models.Model):
         self.status = 'suspended'
         if reason:
             self.notes = f"{self.notes or ''}\nПриостановлен: {reason}".strip()
-        self.save()
+        self.save(update_fields=['status', 'notes', 'updated_at'])
 
         # Приостанавливаем SIM
         if hasattr(self, 'sim_card'):
@@ -224,7 +232,7 @@ class Contract(models.Model):
             raise ValidationError(f'Невозможно возобновить договор со статусом "{self.get_status_display()}"')
 
         self.status = 'active'
-        self.save()
+        self.save(update_fields=['status', 'updated_at'])
 
         # Возобновляем SIM
         if hasattr(self, 'sim_card'):
@@ -247,56 +255,143 @@ class Contract(models.Model):
         if reason_text:
             note = f"Расторгнут: {reason_text}"
             self.notes = f"{self.notes or ''}\n{note}".strip()
-        self.save()
+        self.save(update_fields=['status', 'termination_date', 'notes', 'updated_at'])
 
         # Деактивируем SIM
         if hasattr(self, 'sim_card'):
             self.sim_card.deactivate()
 
-    def add_balance(self, amount, description='Пополнение баланса'):
+    def journal_entry(self, delta, payment=None, description=''):
+        """
+        Запись журнала баланса для уже примененного в памяти изменения.
+
+        Увеличивает journal_seq договора; сохранить запись и договор
+        (или сдвинуть journal_seq в UPDATE) должен вызывающий код.
+
+        Args:
+            delta: изменение баланса (со знаком)
+            payment: платеж, вызвавший изменение
+            description: описание операции
+
+        Returns:
+            BalanceJournalEntry: несохраненная запись
+        """
+        self.journal_seq += 1
+        return BalanceJournalEntry(
+            contract=self,
+            seq=self.journal_seq,
+            delta=delta,
+            balance_after=self.balance,
+            payment=payment,
+            description=(description or '')[:255],
+        )
+
+    def apply_balance_delta(self, delta, payment=None, description=''):
+        """
+        Атомарное изменение баланса.
+
+        Строка договора блокируется и читается одним запросом
+        (SELECT ... FOR UPDATE), новые значения пишутся одним UPDATE.
+        Списание (delta < 0) увеличивает total_cost. Поля баланса,
+        статус и journal_seq объекта обновляются из заблокированной строки,
+        поэтому устаревший в памяти баланс не перезаписывает чужие изменения.
+
+        Вызывается внутри transaction.atomic(); запись журнала сохраняет
+        вызывающий код (платеж к этому моменту может быть еще не сохранен).
+
+        Args:
+            delta: изменение баланса (со знаком)
+            payment: платеж, вызвавший изменение
+            description: описание операции
+
+        Returns:
+            BalanceJournalEntry: несохраненная запись журнала
+        """
+        from django.utils import timezone
+
+        delta = Decimal(str(delta))
+        balance, total_cost, journal_seq, status = (
+            Contract.objects.select_for_update()
+            .values_list('balance', 'total_cost', 'journal_seq', 'status')
+            .get(pk=self.pk)
+        )
+
+        self._balance_before_change = balance
+        self.balance = balance + delta
+        self.total_cost = total_cost - delta if delta < 0 else total_cost
+        self.journal_seq = journal_seq
+        self.status = status
+        entry = self.journal_entry(delta, payment, description)
+
+        Contract.objects.filter(pk=self.pk).update(
+            balance=self.balance,
+            total_cost=self.total_cost,
+            journal_seq=self.journal_seq,
+            updated_at=timezone.now(),
+        )
+        return entry
+
+    def handle_balance_change(self):
+        """
+        Побочные эффекты изменения баланса после apply_balance_delta():
+        возобновление при пополнении, предупреждение о низком балансе
+        и приостановка при минусе после списания.
+        """
+        from apps.payments.notifications import notify_balance_warning
+
+        old_balance = self._balance_before_change
+
+        if self.balance > old_balance:
+            # Если баланс стал положительным и договор был приостановлен, возобновляем его
+            if self.balance > 0 and self.status == 'suspended':
+                self.resume()
+            return
+
+        # Предупреждаем о низком балансе (если баланс стал меньше 100 и был выше)
+        if self.balance < 100 and old_balance >= 100:
+            notify_balance_warning(self)
+
+        # Если баланс стал отрицательным, приостанавливаем договор
+        if self.balance < 0 and self.status == 'active':
+            self.suspend(reason=f'Недостаточно средств на балансе (баланс: {self.balance}с)')
+
+    def add_balance(self, amount, description='Пополнение баланса', payment=None):
         """
         Пополнение баланса.
 
         Args:
             amount: сумма пополнения
             description: описание операции
+            payment: платеж, вызвавший пополнение
         """
+        from django.db import transaction
+
         if amount <= 0:
             raise ValidationError('Сумма пополнения должна быть положительной')
 
-        was_suspended = self.status == 'suspended'
-        self.balance += Decimal(str(amount))
-        self.save()
+        with transaction.atomic():
+            self.apply_balance_delta(amount, payment, description).save()
 
-        # Если баланс стал положительным и договор был приостановлен, возобновляем его
-        if self.balance > 0 and was_suspended:
-            self.resume()
+        self.handle_balance_change()
 
-    def deduct_balance(self, amount, description='Списание'):
+    def deduct_balance(self, amount, description='Списание', payment=None):
         """
         Списание с баланса.
 
         Args:
             amount: сумма списания
             description: описание операции
+            payment: платеж, вызвавший списание
         """
-        from apps.payments.notifications import notify_balance_warning
+        from django.db import transaction
 
         if amount <= 0:
             raise ValidationError('Сумма списания должна быть положительной')
 
-        old_balance = self.balance
-        self.balance -= Decimal(str(amount))
-        self.total_cost += Decimal(str(amount))
-        self.save()
-
-        # Предупреждаем о низком балансе (если баланс стал меньше 100 и был выше)
-        if self.balance < 100 and old_balance >= 100:
-            notify_balance_warning(self)
+        with transaction.atomic():
+            self.apply_balance_delta(-Decimal(str(amount)), payment, description).save()
 
-        # Если баланс стал отрицательным, приостанавливаем договор
-        if self.balance < 0 and self.status == 'active':
-            self.suspend(reason=f'Недостаточно средств на балансе (баланс: {self.balance}с)')
+        self.handle_balance_change()
 
     def charge_monthly_fee(self, billing_date=None, note=''):
         """Списание ежемесячной абонентской платы"""
@@ -351,7 +446,7 @@ class TrafficMetric(models.Model):
         ('import', 'Импорт'),
     ]
 
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
     calls = models.PositiveIntegerField(default=0)
     sms = models.PositiveIntegerField(default=0)
     data_mb = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
@@ -366,3 +461,513 @@ class TrafficMetric(models.Model):
 
     def __str__(self):
         return f"{self.timestamp:%Y-%m-%d %H:%M} — {self.calls} вызовов, {self.sms} SMS"
+
+    def save(self, *args, **kwargs):
+        """
+        Новая метрика сразу учитывается в сводках (минута, час, сутки)
+        в той же транзакции. Изменение сохраненной метрики в сводки
+        не переносится — его исправляет rebuild_traffic_rollups.
+        """
+        from django.db import transaction
+        from apps.contracts.services.traffic_metrics import record_metric_rollups
+
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            record_metric_rollups([self])
+
+
+class TrafficMetricRollup(models.Model):
+    """
+    Сводка метрик трафика за минуту, час или сутки.
+
+    Графики за длинный период читают сводку нужного разрешения вместо
+    сырых метрик: 30 дней по часам — 720 строк. Сырые метрики и мелкие
+    сводки удаляются по сроку хранения (prune_traffic_metrics).
+    """
+
+    RESOLUTION_CHOICES = [
+        ('minute', 'Минута'),
+        ('hour', 'Час'),
+        ('day', 'Сутки'),
+    ]
+
+    resolution = models.CharField('Разрешение', max_length=10, choices=RESOLUTION_CHOICES)
+    bucket = models.DateTimeField('Начало интервала')
+    calls = models.PositiveIntegerField(default=0)
+    sms = models.PositiveIntegerField(default=0)
+    data_mb = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    topups = models.PositiveIntegerField(default=0)
+    charges = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    samples = models.PositiveIntegerField('Метрик в интервале', default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['resolution', 'bucket']
+        verbose_name = 'Сводка метрик трафика'
+        verbose_name_plural = 'Сводки метрик трафика'
+        constraints = [
+            models.UniqueConstraint(fields=['resolution', 'bucket'], name='unique_traffic_metric_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_resolution_display()} {self.bucket:%Y-%m-%d %H:%M}: {self.calls} вызовов, {self.sms} SMS"
+
+
+class EmulatorRun(models.Model):
+    """
+    Фоновый прогон эмулятора трафика (задача run_traffic_emulator).
+
+    Хранит параметры, прогресс по тактам и итоговую сводку. Прогресс
+    пишется одним UPDATE на такт; этот же UPDATE проверяет флаг отмены,
+    поэтому отмена срабатывает на следующем такте.
+    """
+
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('completed', 'Завершен'),
+        ('cancelled', 'Отменен'),
+        ('failed', 'Ошибка'),
+    ]
+    FINAL_STATUSES = ('completed', 'cancelled', 'failed')
+
+    config = models.JSONField('Параметры')
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='queued'
+    )
+    ticks_total = models.PositiveIntegerField('Тактов всего')
+    ticks_done = models.PositiveIntegerField('Тактов выполнено', default=0)
+    # Тактов в секунду с начала прогона
+    throughput = models.FloatField('Тактов/с', default=0)
+    cancel_requested = models.BooleanField('Запрошена отмена', default=False)
+    summary = models.JSONField('Сводка', default=dict, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+
+    created_by = models.ForeignKey(
+        'users.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='emulator_runs',
+        verbose_name='Запустил'
+    )
+    created_at = models.DateTimeField(
+        'Дата создания',
+        auto_now_add=True
+    )
+    started_at = models.DateTimeField(
+        'Дата запуска',
+        null=True,
+        blank=True
+    )
+    finished_at = models.DateTimeField(
+        'Дата завершения',
+        null=True,
+        blank=True
+    )
+    updated_at = models.DateTimeField(
+        'Дата обновления',
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = 'Прогон эмулятора'
+        verbose_name_plural = 'Прогоны эмулятора'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Эмулятор #{self.pk}: {self.ticks_done}/{self.ticks_total} ({self.get_status_display()})"
+
+    def as_progress(self):
+        """Состояние прогона для страницы эмулятора (JSON)."""
+        return {
+            'id': self.pk,
+            'status': self.status,
+            'status_display': self.get_status_display(),
+            'ticks_done': self.ticks_done,
+            'ticks_total': self.ticks_total,
+            'throughput': self.throughput,
+            'cancel_requested': self.cancel_requested,
+            'summary': self.summary,
+            'error': self.error,
+            'finished': self.status in self.FINAL_STATUSES,
+        }
+
+
+class BillingRun(models.Model):
+    """
+    Прогон биллинга абонентской платы за дату (одна партиция должников).
+
+    Хранит контрольную точку (последний обработанный id договора), чтобы
+    перезапущенный прогон продолжал с места остановки, а повторный запуск
+    завершенного прогона обходился одним индексным запросом.
+    """
+
+    STATUS_CHOICES = [
+        ('running', 'Выполняется'),
+        ('completed', 'Завершен'),
+    ]
+
+    run_date = models.DateField(
+        'Дата прогона',
+        help_text='Дата, на которую списывается абонентская плата'
+    )
+
+    # Диапазон id договоров партиции: [range_start, range_end)
+    range_start = models.BigIntegerField(
+        'Начало диапазона id',
+        default=0
+    )
+    range_end = models.BigIntegerField(
+        'Конец диапазона id',
+        null=True,
+        blank=True,
+        help_text='Не включается; пусто — без верхней границы'
+    )
+
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='running'
+    )
+
+    # Контрольная точка: все договоры с id <= last_contract_id обработаны
+    last_contract_id = models.BigIntegerField(
+        'Последний обработанный договор',
+        default=0
+    )
+
+    charged = models.PositiveIntegerField('Списано', default=0)
+    failed = models.PositiveIntegerField('Ошибок', default=0)
+
+    started_at = models.DateTimeField(
+        'Дата запуска',
+        auto_now_add=True
+    )
+    finished_at = models.DateTimeField(
+        'Дата завершения',
+        null=True,
+        blank=True
+    )
+    updated_at = models.DateTimeField(
+        'Дата обновления',
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = 'Прогон биллинга'
+        verbose_name_plural = 'Прогоны биллинга'
+        ordering = ['-run_date', 'range_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['run_date', 'range_start'],
+                name='unique_billing_run_partition'
+            )
+        ]
+
+    def __str__(self):
+        return f"Биллинг {self.run_date:%d.%m.%Y} [{self.range_start}, {self.range_end or '∞'}) — {self.get_status_display()}"
+
+    def checkpoint(self, last_contract_id, charged=0, failed=0):
+        """Фиксирует прогресс после обработки чанка."""
+        from django.db.models import F
+        from django.utils import timezone
+
+        BillingRun.objects.filter(pk=self.pk).update(
+            last_contract_id=last_contract_id,
+            charged=F('charged') + charged,
+            failed=F('failed') + failed,
+            updated_at=timezone.now(),
+        )
+        self.last_contract_id = last_contract_id
+        self.charged += charged
+        self.failed += failed
+
+    def complete(self):
+        """Отмечает прогон завершенным."""
+        from django.utils import timezone
+
+        self.refresh_from_db(fields=['charged', 'failed', 'last_contract_id'])
+        self.status = 'completed'
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'finished_at', 'updated_at'])
+
+    def as_result(self):
+        """Итог прогона в формате ответа charge_monthly_fees."""
+        return {
+            'charged': self.charged,
+            'failed': self.failed,
+            'total': self.charged + self.failed,
+        }
+
+
+class BillingRunItem(models.Model):
+    """
+    Запись журнала биллинга: абонплата за период списана с договора.
+
+    Уникальный ключ (договор, период) гарантирует, что один и тот же
+    период не будет списан дважды, даже при повторном запуске прогона.
+    """
+
+    run = models.ForeignKey(
+        BillingRun,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='items',
+        verbose_name='Прогон'
+    )
+
+    contract = models.ForeignKey(
+        Contract,
+        on_delete=models.CASCADE,
+        related_name='billing_items',
+        verbose_name='Договор'
+    )
+
+    period = models.DateField(
+        'Период',
+        help_text='Дата списания (next_billing_date на момент списания)'
+    )
+
+    payment = models.ForeignKey(
+        'payments.Payment',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Платеж'
+    )
+
+    amount = models.DecimalField(
+        'Сумма (с)',
+        max_digits=10,
+        decimal_places=2
+    )
+
+    created_at = models.DateTimeField(
+        'Дата создания',
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = 'Списание абонплаты'
+        verbose_name_plural = 'Списания абонплаты'
+        ordering = ['-period']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['contract', 'period'],
+                name='unique_billing_period'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.contract_id} за {self.period:%d.%m.%Y}: {self.amount}с"
+
+
+class UsageRecord(models.Model):
+    """
+    Счетчики потребления договора за расчетный период.
+
+    Обновляются инкрементально (F()-выражениями) на каждое событие,
+    поэтому превышение лимитов считается по счетчикам, а не пересчетом
+    сырых событий. После окончания периода строка закрывается: в нее
+    записывается итоговая стоимость превышений, и история потребления
+    читается по одной компактной строке на период.
+    """
+
+    contract = models.ForeignKey(
+        Contract,
+        on_delete=models.CASCADE,
+        related_name='usage_records',
+        verbose_name='Договор'
+    )
+
+    # Расчетный период: [period_start, period_end)
+    period_start = models.DateField('Начало периода')
+    period_end = models.DateField('Конец периода')
+
+    minutes = models.PositiveIntegerField('Минуты', default=0)
+    sms = models.PositiveIntegerField('SMS', default=0)
+    data_mb = models.DecimalField(
+        'Интернет (МБ)',
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+
+    # Закрытие периода
+    is_closed = models.BooleanField('Период закрыт', default=False)
+    overage_cost = models.DecimalField(
+        'Стоимость превышений (с)',
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text='Заполняется при закрытии периода'
+    )
+    closed_at = models.DateTimeField(
+        'Дата закрытия',
+        null=True,
+        blank=True
+    )
+
+    updated_at = models.DateTimeField(
+        'Дата обновления',
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = 'Потребление за период'
+        verbose_name_plural = 'Потребление за периоды'
+        ordering = ['-period_start']
+        indexes = [
+            models.Index(fields=['contract', '-period_start']),
+            models.Index(fields=['is_closed', 'period_end']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['contract', 'period_start'],
+                name='unique_usage_period'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.contract_id} {self.period_start:%d.%m.%Y}–{self.period_end:%d.%m.%Y}: {self.minutes} мин, {self.sms} SMS, {self.data_mb} МБ"
+
+    @property
+    def data_gb(self):
+        """Потребленный интернет-трафик в ГБ"""
+        return self.data_mb / Decimal('1024')
+
+    def calculate_overage_cost(self, tariff=None):
+        """Стоимость превышений лимитов тарифа по текущим счетчикам"""
+        tariff = tariff or self.contract.tariff
+        return tariff.calculate_overage_cost(
+            minutes_used=self.minutes,
+            sms_used=self.sms,
+            data_gb_used=self.data_gb,
+        )
+
+
+class BalanceJournalEntry(models.Model):
+    """
+    Журнал изменений баланса договора (только добавление).
+
+    Каждая запись хранит изменение, баланс после него и порядковый номер
+    в пределах договора. Баланс на любой момент — balance_after последней
+    записи до этого момента, без пересчета истории платежей.
+    """
+
+    contract = models.ForeignKey(
+        Contract,
+        on_delete=models.CASCADE,
+        related_name='balance_journal',
+        verbose_name='Договор'
+    )
+
+    # Порядковый номер записи в пределах договора (1, 2, 3, ...)
+    seq = models.PositiveBigIntegerField('Номер записи')
+
+    delta = models.DecimalField(
+        'Изменение (с)',
+        max_digits=12,
+        decimal_places=2
+    )
+
+    balance_after = models.DecimalField(
+        'Баланс после (с)',
+        max_digits=10,
+        decimal_places=2
+    )
+
+    payment = models.ForeignKey(
+        'payments.Payment',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Платеж'
+    )
+
+    description = models.CharField(
+        'Описание',
+        max_length=255,
+        blank=True
+    )
+
+    created_at = models.DateTimeField(
+        'Дата операции',
+        default=timezone.now
+    )
+
+    class Meta:
+        verbose_name = 'Запись журнала баланса'
+        verbose_name_plural = 'Журнал баланса'
+        ordering = ['contract', 'seq']
+        indexes = [
+            models.Index(fields=['contract', 'created_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['contract', 'seq'],
+                name='unique_balance_journal_seq'
+            )
+        ]
+
+    def __str__(self):
+        sign = "+" if self.delta > 0 else ""
+        return f"{self.contract_id} #{self.seq}: {sign}{self.delta}с -> {self.balance_after}с"
+
+
+class BalanceSnapshot(models.Model):
+    """
+    Снимок баланса договора на начало месяца.
+
+    Фиксирует баланс и номер последней записи журнала до начала месяца,
+    поэтому баланс на дату и выписка читают один снимок и короткий хвост
+    журнала после него.
+    """
+
+    contract = models.ForeignKey(
+        Contract,
+        on_delete=models.CASCADE,
+        related_name='balance_snapshots',
+        verbose_name='Договор'
+    )
+
+    # Первый день месяца; снимок отражает баланс на начало этого дня
+    period = models.DateField('Месяц')
+
+    balance = models.DecimalField(
+        'Баланс (с)',
+        max_digits=10,
+        decimal_places=2
+    )
+
+    last_seq = models.PositiveBigIntegerField('Номер последней записи журнала')
+
+    created_at = models.DateTimeField(
+        'Дата создания',
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = 'Снимок баланса'
+        verbose_name_plural = 'Снимки баланса'
+        ordering = ['-period']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['contract', 'period'],
+                name='unique_balance_snapshot_period'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.contract_id} на {self.period:%d.%m.%Y}: {self.balance}с"
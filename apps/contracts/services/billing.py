@@ -0,0 +1,551 @@
+"""
+Пакетное списание абонентской платы.
+
+Поштучный путь (Contract.charge_monthly_fee) делает несколько запросов
+на договор: блокировка и UPDATE договора, INSERT платежа и записи журнала,
+уведомления, сдвиг даты списания. Здесь должники обрабатываются чанками:
+платежи создаются через bulk_create, баланс, total_cost и дата следующего
+списания меняются set-based UPDATE с F()-выражениями, а balance_after
+вычисляется в том же проходе по заблокированным строкам.
+
+Каждое списание фиксируется в журнале BillingRunItem под уникальным ключом
+(договор, период), а прогресс прогона — контрольной точкой BillingRun
+в той же транзакции, что и сам чанк. Изменения баланса пишутся в журнал
+баланса (BalanceJournalEntry) тем же bulk_create-проходом.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from apps.contracts.models import BalanceJournalEntry, BillingRun, BillingRunItem, Contract
+from apps.contracts.services.suspension import suspend_contracts_bulk
+from apps.payments.aggregates import record_payments
+from apps.payments.models import Payment
+
+logger = logging.getLogger(__name__)
+
+LOW_BALANCE_THRESHOLD = Decimal('100')
+
+# Ограничение DecimalField(max_digits=10, decimal_places=2) для баланса
+MAX_BALANCE = Decimal('99999999.99')
+
+
+def get_billing_chunk_size():
+    """Размер чанка договоров для одного пакетного прохода."""
+    return max(1, int(getattr(settings, 'BILLING_CHUNK_SIZE', 500)))
+
+
+def get_due_contracts(today):
+    """Договоры, по которым подошла дата списания абонплаты."""
+    return Contract.objects.filter(status='active', next_billing_date__lte=today)
+
+
+def get_due_contracts_in_range(today, id_from=None, id_to=None):
+    """Должники в диапазоне id [id_from, id_to) — одна партиция биллинга."""
+    queryset = get_due_contracts(today)
+    if id_from is not None:
+        queryset = queryset.filter(id__gte=id_from)
+    if id_to is not None:
+        queryset = queryset.filter(id__lt=id_to)
+    return queryset
+
+
+def iter_due_contract_ids(today, chunk_size=None, id_from=None, id_to=None):
+    """
+    Возвращает id должников чанками (keyset-пагинация по id).
+
+    Пагинация по id, а не по OFFSET: списанные договоры выпадают
+    из выборки, и смещение поплыло бы.
+    """
+    chunk_size = chunk_size or get_billing_chunk_size()
+    queryset = get_due_contracts_in_range(today, id_from, id_to)
+    last_id = 0
+    while True:
+        ids = list(
+            queryset
+            .filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def _charge_description(tariff):
+    return f'Абонентская плата за тариф "{tariff.name}"'
+
+
+def charge_chunk_bulk(contract_ids, today, run=None):
+    """
+    Пакетное списание абонплаты для чанка договоров.
+
+    Если передан прогон, в той же транзакции пишутся записи журнала
+    BillingRunItem и сдвигается контрольная точка прогона.
+
+    Returns:
+        dict: {
+            'charged': список списанных договоров (с обновленным балансом),
+            'skipped': число договоров с нулевой абонплатой,
+            'fallback': id договоров для поштучного пути,
+        }
+    """
+    now = timezone.now()
+    charged = []
+    fallback = []
+    skipped = 0
+
+    with transaction.atomic():
+        contracts = list(
+            Contract.objects.select_for_update(of=('self',))
+            .select_related('tariff', 'customer', 'sim_card')
+            .filter(id__in=contract_ids, status='active', next_billing_date__lte=today)
+            .order_by('id')
+        )
+        already_billed = set(
+            BillingRunItem.objects.filter(
+                contract_id__in=[contract.id for contract in contracts],
+                period__in={contract.next_billing_date for contract in contracts},
+            ).values_list('contract_id', 'period')
+        )
+
+        payments = []
+        items = []
+        entries = []
+        groups = defaultdict(list)
+        for contract in contracts:
+            fee = contract.tariff.monthly_fee
+            if fee <= 0:
+                skipped += 1
+                continue
+
+            if (contract.id, contract.next_billing_date) in already_billed:
+                logger.warning(
+                    'Период %s по договору %s уже списан, пропускаем',
+                    contract.next_billing_date, contract.number,
+                )
+                continue
+
+            new_balance = contract.balance - fee
+            if abs(new_balance) > MAX_BALANCE:
+                fallback.append(contract.id)
+                continue
+
+            due_date = contract.next_billing_date or today
+            next_billing_date = due_date + relativedelta(months=1)
+            description = _charge_description(contract.tariff)
+            payment = Payment(
+                contract=contract,
+                transaction_type='charge',
+                amount=fee,
+                status='success',
+                payment_method='system',
+                description=description,
+                balance_after=new_balance,
+                processed_at=now,
+            )
+            payments.append(payment)
+            items.append(BillingRunItem(
+                run=run,
+                contract=contract,
+                period=due_date,
+                payment=payment,
+                amount=fee,
+            ))
+            groups[(fee, next_billing_date)].append(contract.id)
+
+            contract._balance_before_charge = contract.balance
+            contract.balance = new_balance
+            contract.total_cost += fee
+            contract.next_billing_date = next_billing_date
+            entries.append(contract.journal_entry(-fee, payment, description))
+            charged.append(contract)
+
+        # bulk_create не вызывает Payment.save(), поэтому process() не срабатывает:
+        # баланс меняется только UPDATE ниже
+        Payment.objects.bulk_create(payments, batch_size=get_billing_chunk_size())
+        BillingRunItem.objects.bulk_create(items, batch_size=get_billing_chunk_size())
+        BalanceJournalEntry.objects.bulk_create(entries, batch_size=get_billing_chunk_size())
+        record_payments(payments)
+
+        for (fee, next_billing_date), ids in groups.items():
+            Contract.objects.filter(id__in=ids).update(
+                balance=F('balance') - fee,
+                total_cost=F('total_cost') + fee,
+                journal_seq=F('journal_seq') + 1,
+                next_billing_date=next_billing_date,
+                updated_at=now,
+            )
+
+        if run is not None and contract_ids:
+            # Договоры из fallback еще не списаны: точка ставится перед первым из них
+            checkpoint = min(fallback) - 1 if fallback else max(contract_ids)
+            run.checkpoint(checkpoint, charged=len(charged) + skipped)
+
+    return {'charged': charged, 'skipped': skipped, 'fallback': fallback}
+
+
+def apply_contract_charges(contracts, amounts, descriptions, now=None):
+    """
+    Списывает произвольные суммы с договоров одним пакетом.
+
+    Вызывается внутри transaction.atomic() с договорами, заблокированными
+    через select_for_update: balance_after считается по их текущему
+    балансу. Платежи и записи журнала баланса создаются через bulk_create,
+    баланс и total_cost меняются одним UPDATE с CASE по id договора.
+
+    Args:
+        contracts: dict id -> Contract (заблокированные строки)
+        amounts: dict id -> Decimal, сумма списания
+        descriptions: описание платежа (str) или dict id -> str
+        now: время операции
+
+    Returns:
+        list: списанные договоры с обновленным в памяти балансом
+    """
+    now = now or timezone.now()
+    charged = []
+    payments = []
+    entries = []
+    deltas = {}
+
+    for contract_id, amount in amounts.items():
+        amount = Decimal(amount).quantize(Decimal('0.01'))
+        if amount <= 0:
+            continue
+        contract = contracts[contract_id]
+        contract._balance_before_charge = contract.balance
+        contract.balance -= amount
+        contract.total_cost += amount
+        description = descriptions if isinstance(descriptions, str) else descriptions[contract_id]
+        payment = Payment(
+            contract=contract,
+            transaction_type='charge',
+            amount=amount,
+            status='success',
+            payment_method='system',
+            description=description,
+            balance_after=contract.balance,
+            processed_at=now,
+        )
+        payments.append(payment)
+        entries.append(contract.journal_entry(-amount, payment, description))
+        deltas[contract_id] = amount
+        charged.append(contract)
+
+    batch_size = get_billing_chunk_size()
+    Payment.objects.bulk_create(payments, batch_size=batch_size)
+    BalanceJournalEntry.objects.bulk_create(entries, batch_size=batch_size)
+    record_payments(payments)
+
+    contract_ids = list(deltas)
+    for start in range(0, len(contract_ids), batch_size):
+        batch = contract_ids[start:start + batch_size]
+        delta = Case(
+            *[When(pk=contract_id, then=Value(deltas[contract_id])) for contract_id in batch],
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+        Contract.objects.filter(pk__in=batch).update(
+            balance=F('balance') - delta,
+            total_cost=F('total_cost') + delta,
+            journal_seq=F('journal_seq') + 1,
+            updated_at=now,
+        )
+
+    return charged
+
+
+def apply_charge_side_effects(contracts):
+    """
+    Побочные эффекты списания после фиксации транзакции: предупреждение
+    о низком балансе и приостановка при минусе, как в deduct_balance().
+
+    Договоры, ушедшие в минус, приостанавливаются одним пакетом
+    (suspend_contracts_bulk), уведомления о приостановке уходят в очередь.
+    """
+    from apps.payments.notifications import notify_balance_warning
+
+    reasons = {}
+    for contract in contracts:
+        try:
+            if contract.balance < LOW_BALANCE_THRESHOLD <= contract._balance_before_charge:
+                notify_balance_warning(contract)
+        except Exception as e:
+            logger.warning('Ошибка обработки списания по договору %s: %s', contract.number, e)
+        if contract.balance < 0 and contract.status == 'active':
+            reasons[contract.id] = f'Недостаточно средств на балансе (баланс: {contract.balance}с)'
+
+    if not reasons:
+        return
+
+    try:
+        suspended = set(suspend_contracts_bulk(list(reasons), reasons))
+    except DatabaseError as e:
+        logger.warning('Ошибка пакетной приостановки договоров: %s', e)
+        return
+
+    for contract in contracts:
+        if contract.id in suspended:
+            contract.status = 'suspended'
+
+
+def notify_charged_contracts(contracts):
+    """
+    Побочные эффекты списания абонплаты: то же, что apply_charge_side_effects(),
+    плюс уведомление о списании — в том же порядке, что и в charge_monthly_fee().
+    """
+    from apps.payments.notifications import ContractNotifications
+
+    apply_charge_side_effects(contracts)
+    for contract in contracts:
+        fee = contract._balance_before_charge - contract.balance
+        try:
+            ContractNotifications.notify_monthly_charge(contract, fee)
+        except Exception as e:
+            logger.warning('Ошибка уведомления о списании по договору %s: %s', contract.number, e)
+
+
+def plan_catch_up_periods(balance, fee, due_date, today):
+    """
+    Считает в памяти, сколько целых периодов покрывает баланс.
+
+    Даты идут цепочкой (каждая следующая — предыдущая + 1 месяц),
+    как и при поштучном списании.
+
+    Returns:
+        tuple: (список дат списываемых периодов, дата следующего списания)
+    """
+    periods = []
+    if fee <= 0:
+        return periods, due_date
+
+    affordable = int(balance // fee) if balance > 0 else 0
+    while due_date <= today and len(periods) < affordable:
+        periods.append(due_date)
+        due_date = due_date + relativedelta(months=1)
+    return periods, due_date
+
+
+def charge_catch_up_periods(contract_id, today=None):
+    """
+    Погашение задолженности по абонплате после пополнения за один проход.
+
+    Все покрытые балансом периоды списываются одной транзакцией:
+    платежи через bulk_create, баланс/total_cost/next_billing_date —
+    одним UPDATE, и отправляется одно сводное уведомление вместо
+    уведомления на каждый месяц.
+
+    Returns:
+        int: количество списанных периодов
+    """
+    from apps.payments.notifications import ContractNotifications, notify_balance_warning
+
+    today = today or timezone.now().date()
+    now = timezone.now()
+
+    try:
+        with transaction.atomic():
+            contract = (
+                Contract.objects.select_for_update(of=('self',))
+                .select_related('tariff', 'customer', 'sim_card')
+                .get(pk=contract_id)
+            )
+            if contract.status != 'active':
+                return 0
+
+            fee = contract.tariff.monthly_fee
+            periods, next_billing_date = plan_catch_up_periods(
+                contract.balance, fee, contract.next_billing_date or today, today
+            )
+            if not periods:
+                return 0
+
+            description = _charge_description(contract.tariff)
+            balance_before = contract.balance
+            payments = []
+            items = []
+            entries = []
+            for period in periods:
+                contract.balance -= fee
+                period_description = f'{description} (период с {period:%d.%m.%Y})'
+                payment = Payment(
+                    contract=contract,
+                    transaction_type='charge',
+                    amount=fee,
+                    status='success',
+                    payment_method='system',
+                    description=period_description,
+                    balance_after=contract.balance,
+                    processed_at=now,
+                )
+                payments.append(payment)
+                items.append(BillingRunItem(contract=contract, period=period, payment=payment, amount=fee))
+                entries.append(contract.journal_entry(-fee, payment, period_description))
+
+            total = fee * len(periods)
+            Payment.objects.bulk_create(payments)
+            BillingRunItem.objects.bulk_create(items)
+            BalanceJournalEntry.objects.bulk_create(entries)
+            record_payments(payments)
+            Contract.objects.filter(pk=contract.pk).update(
+                balance=F('balance') - total,
+                total_cost=F('total_cost') + total,
+                journal_seq=F('journal_seq') + len(periods),
+                next_billing_date=next_billing_date,
+                updated_at=now,
+            )
+    except IntegrityError:
+        logger.warning('Часть периодов по договору %s уже списана, догоняющее списание пропущено', contract_id)
+        return 0
+
+    contract.total_cost += total
+    contract.next_billing_date = next_billing_date
+
+    if contract.balance < LOW_BALANCE_THRESHOLD <= balance_before:
+        notify_balance_warning(contract)
+    ContractNotifications.notify_monthly_charge(contract, total, periods=len(periods))
+    return len(periods)
+
+
+def _period_billed(contract, period):
+    """Есть ли запись журнала биллинга за период договора."""
+    return BillingRunItem.objects.filter(contract=contract, period=period).exists()
+
+
+def charge_contracts_per_row(contracts, today, run=None):
+    """
+    Поштучное списание через Contract.charge_monthly_fee().
+
+    Используется как запасной путь для договоров, которые не прошли
+    пакетную обработку. Запись журнала создается в одной транзакции
+    со списанием: если период уже списан, договор пропускается.
+    Остальные ошибки целостности (платеж, журнал баланса) считаются
+    ошибками списания.
+
+    Returns:
+        tuple: (charged_count, failed_count)
+    """
+    charged_count = 0
+    failed_count = 0
+
+    for contract in contracts:
+        due_date = contract.next_billing_date or today
+        try:
+            fee = contract.tariff.monthly_fee
+            with transaction.atomic():
+                if fee > 0:
+                    if _period_billed(contract, due_date):
+                        logger.warning('Период %s по договору %s уже списан, пропускаем', due_date, contract.number)
+                        continue
+                    BillingRunItem.objects.create(run=run, contract=contract, period=due_date, amount=fee)
+                contract.charge_monthly_fee(billing_date=due_date)
+            charged_count += 1
+
+        except IntegrityError:
+            # Период мог списать параллельный прогон между проверкой и вставкой
+            if _period_billed(contract, due_date):
+                logger.warning('Период %s по договору %s уже списан, пропускаем', due_date, contract.number)
+            else:
+                failed_count += 1
+                logger.warning('Ошибка списания для договора %s', contract.number, exc_info=True)
+
+        except Exception:
+            failed_count += 1
+            logger.warning('Ошибка списания для договора %s', contract.number, exc_info=True)
+
+    return charged_count, failed_count
+
+
+def split_billing_partitions(today, partition_size=None, max_partitions=None):
+    """
+    Делит должников на диапазоны id примерно одинакового размера.
+
+    Число партиций — ceil(должники / partition_size), но не больше
+    max_partitions (при превышении партиции укрупняются). Границы берутся
+    по реальным id должников, поэтому разреженные id не дают перекоса.
+
+    Returns:
+        list: [(id_from, id_to), ...], id_to не включается; None — без границы
+    """
+    partition_size = max(1, int(partition_size or getattr(settings, 'BILLING_PARTITION_SIZE', 20000)))
+    max_partitions = max(1, int(max_partitions or getattr(settings, 'BILLING_MAX_PARTITIONS', 8)))
+
+    due_ids = get_due_contracts(today).order_by('id').values_list('id', flat=True)
+    total = due_ids.count()
+    count = min(max_partitions, -(-total // partition_size))
+    if count <= 1:
+        return [(None, None)]
+
+    step = -(-total // count)
+    bounds = [None] + [due_ids[index * step] for index in range(1, count)] + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def merge_billing_results(results):
+    """Сводит результаты партиций в формат ответа charge_monthly_fees."""
+    summary = {'charged': 0, 'failed': 0, 'total': 0}
+    for result in results:
+        for key in summary:
+            summary[key] += (result or {}).get(key, 0)
+    return summary
+
+
+def open_billing_runs(today, partitions):
+    """
+    Создает прогоны для партиций (если их еще нет) и возвращает
+    все прогоны за дату.
+    """
+    BillingRun.objects.bulk_create(
+        [
+            BillingRun(run_date=today, range_start=id_from or 0, range_end=id_to)
+            for id_from, id_to in partitions
+        ],
+        ignore_conflicts=True,
+    )
+    return list(BillingRun.objects.filter(run_date=today).order_by('range_start'))
+
+
+def execute_billing_run(run, bulk=True, chunk_size=None):
+    """
+    Выполняет (или продолжает с контрольной точки) прогон биллинга.
+
+    Обрабатываются только договоры с id > last_contract_id, поэтому
+    перезапуск стоит O(оставшихся). Чанк, упавший целиком (ошибка БД
+    или валидации), и договоры, не уложившиеся в пакетный путь,
+    списываются поштучно.
+
+    Returns:
+        dict: {'charged': int, 'failed': int, 'total': int}
+    """
+    if run.status == 'completed':
+        return run.as_result()
+
+    today = run.run_date
+    id_from = max(run.range_start, run.last_contract_id + 1)
+
+    for ids in iter_due_contract_ids(today, chunk_size, id_from, run.range_end):
+        fallback = ids
+        if bulk:
+            try:
+                result = charge_chunk_bulk(ids, today, run)
+            except (DatabaseError, ValidationError) as e:
+                logger.warning('Пакетное списание чанка не удалось, поштучный режим: %s', e)
+            else:
+                notify_charged_contracts(result['charged'])
+                fallback = result['fallback']
+
+        if fallback:
+            fallback_contracts = get_due_contracts(today).filter(id__in=fallback).select_related('tariff')
+            row_charged, row_failed = charge_contracts_per_row(fallback_contracts, today, run)
+            run.checkpoint(ids[-1], charged=row_charged, failed=row_failed)
+
+    run.complete()
+    return run.as_result()
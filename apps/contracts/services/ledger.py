@@ -0,0 +1,167 @@
+"""
+Журнал баланса договоров и ежемесячные снимки.
+
+Каждое изменение баланса пишется в BalanceJournalEntry (изменение,
+баланс после него, порядковый номер в пределах договора). Раз в месяц
+для договоров с движением по балансу фиксируется BalanceSnapshot —
+баланс и номер последней записи на начало месяца.
+
+Баланс на дату и выписка за период читают один снимок и хвост журнала
+после него, а не всю историю платежей.
+"""
+import logging
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from apps.contracts.models import BalanceJournalEntry, BalanceSnapshot, Contract
+
+logger = logging.getLogger(__name__)
+
+
+def _as_datetime(value):
+    """Дата -> начало дня в текущей временной зоне; datetime — без изменений."""
+    if isinstance(value, datetime):
+        return value if timezone.is_aware(value) else timezone.make_aware(value)
+    return timezone.make_aware(datetime.combine(value, time.min))
+
+
+def _latest_snapshot(contract, moment):
+    """Последний снимок, снятый не позже moment."""
+    return (
+        BalanceSnapshot.objects.filter(contract=contract, period__lte=timezone.localdate(moment))
+        .order_by('-period')
+        .first()
+    )
+
+
+def balance_at(contract, at):
+    """
+    Баланс договора на момент at (без учета операций в сам момент at).
+
+    Читает ближайший снимок и последнюю запись журнала после него.
+    Если до at операций не было, баланс восстанавливается по первой
+    записи журнала, а при пустом журнале равен текущему балансу.
+
+    Args:
+        contract: объект Contract
+        at: datetime или date (начало дня)
+
+    Returns:
+        Decimal: баланс
+    """
+    moment = _as_datetime(at)
+    snapshot = _latest_snapshot(contract, moment)
+
+    tail = BalanceJournalEntry.objects.filter(contract=contract, created_at__lt=moment)
+    if snapshot:
+        tail = tail.filter(seq__gt=snapshot.last_seq)
+    last_entry = tail.order_by('-seq').only('balance_after').first()
+    if last_entry:
+        return last_entry.balance_after
+    if snapshot:
+        return snapshot.balance
+
+    first_entry = BalanceJournalEntry.objects.filter(contract=contract).order_by('seq').first()
+    if first_entry:
+        return first_entry.balance_after - first_entry.delta
+    return contract.balance
+
+
+def build_statement(contract, date_from, date_to):
+    """
+    Выписка по балансу договора за период [date_from, date_to].
+
+    Args:
+        contract: объект Contract
+        date_from: первая дата периода
+        date_to: последняя дата периода (включительно)
+
+    Returns:
+        dict: входящий и исходящий остаток, обороты и записи журнала
+    """
+    start = _as_datetime(date_from)
+    end = _as_datetime(date_to + timedelta(days=1))
+
+    opening_balance = balance_at(contract, start)
+    entries = list(
+        BalanceJournalEntry.objects.filter(contract=contract, created_at__gte=start, created_at__lt=end)
+        .select_related('payment')
+        .order_by('seq')
+    )
+
+    credit = sum((entry.delta for entry in entries if entry.delta > 0), Decimal('0.00'))
+    debit = sum((-entry.delta for entry in entries if entry.delta < 0), Decimal('0.00'))
+    return {
+        'contract': contract,
+        'date_from': date_from,
+        'date_to': date_to,
+        'opening_balance': opening_balance,
+        'closing_balance': entries[-1].balance_after if entries else opening_balance,
+        'credit': credit,
+        'debit': debit,
+        'entries': entries,
+    }
+
+
+def take_balance_snapshots(period=None, batch_size=1000):
+    """
+    Снимки баланса на начало месяца period.
+
+    Снимок создается только для договоров, у которых после предыдущего
+    снимка были записи журнала: для остальных предыдущий снимок остается
+    точным. Договоры обходятся чанками по id, снимки пишутся bulk_create.
+
+    Args:
+        period: первый день месяца (по умолчанию — текущего)
+        batch_size: размер чанка договоров
+
+    Returns:
+        int: количество созданных снимков
+    """
+    period = (period or timezone.localdate()).replace(day=1)
+    boundary = _as_datetime(period)
+
+    last_entry = (
+        BalanceJournalEntry.objects.filter(contract=OuterRef('pk'), created_at__lt=boundary)
+        .order_by('-seq')
+    )
+    previous_snapshot = (
+        BalanceSnapshot.objects.filter(contract=OuterRef('pk'), period__lte=period)
+        .order_by('-period')
+    )
+    contracts = (
+        Contract.objects.annotate(
+            last_seq=Subquery(last_entry.values('seq')[:1]),
+            last_balance=Subquery(last_entry.values('balance_after')[:1]),
+            snapshot_seq=Subquery(previous_snapshot.values('last_seq')[:1]),
+        )
+        .filter(last_seq__isnull=False)
+        .filter(Q(snapshot_seq__isnull=True) | Q(snapshot_seq__lt=F('last_seq')))
+    )
+
+    created = 0
+    last_id = 0
+    while True:
+        rows = list(
+            contracts.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'last_seq', 'last_balance')[:batch_size]
+        )
+        if not rows:
+            break
+
+        snapshots = BalanceSnapshot.objects.bulk_create(
+            [
+                BalanceSnapshot(contract_id=contract_id, period=period, balance=balance, last_seq=seq)
+                for contract_id, seq, balance in rows
+            ],
+            ignore_conflicts=True,
+        )
+        created += len(snapshots)
+        last_id = rows[-1][0]
+
+    logger.info('Снимки баланса на %s: %s', period, created)
+    return created
@@ -0,0 +1,156 @@
+"""
+Пакетная приостановка договоров.
+
+Contract.suspend() на каждый договор сохраняет договор, сохраняет SIM
+(с full_clean и проверками уникальности) и синхронно отправляет
+уведомления. Здесь статусы договоров и SIM меняются двумя set-based
+UPDATE на чанк, причина дописывается в примечания в том же UPDATE,
+а уведомления ставятся в очередь одной задачей на чанк после фиксации
+транзакции.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Case, F, Q, TextField, Value, When
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from apps.contracts.models import Contract
+from apps.sims.models import SIM
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _suspension_note(reason):
+    return f'Приостановлен: {reason}'
+
+
+def _append_note(line):
+    """notes = notes + '\\n' + line (или просто line, если примечаний нет)."""
+    return Case(
+        When(Q(notes__isnull=True) | Q(notes=''), then=Value(line)),
+        default=Concat(F('notes'), Value(f'\n{line}'), output_field=TextField()),
+        output_field=TextField(),
+    )
+
+
+def _notes_expression(contract_ids, reasons):
+    """
+    Выражение для дописывания причины: одна строка для всех договоров
+    или CASE по id договора для индивидуальных причин.
+    """
+    if isinstance(reasons, str):
+        return _append_note(_suspension_note(reasons))
+
+    return Case(
+        *[
+            When(pk=contract_id, then=_append_note(_suspension_note(reasons[contract_id])))
+            for contract_id in contract_ids
+            if reasons.get(contract_id)
+        ],
+        default=F('notes'),
+        output_field=TextField(),
+    )
+
+
+def suspend_contracts_bulk(contract_ids, reasons='', notify=True):
+    """
+    Приостанавливает активные договоры с отрицательным балансом из списка
+    одной транзакцией.
+
+    Статус и баланс перепроверяются под блокировкой строк: договор,
+    пополненный после отбора id, не приостанавливается.
+
+    Args:
+        contract_ids: id договоров (один чанк)
+        reasons: причина (str) для всех договоров или dict id -> str
+        notify: поставить в очередь уведомления о приостановке
+
+    Returns:
+        list: id фактически приостановленных договоров
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        suspended_ids = list(
+            Contract.objects.select_for_update()
+            .filter(id__in=list(contract_ids), status='active', balance__lt=0)
+            .values_list('id', flat=True)
+        )
+        if not suspended_ids:
+            return []
+
+        updates = {'status': 'suspended', 'updated_at': now}
+        if reasons:
+            updates['notes'] = _notes_expression(suspended_ids, reasons)
+        Contract.objects.filter(id__in=suspended_ids).update(**updates)
+        SIM.objects.filter(contract_id__in=suspended_ids).update(status='suspended', updated_at=now)
+
+        if notify:
+            notification_reasons = reasons if isinstance(reasons, str) else {
+                str(contract_id): reasons.get(contract_id, '') for contract_id in suspended_ids
+            }
+            transaction.on_commit(
+                lambda: _enqueue_suspension_notifications(suspended_ids, notification_reasons)
+            )
+
+    return suspended_ids
+
+
+def _enqueue_suspension_notifications(contract_ids, reasons):
+    from apps.contracts.tasks import send_suspension_notifications
+
+    try:
+        send_suspension_notifications.delay(contract_ids, reasons)
+    except Exception as e:
+        logger.warning('Не удалось поставить в очередь уведомления о приостановке: %s', e)
+
+
+def notify_suspended_contracts(contract_ids, reasons=''):
+    """
+    Уведомления о приостановке для пачки договоров (выполняется в задаче).
+
+    Args:
+        contract_ids: id договоров
+        reasons: причина (str) или dict str(id) -> str
+
+    Returns:
+        int: количество договоров, по которым отправлены уведомления
+    """
+    from apps.payments.notifications import notify_contract_status_change
+
+    contracts = Contract.objects.filter(id__in=contract_ids).select_related('customer', 'sim_card')
+    sent = 0
+    for contract in contracts:
+        reason = reasons if isinstance(reasons, str) else reasons.get(str(contract.id), '')
+        try:
+            notify_contract_status_change(contract, 'suspended', reason)
+            sent += 1
+        except Exception as e:
+            logger.warning('Ошибка уведомления о приостановке договора %s: %s', contract.number, e)
+    return sent
+
+
+def suspend_negative_balance_contracts(reason='', batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Приостанавливает все активные договоры с отрицательным балансом
+    чанками по id (keyset-пагинация).
+
+    Returns:
+        int: количество приостановленных договоров
+    """
+    queryset = Contract.objects.filter(status='active', balance__lt=0)
+    suspended = 0
+    last_id = 0
+    while True:
+        ids = list(
+            queryset.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return suspended
+        suspended += len(suspend_contracts_bulk(ids, reason))
+        last_id = ids[-1]
@@ -1,11 +1,62 @@
+"""
+Эмулятор трафика: случайные звонки, SMS и интернет по активным договорам
+со списаниями и автопополнением.
+
+Пакетный режим (по умолчанию) на каждый такт копит списания договоров
+в памяти: платежи и записи журнала баланса создаются через bulk_create,
+баланс, total_cost и journal_seq каждого договора меняются одним UPDATE
+с CASE по id, счетчики потребления — increment_usage_records. После
+фиксации — пакетная приостановка ушедших в минус и догоняющее списание
+абонплаты у пополненных договоров; уведомления о каждом автопополнении
+не отправляются. Поштучный режим (bulk=False) создает платежи через
+Payment.objects.create.
+
+Генератор нагрузки (generator='numpy') заранее строит такт целиком
+массивами NumPy: выборка договоров, звонки и SMS — по Пуассону, трафик —
+лог-нормально; параметры распределений задаются по тарифам (profiles).
+Такт передается в биллинг пакетами по batch_size договоров. С заданным
+seed прогон на одном и том же снимке базы повторяется в точности — так
+сравнивают сборки на одинаковых сценариях в миллионы событий. Генератор
+'random' (по умолчанию) — прежние равномерные распределения, тоже
+воспроизводимые при заданном seed.
+
+Длинные прогоны выполняются в фоне: start_emulator_run создает запись
+EmulatorRun и ставит задачу run_traffic_emulator, прогресс и отмена —
+через ту же запись (execute_emulator_run).
+"""
+import logging
 import random
+import time
+from collections import defaultdict
 from decimal import Decimal
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, PositiveBigIntegerField, Value, When
 from django.utils import timezone
 
-from apps.contracts.models import Contract, TrafficMetric
+from apps.contracts.models import BalanceJournalEntry, Contract, EmulatorRun, TrafficMetric
+from apps.contracts.services.billing import apply_charge_side_effects, charge_catch_up_periods
+from apps.contracts.services.usage import increment_usage_records, lock_usage_records, record_usage
+from apps.payments.aggregates import record_payments
+from apps.tariffs.rating import money_to_tyiyn
 from apps.payments.models import Payment
 
+logger = logging.getLogger(__name__)
+
+TOPUP_DESCRIPTION = 'Автопополнение (эмулятор)'
+CALL_CHARGE_DESCRIPTION = 'Списание за голосовой трафик'
+SMS_CHARGE_DESCRIPTION = 'Списание за SMS'
+DATA_CHARGE_DESCRIPTION = 'Списание за интернет-трафик'
+DECIMAL_FIELDS = ('data_rate', 'call_price', 'sms_price', 'data_price', 'topup_threshold', 'topup_amount')
+GENERATORS = ('random', 'numpy')
+# Параметры профиля тарифа: среднее звонков и SMS за такт (Пуассон),
+# средний трафик в МБ и sigma лог-нормального распределения
+PROFILE_KEYS = ('call_rate', 'sms_rate', 'data_mean', 'data_sigma')
+
 
 @dataclass
 class EmulatorConfig:
@@ -19,11 +70,36 @@ class EmulatorConfig:
     topup_threshold: Decimal
     topup_amount: Decimal
     ticks: int
+    seed: Optional[int] = None
+    generator: str = 'random'
+    data_sigma: float = 1.0
+    batch_size: Optional[int] = None
+    # {id или название тарифа: {'call_rate': .., 'sms_rate': .., 'data_mean': .., 'data_sigma': ..}}
+    profiles: dict = field(default_factory=dict)
+
+    def as_dict(self):
+        """Параметры в JSON-совместимом виде (суммы — строками)."""
+        data = asdict(self)
+        for name in DECIMAL_FIELDS:
+            data[name] = str(data[name])
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        for name in DECIMAL_FIELDS:
+            data[name] = Decimal(str(data[name]))
+        return cls(**data)
 
 
 class TrafficEmulator:
     def __init__(self, config: EmulatorConfig):
+        if config.generator not in GENERATORS:
+            raise ValueError(f'Неизвестный генератор нагрузки: {config.generator}')
         self.config = config
+        self.random = random.Random(config.seed)
+        self.rng = np.random.default_rng(config.seed)
+        self.batch_size = max(1, int(config.batch_size or getattr(settings, 'EMULATOR_BATCH_SIZE', 1000)))
         self.summary = {
             'total_calls': 0,
             'total_sms': 0,
@@ -32,50 +108,31 @@ class TrafficEmulator:
             'charges': Decimal('0'),
         }
 
-    def run(self):
-        contracts = list(Contract.objects.filter(status='active').select_related('tariff'))
+    def run(self, bulk=True, on_tick=None):
+        """
+        Выполняет config.ticks тактов.
+
+        Args:
+            bulk: пакетный режим записи
+            on_tick: функция (выполнено тактов, сводка) после каждого такта;
+                     вернула False — прогон останавливается
+
+        Returns:
+            dict: сводка (звонки, SMS, трафик, пополнения, списания)
+        """
+        # Порядок по id — условие воспроизводимости выборки при заданном seed
+        contracts = list(Contract.objects.filter(status='active').select_related('tariff').order_by('pk'))
         if not contracts:
             return self.summary
 
-        for _ in range(self.config.ticks):
-            sample = random.sample(contracts, min(len(contracts), self.config.clients))
-            tick_calls = tick_sms = tick_topups = 0
-            tick_data = Decimal('0')
-            tick_charges = Decimal('0')
-
-            for contract in sample:
-                calls = random.randint(0, self.config.call_rate)
-                sms = random.randint(0, self.config.sms_rate)
-                data_mb = Decimal(random.uniform(0, float(self.config.data_rate))).quantize(Decimal('0.01'))
-
-                if calls:
-                    tick_calls += calls
-                    amount = self.config.call_price * calls
-                    tick_charges += self._charge_contract(contract, amount, 'Списание за голосовой трафик')
-
-                if sms:
-                    tick_sms += sms
-                    amount = self.config.sms_price * sms
-                    tick_charges += self._charge_contract(contract, amount, 'Списание за SMS')
-
-                if data_mb > 0:
-                    tick_data += data_mb
-                    amount = (self.config.data_price * data_mb).quantize(Decimal('0.01'))
-                    tick_charges += self._charge_contract(contract, amount, 'Списание за интернет-трафик')
-
-                if contract.balance < self.config.topup_threshold:
-                    self._topup_contract(contract, self.config.topup_amount)
-                    tick_topups += 1
-
-            if any([tick_calls, tick_sms, tick_data, tick_topups]):
-                TrafficMetric.objects.create(
-                    calls=tick_calls,
-                    sms=tick_sms,
-                    data_mb=tick_data,
-                    topups=tick_topups,
-                    charges=tick_charges,
-                    source='emulator'
-                )
+        params = self._distribution_params(contracts) if self.config.generator == 'numpy' else None
+        run_tick = self._run_tick_bulk if bulk else self._run_tick_per_row
+        for tick in range(self.config.ticks):
+            if params is None:
+                rows = self._generate_tick_random(contracts)
+            else:
+                rows = self._generate_tick_numpy(contracts, params)
+            tick_calls, tick_sms, tick_data, tick_topups, tick_charges = run_tick(rows)
 
             self.summary['total_calls'] += tick_calls
             self.summary['total_sms'] += tick_sms
@@ -83,9 +140,310 @@ class TrafficEmulator:
             self.summary['topups'] += tick_topups
             self.summary['charges'] += tick_charges
 
+            if on_tick is not None and on_tick(tick + 1, self.summary) is False:
+                break
+
         return self.summary
 
+    def summary_as_json(self):
+        """Сводка в JSON-совместимом виде (для EmulatorRun.summary)."""
+        return {
+            name: float(value) if isinstance(value, Decimal) else value
+            for name, value in self.summary.items()
+        }
+
+    def _generate_tick_random(self, contracts):
+        """
+        Такт генератора 'random': равномерные распределения по договору.
+
+        Returns:
+            list: [(договор, звонки, SMS, МБ, [(сумма списания, описание), ...]), ...]
+        """
+        sample = self.random.sample(contracts, min(len(contracts), self.config.clients))
+        return [(contract, *self._generate_usage(contract)) for contract in sample]
+
+    def _generate_usage(self, contract):
+        """
+        Случайное потребление договора за такт.
+
+        Returns:
+            tuple: (звонки, SMS, МБ, [(сумма списания, описание), ...])
+        """
+        calls = self.random.randint(0, self.config.call_rate)
+        sms = self.random.randint(0, self.config.sms_rate)
+        data_mb = Decimal(self.random.uniform(0, float(self.config.data_rate))).quantize(Decimal('0.01'))
+
+        charges = []
+        if calls:
+            charges.append((self.config.call_price * calls, CALL_CHARGE_DESCRIPTION))
+        if sms:
+            charges.append((self.config.sms_price * sms, SMS_CHARGE_DESCRIPTION))
+        if data_mb > 0:
+            charges.append(((self.config.data_price * data_mb).quantize(Decimal('0.01')), DATA_CHARGE_DESCRIPTION))
+        charges = [
+            (amount.quantize(Decimal('0.01')), description)
+            for amount, description in charges
+            if amount.quantize(Decimal('0.01')) > 0
+        ]
+        return calls, sms, data_mb, charges
+
+    def _distribution_params(self, contracts):
+        """
+        Параметры распределений генератора 'numpy' столбцами по договорам.
+
+        Профиль тарифа ищется в config.profiles по id, затем по названию;
+        недостающие параметры берутся из общих (call_rate, sms_rate,
+        data_rate, data_sigma).
+
+        Returns:
+            dict: имя параметра -> np.ndarray длиной len(contracts)
+        """
+        defaults = {
+            'call_rate': self.config.call_rate,
+            'sms_rate': self.config.sms_rate,
+            'data_mean': self.config.data_rate,
+            'data_sigma': self.config.data_sigma,
+        }
+        by_tariff = {}
+        rows = []
+        for contract in contracts:
+            tariff = contract.tariff
+            if tariff.pk not in by_tariff:
+                profile = self.config.profiles.get(str(tariff.pk)) or self.config.profiles.get(tariff.name) or {}
+                by_tariff[tariff.pk] = [float(profile.get(name, defaults[name])) for name in PROFILE_KEYS]
+            rows.append(by_tariff[tariff.pk])
+
+        call_rate, sms_rate, data_mean, data_sigma = np.array(rows, dtype=np.float64).reshape(-1, 4).T
+        has_data = data_mean > 0
+        # Среднее лог-нормального распределения: exp(mu + sigma^2 / 2)
+        data_mu = np.log(np.where(has_data, data_mean, 1.0)) - data_sigma ** 2 / 2
+        prices = money_to_tyiyn([self.config.call_price, self.config.sms_price, self.config.data_price])
+        return {
+            'call_rate': np.maximum(call_rate, 0),
+            'sms_rate': np.maximum(sms_rate, 0),
+            'data_mu': data_mu,
+            'data_sigma': np.maximum(data_sigma, 0),
+            'has_data': has_data,
+            'prices': prices.tolist(),
+        }
+
+    def _generate_tick_numpy(self, contracts, params):
+        """
+        Такт генератора 'numpy': все значения такта одним векторным проходом.
+
+        Стоимость считается в целых тыйынах, интернет — с округлением
+        до тыйына по ROUND_HALF_UP (как в apps.tariffs.rating).
+
+        Returns:
+            list: [(договор, звонки, SMS, МБ, [(сумма списания, описание), ...]), ...]
+        """
+        size = min(len(contracts), self.config.clients)
+        index = np.sort(self.rng.choice(len(contracts), size=size, replace=False))
+        calls = self.rng.poisson(params['call_rate'][index])
+        sms = self.rng.poisson(params['sms_rate'][index])
+        data = self.rng.lognormal(params['data_mu'][index], params['data_sigma'][index])
+        data_cents = np.where(params['has_data'][index], np.rint(data * 100), 0).astype(np.int64)
+
+        call_price, sms_price, data_price = params['prices']
+        call_cost = calls * call_price
+        sms_cost = sms * sms_price
+        data_cost = (data_cents * data_price + 50) // 100
+
+        rows = []
+        for i, contract_calls, contract_sms, cents, costs in zip(
+            index.tolist(),
+            calls.tolist(),
+            sms.tolist(),
+            data_cents.tolist(),
+            zip(call_cost.tolist(), sms_cost.tolist(), data_cost.tolist()),
+        ):
+            charges = [
+                (Decimal(cost).scaleb(-2), description)
+                for cost, description in zip(
+                    costs, (CALL_CHARGE_DESCRIPTION, SMS_CHARGE_DESCRIPTION, DATA_CHARGE_DESCRIPTION)
+                )
+                if cost > 0
+            ]
+            rows.append((contracts[i], contract_calls, contract_sms, Decimal(cents).scaleb(-2), charges))
+        return rows
+
+    def _record_metric(self, tick_calls, tick_sms, tick_data, tick_topups, tick_charges):
+        if any([tick_calls, tick_sms, tick_data, tick_topups]):
+            TrafficMetric.objects.create(
+                calls=tick_calls,
+                sms=tick_sms,
+                data_mb=tick_data,
+                topups=tick_topups,
+                charges=tick_charges,
+                source='emulator'
+            )
+
+    def _run_tick_bulk(self, rows):
+        """
+        Такт пакетами по batch_size договоров: транзакция на пакет,
+        одно изменение баланса на договор.
+
+        Returns:
+            tuple: (звонки, SMS, МБ, пополнений, сумма списаний)
+        """
+        tick_calls = sum(row[1] for row in rows)
+        tick_sms = sum(row[2] for row in rows)
+        tick_data = sum((row[3] for row in rows), Decimal('0'))
+        tick_topups = 0
+        tick_charges = Decimal('0')
+
+        for start in range(0, len(rows), self.batch_size):
+            batch_topups, batch_charges = self._apply_batch(rows[start:start + self.batch_size])
+            tick_topups += batch_topups
+            tick_charges += batch_charges
+
+        self._record_metric(tick_calls, tick_sms, tick_data, tick_topups, tick_charges)
+        return tick_calls, tick_sms, tick_data, tick_topups, tick_charges
+
+    def _apply_batch(self, rows):
+        """
+        Списания, пополнения и счетчики потребления пакета договоров
+        в одной транзакции.
+
+        Returns:
+            tuple: (пополнений, сумма списаний)
+        """
+        # Звонок эмулятора учитывается как одна минута
+        usage = {contract.id: (calls, sms, data_mb) for contract, calls, sms, data_mb, _ in rows}
+        charges = {row[0].id: row[4] for row in rows}
+        tick_topups = 0
+        tick_charges = Decimal('0')
+
+        topup_amount = Decimal(self.config.topup_amount).quantize(Decimal('0.01'))
+        now = timezone.now()
+        with transaction.atomic():
+            contracts = {
+                contract.id: contract
+                for contract in Contract.objects.select_for_update(of=('self',))
+                .select_related('tariff', 'customer', 'sim_card')
+                .filter(id__in=list(usage))
+            }
+            payments = []
+            entries = []
+            deltas = defaultdict(Decimal)
+            costs = defaultdict(Decimal)
+            counts = defaultdict(int)
+            charged = []
+            topped_up = []
+
+            for contract_id in sorted(contracts):
+                contract = contracts[contract_id]
+                contract._balance_before_charge = contract.balance
+
+                for amount, description in charges[contract_id]:
+                    contract.balance -= amount
+                    contract.total_cost += amount
+                    payment = Payment(
+                        contract=contract,
+                        transaction_type='charge',
+                        amount=amount,
+                        status='success',
+                        payment_method='system',
+                        description=description,
+                        balance_after=contract.balance,
+                        processed_at=now,
+                    )
+                    payments.append(payment)
+                    entries.append(contract.journal_entry(-amount, payment, description))
+                    deltas[contract_id] -= amount
+                    costs[contract_id] += amount
+                    counts[contract_id] += 1
+                    tick_charges += amount
+                if charges[contract_id]:
+                    charged.append(contract)
+
+                if contract.balance < self.config.topup_threshold and topup_amount > 0:
+                    contract.balance += topup_amount
+                    payment = Payment(
+                        contract=contract,
+                        transaction_type='payment',
+                        amount=topup_amount,
+                        status='success',
+                        payment_method='auto_payment',
+                        description=TOPUP_DESCRIPTION,
+                        balance_after=contract.balance,
+                        processed_at=now,
+                    )
+                    payments.append(payment)
+                    entries.append(contract.journal_entry(topup_amount, payment, TOPUP_DESCRIPTION))
+                    deltas[contract_id] += topup_amount
+                    counts[contract_id] += 1
+                    topped_up.append(contract)
+                    tick_topups += 1
+
+            Payment.objects.bulk_create(payments)
+            BalanceJournalEntry.objects.bulk_create(entries)
+            record_payments(payments)
+
+            contract_ids = list(counts)
+            if contract_ids:
+                Contract.objects.filter(pk__in=contract_ids).update(
+                    balance=F('balance') + Case(
+                        *[When(pk=contract_id, then=Value(deltas[contract_id])) for contract_id in contract_ids],
+                        output_field=DecimalField(max_digits=10, decimal_places=2),
+                    ),
+                    total_cost=F('total_cost') + Case(
+                        *[When(pk=contract_id, then=Value(costs[contract_id])) for contract_id in contract_ids],
+                        default=Value(Decimal('0')),
+                        output_field=DecimalField(max_digits=10, decimal_places=2),
+                    ),
+                    journal_seq=F('journal_seq') + Case(
+                        *[When(pk=contract_id, then=Value(counts[contract_id])) for contract_id in contract_ids],
+                        output_field=PositiveBigIntegerField(),
+                    ),
+                    updated_at=now,
+                )
+
+            usage = {contract_id: usage[contract_id] for contract_id in contracts if any(usage[contract_id])}
+            if usage:
+                records = lock_usage_records([contracts[contract_id] for contract_id in usage])
+                increment_usage_records(records, usage)
+
+        apply_charge_side_effects(charged)
+        for contract in topped_up:
+            if contract.status == 'suspended' and contract.balance > 0:
+                contract.resume()
+            # Как после пополнения через Payment.save(): догоняющее списание абонплаты
+            if contract.status == 'active' and contract.tariff.monthly_fee > 0:
+                charge_catch_up_periods(contract.pk)
+
+        return tick_topups, tick_charges
+
+    def _run_tick_per_row(self, rows):
+        """
+        Такт поштучно: каждый платеж проходит полный путь Payment.save().
+
+        Returns:
+            tuple: (звонки, SMS, МБ, пополнений, сумма списаний)
+        """
+        tick_calls = tick_sms = tick_topups = 0
+        tick_data = Decimal('0')
+        tick_charges = Decimal('0')
+
+        for contract, calls, sms, data_mb, contract_charges in rows:
+            tick_calls += calls
+            tick_sms += sms
+            tick_data += data_mb
+            for amount, description in contract_charges:
+                tick_charges += self._charge_contract(contract, amount, description)
+
+            # Звонок эмулятора учитывается как одна минута
+            record_usage(contract, minutes=calls, sms=sms, data_mb=data_mb)
+
+            if contract.balance < self.config.topup_threshold:
+                self._topup_contract(contract, self.config.topup_amount)
+                tick_topups += 1
+
+        self._record_metric(tick_calls, tick_sms, tick_data, tick_topups, tick_charges)
+        return tick_calls, tick_sms, tick_data, tick_topups, tick_charges
+
     def _charge_contract(self, contract, amount, description):
+        # Payment.save() списывает сумму с баланса договора сам
         amount = amount.quantize(Decimal('0.01'))
         if amount <= 0:
             return Decimal('0')
@@ -97,20 +455,122 @@ class TrafficEmulator:
             description=description,
             payment_method='system'
         )
-        try:
-            contract.deduct_balance(amount, description=description)
-        except Exception:
-            pass
         return amount
 
     def _topup_contract(self, contract, amount):
+        # Payment.save() зачисляет сумму на баланс договора сам
         amount = Decimal(amount).quantize(Decimal('0.01'))
         Payment.objects.create(
             contract=contract,
             transaction_type='payment',
             amount=amount,
             status='success',
-            description='Автопополнение (эмулятор)',
+            description=TOPUP_DESCRIPTION,
             payment_method='auto_payment'
         )
-        contract.add_balance(amount, description='Автопополнение (эмулятор)')
+
+
+def start_emulator_run(config, user=None):
+    """
+    Создает запись прогона и ставит задачу после фиксации транзакции.
+
+    Returns:
+        EmulatorRun
+    """
+    run = EmulatorRun.objects.create(
+        config=config.as_dict(),
+        ticks_total=config.ticks,
+        created_by=user if getattr(user, 'pk', None) else None,
+    )
+    transaction.on_commit(lambda: _enqueue_emulator_run(run.pk))
+    return run
+
+
+def _enqueue_emulator_run(run_id):
+    from apps.contracts.tasks import run_traffic_emulator
+
+    try:
+        run_traffic_emulator.delay(run_id)
+    except Exception as e:
+        logger.warning('Не удалось поставить в очередь прогон эмулятора %s: %s', run_id, e)
+        now = timezone.now()
+        EmulatorRun.objects.filter(pk=run_id, status='queued').update(
+            status='failed',
+            error=f'Не удалось поставить задачу в очередь: {e}',
+            finished_at=now,
+            updated_at=now,
+        )
+
+
+def cancel_emulator_run(run_id):
+    """
+    Запрашивает отмену прогона; прогон в очереди отменяется сразу.
+
+    Returns:
+        bool: прогон еще не был завершен
+    """
+    now = timezone.now()
+    requested = EmulatorRun.objects.filter(pk=run_id).exclude(
+        status__in=EmulatorRun.FINAL_STATUSES
+    ).update(cancel_requested=True, updated_at=now)
+    EmulatorRun.objects.filter(pk=run_id, status='queued').update(
+        status='cancelled', finished_at=now, updated_at=now
+    )
+    return bool(requested)
+
+
+def execute_emulator_run(run_id, bulk=True):
+    """
+    Выполняет прогон эмулятора (вызывается задачей run_traffic_emulator).
+
+    После каждого такта прогресс, пропускная способность и промежуточная
+    сводка пишутся одним UPDATE, который не срабатывает, если запрошена
+    отмена, — тогда прогон останавливается.
+
+    Returns:
+        dict: состояние прогона (EmulatorRun.as_progress)
+    """
+    now = timezone.now()
+    if not EmulatorRun.objects.filter(pk=run_id, status='queued', cancel_requested=False).update(
+        status='running', started_at=now, updated_at=now
+    ):
+        # Отменен до запуска или уже выполняется другим воркером
+        return EmulatorRun.objects.get(pk=run_id).as_progress()
+
+    run = EmulatorRun.objects.get(pk=run_id)
+    emulator = TrafficEmulator(EmulatorConfig.from_dict(run.config))
+    started = time.monotonic()
+    progress = {'ticks_done': 0, 'throughput': 0}
+
+    def on_tick(ticks_done, summary):
+        elapsed = time.monotonic() - started
+        progress['ticks_done'] = ticks_done
+        progress['throughput'] = round(ticks_done / elapsed, 3) if elapsed > 0 else 0
+        return bool(EmulatorRun.objects.filter(pk=run_id, cancel_requested=False).update(
+            ticks_done=ticks_done,
+            throughput=progress['throughput'],
+            summary=emulator.summary_as_json(),
+            updated_at=timezone.now(),
+        ))
+
+    try:
+        emulator.run(bulk=bulk, on_tick=on_tick)
+    except Exception as e:
+        logger.exception('Ошибка прогона эмулятора %s', run_id)
+        status, error = 'failed', str(e)
+    else:
+        run.refresh_from_db(fields=['cancel_requested'])
+        status, error = ('cancelled' if run.cancel_requested else 'completed'), ''
+
+    now = timezone.now()
+    EmulatorRun.objects.filter(pk=run_id).update(
+        status=status,
+        error=error,
+        ticks_done=progress['ticks_done'],
+        throughput=progress['throughput'],
+        summary=emulator.summary_as_json(),
+        finished_at=now,
+        updated_at=now,
+    )
+    run.refresh_from_db()
+    return run.as_progress()
@@ -0,0 +1,218 @@
+"""
+Сводки метрик трафика (TrafficMetricRollup) и срок хранения.
+
+Каждая новая TrafficMetric (такт эмулятора, действие телефона, пакет
+CDR) в той же транзакции прибавляется к строкам сводки своей минуты,
+часа и суток (TrafficMetric.save -> record_metric_rollups). График
+нагрузки за период читает сводку подходящего разрешения:
+
+    до 12 часов  — по минутам (до 720 точек)
+    до 30 суток  — по часам (до 720 точек)
+    дольше       — по суткам
+
+Сырые метрики и мелкие сводки удаляются пачками по сроку хранения
+(prune_traffic_metrics, ежедневная задача). Сводки за период, пока
+сырые метрики еще хранятся, пересчитывает rebuild_traffic_rollups.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
+from django.utils import timezone
+
+from apps.contracts.models import TrafficMetric, TrafficMetricRollup
+
+RESOLUTIONS = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+TRUNC_FUNCTIONS = {'minute': TruncMinute, 'hour': TruncHour, 'day': TruncDay}
+# Максимум точек графика при автоматическом выборе разрешения
+SERIES_MAX_POINTS = 720
+VALUE_FIELDS = ('calls', 'sms', 'data_mb', 'topups', 'charges')
+# Срок хранения, дней (0 — хранить всегда): сырые метрики и сводки по разрешениям
+RETENTION_SETTINGS = {
+    'raw': ('TRAFFIC_METRIC_RETENTION_DAYS', 7),
+    'minute': ('TRAFFIC_ROLLUP_MINUTE_RETENTION_DAYS', 14),
+    'hour': ('TRAFFIC_ROLLUP_HOUR_RETENTION_DAYS', 180),
+    'day': ('TRAFFIC_ROLLUP_DAY_RETENTION_DAYS', 0),
+}
+
+
+def bucket_start(timestamp, resolution):
+    """Начало интервала сводки (в текущем часовом поясе)."""
+    local = timezone.localtime(timestamp).replace(second=0, microsecond=0)
+    if resolution in ('hour', 'day'):
+        local = local.replace(minute=0)
+    if resolution == 'day':
+        local = local.replace(hour=0)
+    return local
+
+
+def retention_days(resolution):
+    name, default = RETENTION_SETTINGS[resolution]
+    return getattr(settings, name, default)
+
+
+def record_metric_rollups(metrics):
+    """
+    Прибавляет метрики к строкам сводки всех разрешений: UPDATE на строку,
+    недостающая строка создается (при гонке — повторный UPDATE).
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(VALUE_FIELDS + ('samples',), 0))
+    for metric in metrics:
+        for resolution in RESOLUTIONS:
+            delta = deltas[(resolution, bucket_start(metric.timestamp, resolution))]
+            for name in VALUE_FIELDS:
+                delta[name] += getattr(metric, name) or 0
+            delta['samples'] += 1
+
+    for (resolution, bucket), delta in deltas.items():
+        lookup = {'resolution': resolution, 'bucket': bucket}
+        changes = {name: F(name) + value for name, value in delta.items()}
+        changes['updated_at'] = timezone.now()
+        if TrafficMetricRollup.objects.filter(**lookup).update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                TrafficMetricRollup.objects.create(**lookup, **delta)
+        except IntegrityError:
+            # Строку успел создать параллельный процесс
+            TrafficMetricRollup.objects.filter(**lookup).update(**changes)
+
+
+def pick_resolution(date_from, date_to):
+    """
+    Самое мелкое разрешение, при котором период укладывается
+    в SERIES_MAX_POINTS точек и еще не удален по сроку хранения.
+    """
+    now = timezone.now()
+    for resolution, step in RESOLUTIONS.items():
+        days = retention_days(resolution)
+        if days and date_from < now - timedelta(days=days):
+            continue
+        if (date_to - date_from) / step <= SERIES_MAX_POINTS:
+            return resolution
+    return 'day'
+
+
+def traffic_series(date_from, date_to, resolution=None):
+    """
+    Ряд метрик трафика за период по сводке.
+
+    Args:
+        date_from, date_to: границы периода (aware datetime)
+        resolution: 'minute', 'hour', 'day' или None — выбрать автоматически
+
+    Returns:
+        tuple: (разрешение, [{'bucket', 'calls', 'sms', 'data_mb', 'topups', 'charges'}, ...])
+               интервалы без метрик заполняются нулями
+    """
+    resolution = resolution or pick_resolution(date_from, date_to)
+    step = RESOLUTIONS[resolution]
+    first = bucket_start(date_from, resolution)
+    rows = {
+        row['bucket']: row
+        for row in TrafficMetricRollup.objects.filter(
+            resolution=resolution, bucket__gte=first, bucket__lte=date_to
+        ).values('bucket', *VALUE_FIELDS)
+    }
+
+    series = []
+    bucket = first
+    while bucket <= date_to:
+        row = rows.get(bucket)
+        if row is None:
+            row = {'bucket': bucket, 'calls': 0, 'sms': 0, 'data_mb': Decimal('0'), 'topups': 0,
+                   'charges': Decimal('0')}
+        series.append(row)
+        bucket = timezone.localtime(bucket + step)
+    return resolution, series
+
+
+def rebuild_traffic_rollups(since=None):
+    """
+    Пересчитывает сводки по сырым метрикам начиная с since
+    (по умолчанию — с самой ранней хранящейся метрики).
+
+    Строки сводок с интервалами от since удаляются и создаются заново
+    в одной транзакции; более ранние интервалы (сырые метрики уже
+    удалены) не трогаются. Без since интервал с самой ранней метрикой
+    пропускается: часть его метрик могла быть удалена по сроку хранения.
+
+    Returns:
+        dict: количество строк сводки по разрешениям
+    """
+    partial_first = since is None
+    if since is None:
+        since = TrafficMetric.objects.aggregate(first=Min('timestamp'))['first']
+        if since is None:
+            return {resolution: 0 for resolution in RESOLUTIONS}
+
+    stats = {}
+    with transaction.atomic():
+        for resolution, trunc in TRUNC_FUNCTIONS.items():
+            first = bucket_start(since, resolution)
+            if partial_first and first < since:
+                first = timezone.localtime(first + RESOLUTIONS[resolution])
+            rows = (
+                TrafficMetric.objects.filter(timestamp__gte=first)
+                .annotate(bucket=trunc('timestamp'))
+                .order_by()
+                .values('bucket')
+                .annotate(
+                    samples=Count('id'),
+                    **{f'total_{name}': Sum(name) for name in VALUE_FIELDS},
+                )
+            )
+            objects = [
+                TrafficMetricRollup(
+                    resolution=resolution,
+                    bucket=row['bucket'],
+                    samples=row['samples'],
+                    **{name: row[f'total_{name}'] or 0 for name in VALUE_FIELDS},
+                )
+                for row in rows
+            ]
+            TrafficMetricRollup.objects.filter(resolution=resolution, bucket__gte=first).delete()
+            TrafficMetricRollup.objects.bulk_create(objects, batch_size=1000)
+            stats[resolution] = len(objects)
+    return stats
+
+
+def _delete_in_batches(queryset, batch_size):
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by().values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += queryset.model.objects.filter(id__in=ids).delete()[0]
+
+
+def prune_traffic_metrics(batch_size=None):
+    """
+    Удаляет сырые метрики и сводки старше срока хранения пачками по id.
+
+    Returns:
+        dict: количество удаленных строк ('raw', 'minute', 'hour', 'day')
+    """
+    batch_size = batch_size or getattr(settings, 'TRAFFIC_METRIC_PRUNE_BATCH_SIZE', 5000)
+    now = timezone.now()
+    deleted = {}
+    for resolution in RETENTION_SETTINGS:
+        days = retention_days(resolution)
+        if not days:
+            deleted[resolution] = 0
+            continue
+        border = now - timedelta(days=days)
+        if resolution == 'raw':
+            queryset = TrafficMetric.objects.filter(timestamp__lt=border)
+        else:
+            queryset = TrafficMetricRollup.objects.filter(resolution=resolution, bucket__lt=border)
+        deleted[resolution] = _delete_in_batches(queryset, batch_size)
+    return deleted
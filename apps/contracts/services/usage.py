@@ -0,0 +1,203 @@
+"""
+Учет потребления по договорам (минуты, SMS, интернет) в разрезе
+расчетных периодов.
+
+Каждое событие увеличивает счетчики UsageRecord атомарным UPDATE
+с F()-выражениями; строка периода создается при первом событии.
+По окончании периода строки закрываются пакетно: превышения по всем
+договорам тарифицируются одним векторным проходом (apps.tariffs.rating).
+"""
+import logging
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Value, When
+from django.utils import timezone
+
+from apps.contracts.models import UsageRecord
+from apps.tariffs.models import Tariff
+
+logger = logging.getLogger(__name__)
+
+MB_PER_GB = Decimal('1024')
+
+
+def usage_period_for(contract, today=None):
+    """
+    Расчетный период договора, в который попадает дата today.
+
+    Периоды привязаны к дате списания абонплаты: период заканчивается
+    в next_billing_date. Если дата списания не задана — календарный месяц.
+
+    Returns:
+        tuple: (period_start, period_end), period_end не включается
+    """
+    today = today or timezone.now().date()
+    period_end = contract.next_billing_date
+    if not period_end:
+        period_start = today.replace(day=1)
+        return period_start, period_start + relativedelta(months=1)
+
+    period_start = period_end - relativedelta(months=1)
+    while today < period_start:
+        period_end = period_start
+        period_start = period_end - relativedelta(months=1)
+    while today >= period_end:
+        period_start = period_end
+        period_end = period_start + relativedelta(months=1)
+    return period_start, period_end
+
+
+def record_usage(contract, minutes=0, sms=0, data_mb=Decimal('0'), today=None):
+    """
+    Увеличивает счетчики потребления договора за текущий период.
+
+    Обычно это один UPDATE; при первом событии периода строка создается.
+    """
+    minutes = int(minutes or 0)
+    sms = int(sms or 0)
+    data_mb = Decimal(str(data_mb or 0))
+    if not (minutes or sms or data_mb):
+        return
+
+    period_start, period_end = usage_period_for(contract, today)
+    counters = UsageRecord.objects.filter(contract_id=contract.pk, period_start=period_start)
+    increments = {
+        'minutes': F('minutes') + minutes,
+        'sms': F('sms') + sms,
+        'data_mb': F('data_mb') + data_mb,
+        'updated_at': timezone.now(),
+    }
+
+    if counters.update(**increments):
+        return
+
+    try:
+        with transaction.atomic():
+            UsageRecord.objects.create(
+                contract_id=contract.pk,
+                period_start=period_start,
+                period_end=period_end,
+                minutes=minutes,
+                sms=sms,
+                data_mb=data_mb,
+            )
+    except IntegrityError:
+        # Строку периода параллельно создал другой процесс
+        counters.update(**increments)
+
+
+def lock_usage_records(contracts, today=None):
+    """
+    Возвращает строки текущего периода для набора договоров, заблокированные
+    для обновления (создает недостающие одним bulk_create).
+
+    Вызывается внутри transaction.atomic().
+
+    Returns:
+        dict: contract_id -> UsageRecord
+    """
+    periods = {contract.pk: usage_period_for(contract, today) for contract in contracts}
+    if not periods:
+        return {}
+
+    UsageRecord.objects.bulk_create(
+        [
+            UsageRecord(contract_id=contract_id, period_start=period_start, period_end=period_end)
+            for contract_id, (period_start, period_end) in periods.items()
+        ],
+        ignore_conflicts=True,
+    )
+    records = UsageRecord.objects.select_for_update().filter(
+        contract_id__in=list(periods),
+        period_start__in={period_start for period_start, _ in periods.values()},
+    )
+    return {
+        record.contract_id: record
+        for record in records
+        if periods[record.contract_id][0] == record.period_start
+    }
+
+
+def _case_by_pk(pks, usage, position, output_field):
+    """CASE pk WHEN ... THEN <приращение счетчика> для пакетного UPDATE."""
+    return Case(
+        *[When(pk=pk, then=Value(usage[contract_id][position])) for contract_id, pk in pks.items()],
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+def increment_usage_records(records, usage, batch_size=500):
+    """
+    Пакетно увеличивает счетчики: один UPDATE с CASE по id строки на чанк.
+
+    Args:
+        records: dict contract_id -> UsageRecord (из lock_usage_records)
+        usage: dict contract_id -> (минуты, SMS, МБ)
+    """
+    now = timezone.now()
+    contract_ids = [contract_id for contract_id in usage if contract_id in records]
+
+    for start in range(0, len(contract_ids), batch_size):
+        batch = contract_ids[start:start + batch_size]
+        pks = {contract_id: records[contract_id].pk for contract_id in batch}
+        UsageRecord.objects.filter(pk__in=list(pks.values())).update(
+            minutes=F('minutes') + _case_by_pk(pks, usage, 0, IntegerField()),
+            sms=F('sms') + _case_by_pk(pks, usage, 1, IntegerField()),
+            data_mb=F('data_mb') + _case_by_pk(pks, usage, 2, DecimalField(max_digits=14, decimal_places=2)),
+            updated_at=now,
+        )
+
+    for contract_id in contract_ids:
+        minutes, sms, data_mb = usage[contract_id]
+        record = records[contract_id]
+        record.minutes += minutes
+        record.sms += sms
+        record.data_mb += data_mb
+
+
+def close_usage_periods(today=None, batch_size=1000):
+    """
+    Закрывает истекшие периоды потребления и фиксирует стоимость превышений.
+
+    Превышения по всем закрываемым строкам считаются векторно
+    (rate_overage_mixed) и записываются через bulk_update.
+
+    Returns:
+        int: количество закрытых периодов
+    """
+    from apps.tariffs.rating import rate_overage_mixed, tyiyn_to_decimal
+
+    today = today or timezone.now().date()
+    now = timezone.now()
+    closed = 0
+
+    while True:
+        records = list(
+            UsageRecord.objects.filter(is_closed=False, period_end__lte=today)
+            .select_related('contract')
+            .order_by('id')[:batch_size]
+        )
+        if not records:
+            return closed
+
+        tariff_ids = [record.contract.tariff_id for record in records]
+        tariffs = Tariff.objects.filter(id__in=set(tariff_ids))
+        costs = tyiyn_to_decimal(rate_overage_mixed(
+            tariffs,
+            tariff_ids,
+            [record.minutes for record in records],
+            [record.sms for record in records],
+            [record.data_mb / MB_PER_GB for record in records],
+        ))
+
+        for record, cost in zip(records, costs):
+            record.overage_cost = cost
+            record.is_closed = True
+            record.closed_at = now
+            record.updated_at = now
+
+        UsageRecord.objects.bulk_update(records, ['overage_cost', 'is_closed', 'closed_at', 'updated_at'])
+        closed += len(records)
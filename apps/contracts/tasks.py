@@ -1,48 +1,143 @@
 """
 Celery задачи для автоматического биллинга.
 """
+import logging
+
 from celery import shared_task
 from django.utils import timezone
 from apps.contracts.models import Contract
 
+logger = logging.getLogger(__name__)
+
 
 @shared_task
-def charge_monthly_fees():
+def charge_monthly_fees(bulk=None, parallel=None):
     """
     Ежедневная задача для списания абонентской платы.
     Проверяет все активные договоры и списывает плату, если подошла дата.
+
+    При parallel должники делятся на диапазоны id, партиции расходятся
+    по воркерам через chord, а summarize_billing_partitions сводит
+    счетчики в тот же формат ответа. Сама задача в этом случае возвращает
+    счетчики уже завершенных партиций (charged, failed, total) и
+    дополнительно partitions — число запущенных партиций — и
+    summary_task_id — id задачи с итоговой сводкой.
+
+    Прогресс каждой партиции хранится в BillingRun: перезапуск после сбоя
+    продолжает незавершенные партиции с контрольной точки, а повторный
+    запуск завершенного прогона возвращает сохраненный итог.
+
+    Args:
+        bulk: пакетный режим (по умолчанию settings.BILLING_BULK_MODE);
+              при False договоры списываются поштучно
+        parallel: разбивать ли прогон на партиции
+                  (по умолчанию settings.BILLING_PARALLEL)
     """
-    today = timezone.now().date()
-    contracts_to_charge = Contract.objects.filter(
-        status='active',
-        next_billing_date__lte=today
+    from celery import chord
+    from django.conf import settings
+    from apps.contracts.models import BillingRun
+    from apps.contracts.services.billing import (
+        merge_billing_results,
+        open_billing_runs,
+        split_billing_partitions,
     )
 
-    charged_count = 0
-    failed_count = 0
+    today = timezone.now().date()
+    if bulk is None:
+        bulk = getattr(settings, 'BILLING_BULK_MODE', True)
+    if parallel is None:
+        parallel = getattr(settings, 'BILLING_PARALLEL', True)
+
+    runs = list(BillingRun.objects.filter(run_date=today).order_by('range_start'))
+    if runs and all(run.status == 'completed' for run in runs):
+        return merge_billing_results(run.as_result() for run in runs)
 
-    for contract in contracts_to_charge:
-        try:
-            due_date = contract.next_billing_date or today
-            contract.charge_monthly_fee(billing_date=due_date)
-            charged_count += 1
+    if not runs:
+        partitions = split_billing_partitions(today) if parallel else [(None, None)]
+        runs = open_billing_runs(today, partitions)
 
-        except Exception as e:
-            failed_count += 1
-            print(f"Ошибка списания для договора {contract.number}: {str(e)}")
+    if len(runs) == 1:
+        return charge_monthly_fees_partition(runs[0].id, bulk)
 
-    return {
-        'charged': charged_count,
-        'failed': failed_count,
-        'total': contracts_to_charge.count()
-    }
+    options = {}
+    queue = getattr(settings, 'BILLING_QUEUE', '')
+    if queue:
+        options['queue'] = queue
+
+    header = [
+        charge_monthly_fees_partition.signature((run.id, bulk), **options)
+        for run in runs
+        if run.status != 'completed'
+    ]
+    summary = merge_billing_results(run.as_result() for run in runs if run.status == 'completed')
+    result = chord(header)(summarize_billing_partitions.s(today.isoformat()))
+
+    summary['partitions'] = len(header)
+    summary['summary_task_id'] = result.id
+    return summary
 
 
 @shared_task
-def check_and_suspend_low_balance():
+def charge_monthly_fees_partition(run_id, bulk=True):
+    """
+    Списание абонплаты для одной партиции должников (прогона BillingRun).
+
+    Args:
+        run_id: ID прогона
+        bulk: пакетный или поштучный режим
+    """
+    from apps.contracts.models import BillingRun
+    from apps.contracts.services.billing import execute_billing_run
+
+    run = BillingRun.objects.get(pk=run_id)
+    return execute_billing_run(run, bulk=bulk)
+
+
+@shared_task
+def summarize_billing_partitions(results, billing_date):
+    """
+    Callback chord: сводит итоги всех партиций за дату прогона.
+
+    Счетчики берутся из BillingRun, поэтому после перезапуска
+    учитываются и партиции, завершенные в предыдущей попытке.
+    """
+    from datetime import date
+    from apps.contracts.models import BillingRun
+    from apps.contracts.services.billing import merge_billing_results
+
+    runs = BillingRun.objects.filter(run_date=date.fromisoformat(billing_date))
+    summary = merge_billing_results(run.as_result() for run in runs)
+    logger.info(
+        'Биллинг за %s завершен: списано %s, ошибок %s, всего %s',
+        billing_date, summary['charged'], summary['failed'], summary['total'],
+    )
+    return summary
+
+
+@shared_task
+def check_and_suspend_low_balance(bulk=None):
     """
     Проверка договоров с низким балансом и автоматическая приостановка.
+
+    В пакетном режиме статусы договоров и SIM меняются set-based UPDATE
+    чанками, а уведомления отправляются отдельной задачей на чанк.
+
+    Args:
+        bulk: пакетный режим (по умолчанию settings.BILLING_BULK_MODE);
+              при False договоры приостанавливаются поштучно
     """
+    from django.conf import settings
+
+    if bulk is None:
+        bulk = getattr(settings, 'BILLING_BULK_MODE', True)
+
+    if bulk:
+        from apps.contracts.services.suspension import suspend_negative_balance_contracts
+
+        return {
+            'suspended': suspend_negative_balance_contracts()
+        }
+
     suspended_count = 0
 
     # Находим активные договоры с отрицательным балансом
@@ -64,22 +159,157 @@ def check_and_suspend_low_balance():
 
 
 @shared_task
-def process_pending_payments():
+def send_suspension_notifications(contract_ids, reasons=''):
     """
-    Обработка платежей в статусе 'pending'.
+    Уведомления о приостановке для чанка договоров (пакетная приостановка).
     """
-    pending_payments = Payment.objects.filter(status='pending')
+    from apps.contracts.services.suspension import notify_suspended_contracts
+
+    return {
+        'notified': notify_suspended_contracts(contract_ids, reasons)
+    }
+
+
+@shared_task
+def process_pending_payments(batch_size=None, max_batches=None):
+    """
+    Опрос платежного шлюза по платежам в статусе 'pending'.
+
+    Платежи захватываются пачками (SKIP LOCKED), статусы запрашиваются
+    параллельно с ограничением частоты на шлюз, результаты применяются
+    пакетно. В ответе — итоги и тайминги каждой пачки.
+    """
+    from apps.payments.status_poller import poll_pending_payments
+
+    return poll_pending_payments(batch_size=batch_size, max_batches=max_batches)
+
+
+@shared_task
+def drain_webhook_inbox(batch_size=None, max_batches=None):
+    """
+    Разбор inbox callback'ов платежных шлюзов.
+
+    Записи захватываются пачками (SKIP LOCKED), поэтому задачу можно
+    запускать на нескольких воркерах одновременно. Баланс каждого
+    договора обновляется одним UPDATE на пачку.
+    """
+    from apps.payments.webhook_inbox import drain_webhook_inbox as drain
+
+    return drain(batch_size=batch_size, max_batches=max_batches)
+
+
+@shared_task
+def confirm_terminal_payments(batch_size=None, max_batches=None):
+    """
+    Зачисление платежей терминала, время подтверждения которых наступило.
+
+    Платежи захватываются пачками (SKIP LOCKED) и зачисляются пакетно;
+    очередь хранится в базе (Payment.confirm_after) и переживает перезапуск.
+    """
+    from apps.payments.terminal import confirm_terminal_payments as confirm
+
+    return confirm(batch_size=batch_size, max_batches=max_batches)
 
-    processed_count = 0
-    for payment in pending_payments:
-        try:
-            payment.process()
-            processed_count += 1
-        except Exception as e:
-            payment.status = 'failed'
-            payment.save()
-            print(f"Ошибка обработки платежа {payment.id}: {str(e)}")
+
+@shared_task
+def dispatch_notifications(batch_size=None, max_batches=None):
+    """
+    Отправка уведомлений из outbox пачками по каналам.
+    """
+    from apps.payments.notification_dispatcher import dispatch_notifications as dispatch
+
+    return dispatch(batch_size=batch_size, max_batches=max_batches)
+
+
+@shared_task
+def purge_sent_notifications():
+    """
+    Удаление отправленных уведомлений старше срока хранения.
+    """
+    from apps.payments.notification_dispatcher import purge_sent_notifications as purge
+
+    return {
+        'deleted': purge()
+    }
+
+
+@shared_task
+def trim_notification_feed():
+    """
+    Ограничение размера ленты уведомлений (глобально и на договор).
+    """
+    from apps.payments.notifications import trim_notification_feed as trim
+
+    return {
+        'deleted': trim()
+    }
+
+
+@shared_task
+def purge_idempotency_keys():
+    """
+    Удаление истекших ключей идемпотентности.
+    """
+    from apps.payments.idempotency import purge_expired_keys
+
+    return {
+        'deleted': purge_expired_keys()
+    }
+
+
+@shared_task
+def prune_traffic_metrics():
+    """
+    Удаление сырых метрик трафика и сводок старше срока хранения.
+    """
+    from apps.contracts.services.traffic_metrics import prune_traffic_metrics as prune
+
+    return {
+        'deleted': prune()
+    }
+
+
+@shared_task
+def close_usage_periods():
+    """
+    Закрытие истекших периодов потребления с расчетом стоимости превышений.
+    """
+    from apps.contracts.services.usage import close_usage_periods as close_periods
 
     return {
-        'processed': processed_count
+        'closed': close_periods()
     }
+
+
+@shared_task
+def ingest_cdr_file(path, fmt=None, batch_size=None):
+    """
+    Потоковая загрузка CDR-файла медиации (CSV/JSONL).
+    """
+    from apps.contracts.services.cdr_ingest import ingest_cdr_file as ingest
+
+    stats = ingest(path, fmt=fmt, batch_size=batch_size)
+    stats['charges'] = float(stats['charges'])
+    return stats
+
+
+@shared_task
+def snapshot_balances():
+    """
+    Ежемесячные снимки баланса на начало месяца (журнал баланса).
+    """
+    from apps.contracts.services.ledger import take_balance_snapshots
+
+    return {
+        'snapshots': take_balance_snapshots()
+    }
+
+
+@shared_task
+def run_traffic_emulator(run_id):
+    """
+    Фоновый прогон эмулятора трафика (EmulatorRun) с прогрессом и отменой.
+    """
+    from apps.contracts.services.traffic_emulator import execute_emulator_run
+
+    return execute_emulator_run(run_id)
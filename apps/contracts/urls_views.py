@@ -9,6 +9,8 @@ from .views_frontend import (
     PhoneEmulatorView,
     ContractTerminateView,
     TrafficEmulatorLiveView,
+    TrafficEmulatorRunView,
+    TrafficEmulatorRunCancelView,
 )
 
 urlpatterns = [
@@ -19,5 +21,7 @@ urlpatterns = [
     path('contracts/<int:pk>/terminate/', login_required(ContractTerminateView.as_view()), name='contract_terminate'),
     path('emulator/traffic/', login_required(TrafficEmulatorView.as_view()), name='traffic_emulator'),
     path('emulator/traffic/live/', login_required(TrafficEmulatorLiveView.as_view()), name='traffic_emulator_live'),
+    path('emulator/traffic/runs/<int:pk>/', login_required(TrafficEmulatorRunView.as_view()), name='traffic_emulator_run'),
+    path('emulator/traffic/runs/<int:pk>/cancel/', login_required(TrafficEmulatorRunCancelView.as_view()), name='traffic_emulator_run_cancel'),
     path('emulator/phone/', login_required(PhoneEmulatorView.as_view()), name='phone_emulator'),
 ]
@@ -117,7 +117,20 @@ class ContractViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def add_balance(self, request, pk=None):
-        """Пополнить баланс"""
+        """
+        Пополнить баланс.
+
+        Поддерживает заголовок Idempotency-Key: повтор запроса с тем же
+        ключом возвращает первый ответ без повторного пополнения.
+        """
+        from apps.payments.idempotency import idempotent_response
+
+        return idempotent_response(
+            request, 'contracts.add_balance', {'contract': pk, **request.data},
+            lambda: self._add_balance(request)
+        )
+
+    def _add_balance(self, request):
         contract = self.get_object()
         amount = request.data.get('amount')
 
@@ -190,6 +203,53 @@ class ContractViewSet(viewsets.ModelViewSet):
         serializer = PaymentListSerializer(payments, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def statement(self, request, pk=None):
+        """
+        Выписка по балансу за период по журналу баланса.
+
+        Параметры: date_from, date_to (YYYY-MM-DD); по умолчанию — текущий месяц.
+        """
+        from django.utils import timezone
+        from django.utils.dateparse import parse_date
+        from apps.contracts.services.ledger import build_statement
+
+        contract = self.get_object()
+        today = timezone.localdate()
+        try:
+            date_from = parse_date(request.query_params.get('date_from') or '') or today.replace(day=1)
+            date_to = parse_date(request.query_params.get('date_to') or '') or today
+        except ValueError:
+            date_from = date_to = None
+
+        if not date_from or not date_to or date_from > date_to:
+            return Response({
+                'status': 'error',
+                'message': 'Некорректный период выписки'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        statement = build_statement(contract, date_from, date_to)
+        return Response({
+            'contract': contract.number,
+            'date_from': date_from,
+            'date_to': date_to,
+            'opening_balance': statement['opening_balance'],
+            'closing_balance': statement['closing_balance'],
+            'credit': statement['credit'],
+            'debit': statement['debit'],
+            'entries': [
+                {
+                    'seq': entry.seq,
+                    'created_at': entry.created_at,
+                    'delta': entry.delta,
+                    'balance_after': entry.balance_after,
+                    'description': entry.description,
+                    'payment_id': entry.payment_id,
+                }
+                for entry in statement['entries']
+            ],
+        })
+
     @action(detail=True, methods=['get'])
     def tickets(self, request, pk=None):
         """Получить все тикеты по договору"""
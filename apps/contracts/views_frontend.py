@@ -11,9 +11,15 @@ from django.core.exceptions import ValidationError
 from django.http import JsonResponse
 from django.utils import timezone
 
-from apps.contracts.models import Contract, TrafficMetric
+from apps.contracts.models import Contract, EmulatorRun, TrafficMetric
 from apps.contracts.forms import TrafficEmulatorForm
-from apps.contracts.services.traffic_emulator import TrafficEmulator, EmulatorConfig
+from apps.contracts.services.traffic_emulator import (
+    TrafficEmulator,
+    EmulatorConfig,
+    cancel_emulator_run,
+    start_emulator_run,
+)
+from apps.contracts.services.usage import record_usage
 from apps.payments.models import Payment
 from apps.tickets.models import Ticket
 from apps.users.permissions import RoleRequiredMixin
@@ -99,23 +105,55 @@ class TrafficEmulatorView(RoleRequiredMixin, FormView):
             topup_threshold=form.cleaned_data['topup_threshold'],
             topup_amount=form.cleaned_data['topup_amount'],
             ticks=form.cleaned_data['ticks'],
+            seed=form.cleaned_data['seed'],
+            generator=form.cleaned_data['generator'],
+            data_sigma=form.cleaned_data['data_sigma'],
+            profiles=form.cleaned_data['profiles'],
         )
-        emulator = TrafficEmulator(config)
-        summary = emulator.run()
+        run = start_emulator_run(config, user=self.request.user)
         messages.success(
             self.request,
-            f"Эмулятор завершён: звонки {summary['total_calls']}, SMS {summary['total_sms']}, трафик {summary['total_data']} МБ, пополнений {summary['topups']}."
+            f"Прогон эмулятора #{run.pk} поставлен в очередь: {config.ticks} тактов."
         )
-        return super().form_valid(form)
+        return redirect(f"{self.get_success_url()}?run={run.pk}")
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['recent_metrics'] = TrafficMetric.objects.all()[:20]
         latest = TrafficMetric.objects.first()
         context['latest_metric'] = latest
+        context['recent_runs'] = EmulatorRun.objects.select_related('created_by').order_by('-created_at')[:10]
+        run_id = self.request.GET.get('run')
+        run = None
+        if run_id and run_id.isdigit():
+            run = EmulatorRun.objects.filter(pk=run_id).first()
+        if run is None:
+            run = EmulatorRun.objects.exclude(status__in=EmulatorRun.FINAL_STATUSES).order_by('-created_at').first()
+        context['current_run'] = run
         return context
 
 
+class TrafficEmulatorRunView(RoleRequiredMixin, View):
+    """Прогресс фонового прогона эмулятора (опрашивается страницей эмулятора)."""
+
+    allowed_roles = ['admin', 'supervisor']
+
+    def get(self, request, pk):
+        run = get_object_or_404(EmulatorRun, pk=pk)
+        return JsonResponse(run.as_progress())
+
+
+class TrafficEmulatorRunCancelView(RoleRequiredMixin, View):
+    allowed_roles = ['admin', 'supervisor']
+
+    def post(self, request, pk):
+        run = get_object_or_404(EmulatorRun, pk=pk)
+        if not cancel_emulator_run(run.pk):
+            return JsonResponse({'error': 'Прогон уже завершен'}, status=409)
+        run.refresh_from_db()
+        return JsonResponse(run.as_progress())
+
+
 class PhoneEmulatorView(RoleRequiredMixin, TemplateView):
     template_name = 'contracts/phone_emulator.html'
     allowed_roles = ['admin', 'operator', 'supervisor']
@@ -220,6 +258,7 @@ class PhoneEmulatorView(RoleRequiredMixin, TemplateView):
             charges=amount,
             source='phone'
         )
+        record_usage(contract, minutes=duration)
         contract.refresh_from_db()
         messages.success(
             request,
@@ -260,6 +299,7 @@ class PhoneEmulatorView(RoleRequiredMixin, TemplateView):
             charges=amount,
             source='phone'
         )
+        record_usage(contract, data_mb=data_mb)
         contract.refresh_from_db()
         messages.success(
             request,
@@ -302,6 +342,7 @@ class PhoneEmulatorView(RoleRequiredMixin, TemplateView):
             charges=amount,
             source='phone'
         )
+        record_usage(contract, sms=count)
         contract.refresh_from_db()
         messages.success(
             request,
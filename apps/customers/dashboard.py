@@ -0,0 +1,148 @@
+"""
+Статистика главной страницы (DashboardView, dashboard_stats).
+
+Все счетчики собираются условной агрегацией — один запрос на таблицу
+(абоненты, SIM-карты, договоры, тикеты, ожидающие платежи, дневная
+сводка платежей); график активности за 7 дней считается в тех же
+запросах договоров и сводки платежей.
+
+Снимок статистики хранится в общем кэше DASHBOARD_CACHE_SECONDS секунд.
+Устаревший снимок пересчитывает один процесс — тот, кто первым занял
+ключ блокировки через cache.add; остальные в это время получают
+прежний снимок, поэтому опрос главной страницы десятками операторов
+стоит одного пересчета за интервал.
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from apps.contracts.models import Contract
+from apps.customers.models import Customer
+from apps.payments.aggregates import SUCCESS_STATUSES
+from apps.payments.models import Payment, PaymentDailyAggregate
+from apps.sims.models import SIM
+from apps.tickets.models import Ticket
+
+SNAPSHOT_CACHE_KEY = 'dashboard:snapshot:v1'
+REFRESH_LOCK_KEY = 'dashboard:snapshot:refresh'
+# Снимок хранится в кэше дольше своего срока, чтобы отдавать его во время пересчета
+STALE_FACTOR = 10
+# Ожидание первого снимка, пока его считает другой процесс
+WAIT_ATTEMPTS = 20
+WAIT_INTERVAL = 0.05
+ACTIVITY_DAYS = 7
+
+
+def compute_dashboard_stats():
+    """
+    Считает статистику главной страницы.
+
+    Returns:
+        dict: счетчики для шаблона и activity_data для графика за 7 дней
+    """
+    now = timezone.now()
+    today = timezone.localdate()
+    month_ago = now - timedelta(days=30)
+    days = [today - timedelta(days=offset) for offset in range(ACTIVITY_DAYS - 1, -1, -1)]
+    day_starts = [timezone.make_aware(datetime.combine(day, datetime.min.time())) for day in days]
+
+    customers = Customer.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status='active')),
+        new_month=Count('id', filter=Q(created_at__gte=month_ago)),
+    )
+    sims = SIM.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status='active')),
+        free=Count('id', filter=Q(status='free')),
+    )
+    contracts = Contract.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status='active')),
+        new_month=Count('id', filter=Q(created_at__gte=month_ago)),
+        **{
+            f'day_{index}': Count('id', filter=Q(created_at__gte=start, created_at__lt=start + timedelta(days=1)))
+            for index, start in enumerate(day_starts)
+        },
+    )
+    tickets = Ticket.objects.aggregate(
+        total=Count('id'),
+        open=Count('id', filter=Q(status__in=['new', 'in_progress'])),
+        unassigned=Count('id', filter=Q(status='new', assigned_to__isnull=True)),
+    )
+    payments_pending = Payment.objects.filter(status='pending').count()
+    payments = PaymentDailyAggregate.objects.filter(status__in=SUCCESS_STATUSES).aggregate(
+        payments=Sum('count'),
+        revenue_total=Sum('amount', filter=Q(transaction_type='payment')),
+        revenue_month=Sum('amount', filter=Q(transaction_type='payment', date__gte=today - timedelta(days=30))),
+        **{f'day_{index}': Sum('count', filter=Q(date=day)) for index, day in enumerate(days)},
+    )
+
+    return {
+        'customers_total': customers['total'],
+        'customers_active': customers['active'],
+        'customers_new_month': customers['new_month'],
+        'sims_total': sims['total'],
+        'sims_active': sims['active'],
+        'sims_free': sims['free'],
+        'contracts_total': contracts['total'],
+        'contracts_active': contracts['active'],
+        'contracts_new_month': contracts['new_month'],
+        'tickets_total': tickets['total'],
+        'tickets_open': tickets['open'],
+        'tickets_unassigned': tickets['unassigned'],
+        'payments_total': payments['payments'] or 0,
+        'payments_pending': payments_pending,
+        'revenue_total': payments['revenue_total'] or 0,
+        'revenue_month': payments['revenue_month'] or 0,
+        'activity_data': [
+            {
+                'date': day.strftime('%d.%m'),
+                'contracts': contracts[f'day_{index}'],
+                'payments': payments[f'day_{index}'] or 0,
+            }
+            for index, day in enumerate(days)
+        ],
+    }
+
+
+def get_dashboard_stats():
+    """
+    Статистика главной страницы из общего кэша (single-flight пересчет).
+
+    Returns:
+        dict: см. compute_dashboard_stats
+    """
+    ttl = getattr(settings, 'DASHBOARD_CACHE_SECONDS', 15)
+    if ttl <= 0:
+        return compute_dashboard_stats()
+
+    snapshot = cache.get(SNAPSHOT_CACHE_KEY)
+    if snapshot is not None and snapshot['expires_at'] > time.time():
+        return snapshot['stats']
+
+    if cache.add(REFRESH_LOCK_KEY, True, timeout=max(ttl, 30)):
+        try:
+            stats = compute_dashboard_stats()
+            cache.set(
+                SNAPSHOT_CACHE_KEY,
+                {'stats': stats, 'expires_at': time.time() + ttl},
+                timeout=ttl * STALE_FACTOR,
+            )
+        finally:
+            cache.delete(REFRESH_LOCK_KEY)
+        return stats
+
+    # Пересчитывает другой процесс: отдаем прежний снимок или ждем первый
+    if snapshot is not None:
+        return snapshot['stats']
+    for _ in range(WAIT_ATTEMPTS):
+        time.sleep(WAIT_INTERVAL)
+        snapshot = cache.get(SNAPSHOT_CACHE_KEY)
+        if snapshot is not None:
+            return snapshot['stats']
+    return compute_dashboard_stats()
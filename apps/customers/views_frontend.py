@@ -7,14 +7,16 @@ Frontend views для отображения данных в HTML.
 
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import TemplateView, ListView, DetailView, CreateView, UpdateView, FormView, View
-from django.db.models import Sum, Q
+from django.db.models import Q
 from django.urls import reverse_lazy, reverse
 from django.contrib import messages
 from django.http import HttpResponse, JsonResponse
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.contrib.auth.decorators import login_required
 
+from apps.customers.dashboard import get_dashboard_stats
 from apps.customers.models import Customer
 from apps.contracts.models import Contract, TrafficMetric
 from apps.payments.models import Payment
@@ -41,47 +43,8 @@ class DashboardView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Статистика по абонентам
-        context['customers_total'] = Customer.objects.count()
-        context['customers_active'] = Customer.objects.filter(status='active').count()
-        context['customers_new_month'] = Customer.objects.filter(
-            created_at__gte=datetime.now() - timedelta(days=30)
-        ).count()
-
-        # Статистика по SIM-картам
-        context['sims_total'] = SIM.objects.count()
-        context['sims_active'] = SIM.objects.filter(status='active').count()
-        context['sims_free'] = SIM.objects.filter(status='free').count()
-
-        # Статистика по договорам
-        context['contracts_total'] = Contract.objects.count()
-        context['contracts_active'] = Contract.objects.filter(status='active').count()
-        context['contracts_new_month'] = Contract.objects.filter(
-            created_at__gte=datetime.now() - timedelta(days=30)
-        ).count()
-
-        # Статистика по тикетам
-        context['tickets_total'] = Ticket.objects.count()
-        context['tickets_open'] = Ticket.objects.filter(
-            Q(status='new') | Q(status='in_progress')
-        ).count()
-        context['tickets_unassigned'] = Ticket.objects.filter(
-            assigned_to__isnull=True,
-            status='new'
-        ).count()
-
-        # Статистика по платежам
-        context['payments_total'] = Payment.objects.filter(status__in=SUCCESS_STATUSES).count()
-        context['payments_pending'] = Payment.objects.filter(status='pending').count()
-        context['revenue_total'] = Payment.objects.filter(
-            status__in=SUCCESS_STATUSES,
-            transaction_type='payment'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        context['revenue_month'] = Payment.objects.filter(
-            status__in=SUCCESS_STATUSES,
-            transaction_type='payment',
-            payment_date__gte=datetime.now() - timedelta(days=30)
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        # Счетчики и график активности — снимок из общего кэша
+        context.update(get_dashboard_stats())
 
         # Последние тикеты (5 штук)
         context['recent_tickets'] = Ticket.objects.select_related(
@@ -93,32 +56,6 @@ class DashboardView(TemplateView):
             'contract', 'contract__customer'
         ).filter(status__in=SUCCESS_STATUSES).order_by('-payment_date')[:5]
 
-        # Данные для графика активности за последние 7 дней
-        today = datetime.now().date()
-        activity_data = []
-        for i in range(6, -1, -1):
-            date = today - timedelta(days=i)
-            date_start = datetime.combine(date, datetime.min.time())
-            date_end = datetime.combine(date, datetime.max.time())
-
-            contracts_count = Contract.objects.filter(
-                created_at__gte=date_start,
-                created_at__lte=date_end
-            ).count()
-
-            payments_count = Payment.objects.filter(
-                payment_date__gte=date_start,
-                payment_date__lte=date_end,
-                status__in=SUCCESS_STATUSES
-            ).count()
-
-            activity_data.append({
-                'date': date.strftime('%d.%m'),
-                'contracts': contracts_count,
-                'payments': payments_count,
-            })
-
-        context['activity_data'] = activity_data
         context['traffic_snapshot'] = TrafficMetric.objects.first()
 
         return context
@@ -129,8 +66,7 @@ def dashboard_stats(request):
     HTMX endpoint для динамического обновления статистики.
     Возвращает только HTML фрагмент со статистикой.
     """
-    context = DashboardView().get_context_data()
-    return render(request, 'partials/dashboard_stats.html', context)
+    return render(request, 'partials/dashboard_stats.html', get_dashboard_stats())
 
 
 def recent_tickets(request):
@@ -155,17 +91,105 @@ def recent_payments(request):
     return render(request, 'partials/recent_payments.html', {'payments': payments})
 
 
+TRAFFIC_RANGE_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+TRAFFIC_LABEL_FORMATS = {'raw': '%H:%M:%S', 'minute': '%H:%M', 'hour': '%d.%m %H:00', 'day': '%d.%m.%Y'}
+
+
+def _parse_traffic_period(request):
+    """
+    Период графика из ?range=30m|24h|30d или ?from=&to= (ISO).
+
+    Returns:
+        tuple: (начало, конец) или None — период не задан
+
+    Raises:
+        ValueError: некорректные параметры
+    """
+    now = timezone.now()
+    period = request.GET.get('range', '').strip().lower()
+    if period:
+        unit = TRAFFIC_RANGE_UNITS.get(period[-1:])
+        if unit is None or not period[:-1].isdigit() or int(period[:-1]) <= 0:
+            raise ValueError('range: ожидается число с единицей m, h или d (например, 24h)')
+        try:
+            return now - timedelta(**{unit: int(period[:-1])}), now
+        except OverflowError:
+            raise ValueError('range: слишком большой период') from None
+
+    if not request.GET.get('from'):
+        return None
+    bounds = []
+    for name, default in (('from', None), ('to', now)):
+        value = request.GET.get(name)
+        if not value:
+            bounds.append(default)
+            continue
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(f'{name}: ожидается дата или время в формате ISO')
+            moment = datetime.combine(day, datetime.min.time())
+        try:
+            moment = timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+            # Граница должна переводиться в UTC для запроса к сводкам
+            moment.astimezone(dt_timezone.utc)
+        except OverflowError:
+            raise ValueError(f'{name}: дата вне допустимого диапазона') from None
+        bounds.append(moment)
+    if bounds[0] >= bounds[1]:
+        raise ValueError('from должен быть раньше to')
+    return tuple(bounds)
+
+
 @login_required
 def traffic_metrics_data(request):
-    metrics = list(TrafficMetric.objects.order_by('-timestamp')[:20])
-    metrics.reverse()
-    data = {
-        'labels': [m.timestamp.strftime('%H:%M:%S') for m in metrics],
-        'calls': [m.calls for m in metrics],
-        'sms': [m.sms for m in metrics],
-        'data': [float(m.data_mb) for m in metrics],
-    }
-    return JsonResponse(data)
+    """
+    Данные графика нагрузки сети.
+
+    Без периода — последние 20 сырых метрик (живой график). С периодом
+    (?range= или ?from=&to=) — ряд из сводок; разрешение ?resolution=
+    minute|hour|day или выбирается автоматически (до 720 точек).
+    """
+    from apps.contracts.services.traffic_metrics import (
+        RESOLUTIONS,
+        SERIES_MAX_POINTS,
+        pick_resolution,
+        traffic_series,
+    )
+
+    try:
+        period = _parse_traffic_period(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    resolution = request.GET.get('resolution', 'auto')
+
+    if period is None or resolution == 'raw':
+        metrics = list(TrafficMetric.objects.order_by('-timestamp')[:20])
+        metrics.reverse()
+        return JsonResponse({
+            'resolution': 'raw',
+            'labels': [timezone.localtime(m.timestamp).strftime('%H:%M:%S') for m in metrics],
+            'calls': [m.calls for m in metrics],
+            'sms': [m.sms for m in metrics],
+            'data': [float(m.data_mb) for m in metrics],
+        })
+
+    if resolution == 'auto':
+        resolution = pick_resolution(*period)
+    elif resolution not in RESOLUTIONS:
+        return JsonResponse({'error': 'resolution: ожидается auto, raw, minute, hour или day'}, status=400)
+    if (period[1] - period[0]) / RESOLUTIONS[resolution] > SERIES_MAX_POINTS * 10:
+        return JsonResponse({'error': 'Слишком много точек: сократите период или выберите более крупное разрешение'}, status=400)
+    resolution, series = traffic_series(*period, resolution=resolution)
+    label_format = TRAFFIC_LABEL_FORMATS[resolution]
+    return JsonResponse({
+        'resolution': resolution,
+        'labels': [timezone.localtime(row['bucket']).strftime(label_format) for row in series],
+        'calls': [row['calls'] for row in series],
+        'sms': [row['sms'] for row in series],
+        'data': [float(row['data_mb']) for row in series],
+    })
 
 
 class CustomerListView(ListView):
@@ -1,5 +1,12 @@
 from django.contrib import admin
-from .models import Payment
+from .models import (
+    NotificationOutbox,
+    Payment,
+    PaymentDailyAggregate,
+    SettlementDiscrepancy,
+    SettlementReport,
+    WebhookInboxEntry,
+)
 
 
 @admin.register(Payment)
@@ -68,3 +75,126 @@ class PaymentAdmin(admin.ModelAdmin):
         """Оптимизация запросов"""
         qs = super().get_queryset(request)
         return qs.select_related('contract', 'contract__customer', 'processed_by')
+
+
+@admin.register(WebhookInboxEntry)
+class WebhookInboxEntryAdmin(admin.ModelAdmin):
+    """Админ-панель для inbox callback'ов платежных шлюзов"""
+
+    list_display = (
+        'id',
+        'gateway',
+        'transaction_id',
+        'event_status',
+        'status',
+        'attempts',
+        'payment',
+        'received_at',
+        'processed_at',
+    )
+
+    list_filter = (
+        'status',
+        'event_status',
+        'gateway',
+    )
+
+    search_fields = ('transaction_id',)
+
+    readonly_fields = (
+        'dedup_key',
+        'received_at',
+        'processed_at',
+        'updated_at',
+    )
+
+    ordering = ('-id',)
+    list_per_page = 50
+
+    raw_id_fields = ('payment',)
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    """Админ-панель для исходящих уведомлений"""
+
+    list_display = (
+        'id',
+        'channel',
+        'recipient',
+        'subject',
+        'status',
+        'attempts',
+        'next_attempt_at',
+        'created_at',
+        'sent_at',
+    )
+
+    list_filter = (
+        'status',
+        'channel',
+    )
+
+    search_fields = ('recipient', 'subject')
+
+    readonly_fields = (
+        'created_at',
+        'sent_at',
+        'updated_at',
+    )
+
+    ordering = ('-id',)
+    list_per_page = 50
+
+    raw_id_fields = ('contract',)
+
+
+@admin.register(PaymentDailyAggregate)
+class PaymentDailyAggregateAdmin(admin.ModelAdmin):
+    """Дневные сводки платежей (только просмотр; пересчет — rebuild_payment_aggregates)"""
+
+    list_display = ('date', 'transaction_type', 'payment_method', 'status', 'count', 'amount')
+    list_filter = ('status', 'transaction_type', 'payment_method')
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SettlementReport)
+class SettlementReportAdmin(admin.ModelAdmin):
+    """Отчеты сверки реестров платежных шлюзов"""
+
+    list_display = (
+        'id',
+        'gateway',
+        'settlement_date',
+        'status',
+        'records',
+        'matched',
+        'amount_mismatch',
+        'status_mismatch',
+        'missing_local',
+        'missing_provider',
+        'duplicate',
+        'elapsed',
+    )
+    list_filter = ('status', 'gateway')
+    date_hierarchy = 'settlement_date'
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(SettlementDiscrepancy)
+class SettlementDiscrepancyAdmin(admin.ModelAdmin):
+    """Расхождения сверки реестров"""
+
+    list_display = ('id', 'report', 'kind', 'transaction_id', 'payment', 'provider_amount', 'local_amount', 'local_status')
+    list_filter = ('kind',)
+    search_fields = ('transaction_id',)
+    raw_id_fields = ('report', 'payment')
+    list_per_page = 50
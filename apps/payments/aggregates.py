@@ -0,0 +1,176 @@
+"""
+Дневные сводки платежей (PaymentDailyAggregate).
+
+Статистика платежей (API statistics, список платежей, главная страница)
+читает сумму по нескольким сотням строк сводки вместо агрегирования
+всей таблицы платежей.
+
+Сводка учитывает платежи в итоговых статусах (TRACKED_STATUSES) по ключу
+(дата платежа, тип операции, способ оплаты, статус). Когда платеж
+получает итоговый статус или переходит из одного итогового в другой
+(успешно -> возвращен), изменение количества и суммы применяется
+к строкам сводки в той же транзакции:
+
+    - Payment.save() — по статусу, загруженному из базы (_db_status);
+    - пакетные пути (apply_completed_payments, fail_payments, пакетное
+      списание абонплаты) вызывают record_payments сами.
+
+Изменения, внесенные в обход этих путей (ручной SQL, удаление платежей),
+исправляет полный пересчет: manage.py rebuild_payment_aggregates.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.payments.models import Payment, PaymentDailyAggregate
+
+# Итоговые статусы: платеж в них больше не меняет сумму
+TRACKED_STATUSES = ('success', 'completed', 'failed', 'refunded')
+SUCCESS_STATUSES = ('success', 'completed')
+
+
+def aggregate_key(payment, status=None):
+    """Ключ строки сводки для платежа (дата — в текущем часовом поясе)."""
+    payment_date = payment.payment_date or timezone.now()
+    return (
+        timezone.localdate(payment_date),
+        payment.transaction_type,
+        payment.payment_method,
+        status or payment.status,
+    )
+
+
+def apply_deltas(deltas):
+    """
+    Применяет изменения к строкам сводки: UPDATE на ключ,
+    недостающая строка создается (при гонке — повторный UPDATE).
+
+    Args:
+        deltas: {ключ: [количество, сумма]}
+    """
+    now = timezone.now()
+    for (date, transaction_type, payment_method, status), (count, amount) in deltas.items():
+        if not count and not amount:
+            continue
+        lookup = {
+            'date': date,
+            'transaction_type': transaction_type,
+            'payment_method': payment_method,
+            'status': status,
+        }
+        changes = {'count': F('count') + count, 'amount': F('amount') + amount, 'updated_at': now}
+        if PaymentDailyAggregate.objects.filter(**lookup).update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                PaymentDailyAggregate.objects.create(**lookup, count=count, amount=amount)
+        except IntegrityError:
+            # Строку успел создать параллельный процесс
+            PaymentDailyAggregate.objects.filter(**lookup).update(**changes)
+
+
+def record_payments(payments, old_statuses=None):
+    """
+    Учитывает в сводке платежи, получившие итоговый статус.
+
+    Args:
+        payments: платежи с уже установленным новым статусом
+        old_statuses: {id платежа: прежний статус} (по умолчанию — статус,
+                      загруженный из базы; у новых платежей его нет)
+    """
+    deltas = defaultdict(lambda: [0, Decimal('0')])
+    for payment in payments:
+        if old_statuses is not None:
+            old_status = old_statuses.get(payment.pk)
+        else:
+            old_status = getattr(payment, '_db_status', None)
+        if old_status == payment.status:
+            continue
+        if old_status in TRACKED_STATUSES:
+            delta = deltas[aggregate_key(payment, old_status)]
+            delta[0] -= 1
+            delta[1] -= payment.amount
+        if payment.status in TRACKED_STATUSES:
+            delta = deltas[aggregate_key(payment)]
+            delta[0] += 1
+            delta[1] += payment.amount
+        payment._db_status = payment.status
+    apply_deltas(deltas)
+
+
+def sync_payment_status(payment, old_status):
+    """Переносит платеж в сводке после Payment.save() (old_status=None — новый платеж)."""
+    if old_status == payment.status:
+        return
+    record_payments([payment], {payment.pk: old_status})
+
+
+def aggregate_queryset(statuses=SUCCESS_STATUSES, date_from=None, date_to=None, **filters):
+    """Строки сводки по статусам и периоду (даты включительно)."""
+    queryset = PaymentDailyAggregate.objects.filter(status__in=statuses, **filters)
+    if date_from is not None:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(date__lte=date_to)
+    return queryset
+
+
+def payment_totals(statuses=SUCCESS_STATUSES, date_from=None, date_to=None, **filters):
+    """
+    Количество и сумма платежей по сводке.
+
+    Returns:
+        dict: {'count': int, 'amount': Decimal}
+    """
+    totals = aggregate_queryset(statuses, date_from, date_to, **filters).aggregate(
+        count=Sum('count'), amount=Sum('amount')
+    )
+    return {'count': totals['count'] or 0, 'amount': totals['amount'] or Decimal('0')}
+
+
+def rebuild_payment_aggregates(date_from=None, date_to=None):
+    """
+    Пересчитывает сводку по таблице платежей (один GROUP BY).
+
+    Строки периода удаляются и создаются заново в одной транзакции.
+    Платежи, завершенные во время пересчета, могут не попасть в сводку —
+    команду запускают в спокойное время или повторяют.
+
+    Returns:
+        dict: количество строк сводки и учтенных платежей
+    """
+    payments = Payment.objects.filter(status__in=TRACKED_STATUSES).annotate(date=TruncDate('payment_date'))
+    aggregates = PaymentDailyAggregate.objects.all()
+    if date_from is not None:
+        payments = payments.filter(date__gte=date_from)
+        aggregates = aggregates.filter(date__gte=date_from)
+    if date_to is not None:
+        payments = payments.filter(date__lte=date_to)
+        aggregates = aggregates.filter(date__lte=date_to)
+
+    rows = (
+        payments.order_by()
+        .values('date', 'transaction_type', 'payment_method', 'status')
+        .annotate(payments=Count('id'), total=Sum('amount'))
+    )
+    objects = [
+        PaymentDailyAggregate(
+            date=row['date'],
+            transaction_type=row['transaction_type'],
+            payment_method=row['payment_method'],
+            status=row['status'],
+            count=row['payments'],
+            amount=row['total'] or Decimal('0'),
+        )
+        for row in rows
+    ]
+
+    with transaction.atomic():
+        aggregates.delete()
+        PaymentDailyAggregate.objects.bulk_create(objects, batch_size=1000)
+
+    return {'rows': len(objects), 'payments': sum(item.count for item in objects)}
@@ -0,0 +1,326 @@
+"""
+HTTP-клиент платежных шлюзов.
+
+Для каждого провайдера создается один клиент на процесс с постоянным
+пулом соединений (urllib3), таймаутами на подключение и чтение,
+повторами с экспоненциальной задержкой и случайным разбросом (jitter)
+и автоматическим выключателем (circuit breaker): после серии ошибок
+запросы к деградировавшему провайдеру не отправляются, пока не истечет
+пауза, затем пропускается один пробный запрос.
+
+Адреса провайдеров задаются в PAYMENT_GATEWAY_URLS
+('kaspi=https://...,halyk=https://...'); провайдер без адреса работает
+через встроенную заглушку (см. payment_gateway.py). Для тестов
+поднимается локальный HTTP-сервер заглушки (команда run_gateway_stub).
+"""
+import json
+import logging
+import random
+import threading
+import time
+
+import urllib3
+from django.conf import settings
+from urllib3.exceptions import (
+    ConnectTimeoutError,
+    EmptyPoolError,
+    HTTPError,
+    NewConnectionError,
+    ProtocolError,
+    ReadTimeoutError,
+)
+
+logger = logging.getLogger(__name__)
+
+# Ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Ошибки, при которых запрос гарантированно не дошел до провайдера
+CONNECT_ERRORS = (NewConnectionError, ConnectTimeoutError, EmptyPoolError)
+
+
+class GatewayError(Exception):
+    """Ошибка обращения к платежному шлюзу."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class CircuitOpenError(GatewayError):
+    """Выключатель разомкнут: запрос к провайдеру не отправлялся."""
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель для одного провайдера.
+
+    closed — запросы идут; после failure_threshold ошибок подряд
+    переходит в open — запросы отклоняются reset_timeout секунд;
+    затем half_open — пропускается один пробный запрос, его успех
+    замыкает выключатель, ошибка снова размыкает.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.opened_count = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Можно ли отправить запрос сейчас."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    self.rejected += 1
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened_count += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'opened_count': self.opened_count,
+                'rejected': self.rejected,
+            }
+
+
+class GatewayHttpClient:
+    """
+    Клиент одного провайдера с постоянным пулом соединений.
+
+    Пример:
+        client = get_gateway_client('kaspi')
+        data = client.request_json('GET', f'/payments/{payment_id}')
+    """
+
+    def __init__(self, name, base_url, pool_size=10, connect_timeout=2.0, read_timeout=5.0,
+                 retries=2, backoff_base=0.2, backoff_max=2.0,
+                 breaker_threshold=5, breaker_reset_timeout=30.0):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = max(1, int(pool_size))
+        self.timeout = urllib3.Timeout(connect=float(connect_timeout), read=float(read_timeout))
+        self.retries = max(0, int(retries))
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset_timeout)
+
+        self._path_prefix = urllib3.util.parse_url(self.base_url).path or ''
+        self.pool = urllib3.connection_from_url(
+            self.base_url,
+            maxsize=self.pool_size,
+            block=True,
+            timeout=self.timeout,
+            retries=False,
+            headers={'Content-Type': 'application/json', 'Accept': 'application/json'},
+        )
+
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'retries': 0,
+            'timeouts': 0,
+            'short_circuited': 0,
+            'latency_total_sec': 0.0,
+        }
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def _backoff(self, attempt):
+        """Задержка перед повтором: full jitter в пределах base * 2^attempt."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request_json(self, method, path, payload=None, idempotent=None):
+        """
+        Выполняет запрос и возвращает JSON-ответ.
+
+        Неидемпотентные запросы (по умолчанию все, кроме GET) повторяются
+        только при ошибке подключения, когда запрос точно не отправлен.
+
+        Raises:
+            CircuitOpenError: выключатель разомкнут
+            GatewayError: ошибка провайдера после всех повторов
+        """
+        if idempotent is None:
+            idempotent = method.upper() == 'GET'
+
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            raise CircuitOpenError(f'Шлюз {self.name} временно недоступен (circuit breaker)')
+
+        body = json.dumps(payload, default=str).encode('utf-8') if payload is not None else None
+        url = f'{self._path_prefix}{path}'
+        attempt = 0
+
+        while True:
+            started = time.monotonic()
+            self._count('requests')
+            retryable = False
+            try:
+                response = self.pool.urlopen(
+                    method.upper(), url,
+                    body=body,
+                    timeout=self.timeout,
+                    pool_timeout=self.timeout.connect_timeout,
+                    retries=False,
+                    release_conn=True,
+                )
+            except CONNECT_ERRORS as e:
+                error = GatewayError(f'Шлюз {self.name}: нет соединения ({e})')
+                retryable = True
+            except ReadTimeoutError as e:
+                self._count('timeouts')
+                error = GatewayError(f'Шлюз {self.name}: таймаут ответа ({e})')
+                retryable = idempotent
+            except (ProtocolError, HTTPError) as e:
+                error = GatewayError(f'Шлюз {self.name}: ошибка соединения ({e})')
+                retryable = idempotent
+            else:
+                self._count('latency_total_sec', time.monotonic() - started)
+                if response.status < 400:
+                    self.breaker.record_success()
+                    self._count('succeeded')
+                    return json.loads(response.data or b'{}')
+
+                error = GatewayError(
+                    f'Шлюз {self.name} вернул HTTP {response.status}', status=response.status
+                )
+                if response.status not in RETRY_STATUSES:
+                    # Ошибка запроса, а не провайдера: выключатель не трогаем
+                    self.breaker.record_success()
+                    self._count('failed')
+                    raise error
+                retryable = idempotent or response.status == 429
+
+            if not retryable or attempt >= self.retries:
+                self.breaker.record_failure()
+                self._count('failed')
+                logger.warning('%s (попыток: %s)', error, attempt + 1)
+                raise error
+
+            self._count('retries')
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def metrics(self):
+        """Метрики клиента: пул соединений, выключатель, счетчики запросов."""
+        with self._lock:
+            stats = dict(self._stats)
+        completed = stats['succeeded'] + stats['failed']
+        stats['avg_latency_ms'] = round(stats.pop('latency_total_sec') * 1000 / completed, 2) if completed else 0
+
+        queue = self.pool.pool
+        free_slots = queue.qsize() if queue is not None else 0
+        idle = sum(1 for conn in list(queue.queue) if conn is not None) if queue is not None else 0
+        return {
+            'gateway': self.name,
+            'base_url': self.base_url,
+            'pool': {
+                'maxsize': self.pool_size,
+                'in_use': self.pool_size - free_slots,
+                'idle': idle,
+                'connections_opened': self.pool.num_connections,
+                'requests_sent': self.pool.num_requests,
+            },
+            'breaker': self.breaker.snapshot(),
+            'requests': stats,
+        }
+
+    def close(self):
+        self.pool.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def parse_gateway_urls(value):
+    """'kaspi=http://a,halyk=http://b' -> {'kaspi': 'http://a', 'halyk': 'http://b'}"""
+    urls = {}
+    for item in (value or '').split(','):
+        name, _, url = item.partition('=')
+        if name.strip() and url.strip():
+            urls[name.strip().lower()] = url.strip()
+    return urls
+
+
+def get_gateway_client(name):
+    """
+    Клиент провайдера (один на процесс) или None, если адрес не настроен.
+    """
+    name = (name or 'default').lower()
+    client = _clients.get(name)
+    if client is not None:
+        return client
+
+    base_url = parse_gateway_urls(getattr(settings, 'PAYMENT_GATEWAY_URLS', '')).get(name)
+    if not base_url:
+        return None
+
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = GatewayHttpClient(
+                name,
+                base_url,
+                pool_size=getattr(settings, 'PAYMENT_GATEWAY_POOL_SIZE', 10),
+                connect_timeout=getattr(settings, 'PAYMENT_GATEWAY_CONNECT_TIMEOUT', 2.0),
+                read_timeout=getattr(settings, 'PAYMENT_GATEWAY_READ_TIMEOUT', 5.0),
+                retries=getattr(settings, 'PAYMENT_GATEWAY_RETRIES', 2),
+                backoff_base=getattr(settings, 'PAYMENT_GATEWAY_BACKOFF_BASE', 0.2),
+                backoff_max=getattr(settings, 'PAYMENT_GATEWAY_BACKOFF_MAX', 2.0),
+                breaker_threshold=getattr(settings, 'PAYMENT_GATEWAY_BREAKER_THRESHOLD', 5),
+                breaker_reset_timeout=getattr(settings, 'PAYMENT_GATEWAY_BREAKER_RESET_SECONDS', 30),
+            )
+        return _clients[name]
+
+
+def gateway_client_metrics():
+    """Метрики всех созданных в процессе клиентов."""
+    return [client.metrics() for client in list(_clients.values())]
+
+
+def reset_gateway_clients():
+    """Закрывает пулы и сбрасывает клиентов (смена настроек, тесты)."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,135 @@
+"""
+Локальный HTTP-сервер заглушки платежного шлюза.
+
+Реализует тот же API, что ожидает GatewayHttpClient:
+
+    POST /payments                — создание платежа (ссылка на оплату)
+    GET  /payments/<id>           — статус платежа
+    POST /payments/<id>/refund    — возврат
+    POST /messages                — отправка SMS (для диспетчера уведомлений)
+
+Сервер держит keep-alive соединения (HTTP/1.1), поэтому на нем видно
+переиспользование пула. Доля ответов 503 (error_rate) позволяет
+проверить повторы и circuit breaker.
+
+Пример:
+    server = make_stub_server(port=0, latency_ms=20, error_rate=0.1)
+    start_stub_server_thread(server)
+    # PAYMENT_GATEWAY_URLS = f'default=http://127.0.0.1:{server.server_port}'
+"""
+import json
+import random
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from apps.payments.payment_gateway import simulate_payment_status
+
+STATUS_PATH = re.compile(r'^/payments/(?P<payment_id>[\w-]+)$')
+REFUND_PATH = re.compile(r'^/payments/(?P<payment_id>[\w-]+)/refund$')
+
+
+class StubGatewayHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов заглушки; параметры берутся из self.server."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def _degraded(self):
+        """Имитация отказа провайдера с вероятностью error_rate."""
+        if random.random() < self.server.error_rate:
+            self._send_json(503, {'error': 'Service temporarily unavailable'})
+            return True
+        return False
+
+    def do_GET(self):
+        match = STATUS_PATH.match(self.path)
+        if not match:
+            self._send_json(404, {'error': 'Not found'})
+            return
+        if self._degraded():
+            return
+        self._send_json(200, simulate_payment_status(
+            match.group('payment_id'),
+            latency_ms=self.server.latency_ms,
+            success_rate=self.server.success_rate,
+            pending_rate=self.server.pending_rate,
+        ))
+
+    def do_POST(self):
+        payload = self._read_json()
+        if self._degraded():
+            return
+
+        if self.path == '/payments':
+            payment_id = str(uuid.uuid4())
+            self._send_json(201, {
+                'payment_id': payment_id,
+                'payment_url': f'http://{self.server.server_name}:{self.server.server_port}/pay/{payment_id}',
+                'amount': payload.get('amount'),
+                'status': 'pending',
+            })
+            return
+
+        if self.path == '/messages':
+            self._send_json(202, {'message_id': str(uuid.uuid4()), 'status': 'queued'})
+            return
+
+        match = REFUND_PATH.match(self.path)
+        if match:
+            self._send_json(200, {
+                'refund_id': str(uuid.uuid4()),
+                'payment_id': match.group('payment_id'),
+                'amount': payload.get('amount'),
+                'status': 'completed',
+            })
+            return
+
+        self._send_json(404, {'error': 'Not found'})
+
+
+def make_stub_server(host='127.0.0.1', port=0, latency_ms=0, success_rate=0.9,
+                     pending_rate=0.0, error_rate=0.0, verbose=False):
+    """
+    Создает сервер заглушки (port=0 — свободный порт).
+
+    Returns:
+        ThreadingHTTPServer
+    """
+    server = ThreadingHTTPServer((host, port), StubGatewayHandler)
+    server.daemon_threads = True
+    server.latency_ms = latency_ms
+    server.success_rate = success_rate
+    server.pending_rate = pending_rate
+    server.error_rate = error_rate
+    server.verbose = verbose
+    return server
+
+
+def start_stub_server_thread(server):
+    """Запускает сервер в фоновом потоке (для тестов)."""
+    thread = threading.Thread(target=server.serve_forever, name='gateway-stub', daemon=True)
+    thread.start()
+    return thread
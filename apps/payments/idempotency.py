@@ -0,0 +1,214 @@
+"""
+Идемпотентность запросов, создающих платежи и меняющих баланс.
+
+Клиент передает ключ в заголовке Idempotency-Key (HTML-формы —
+в скрытом поле idempotency_key). Первый запрос с ключом выполняется
+в одной транзакции с записью ключа, успешный ответ сохраняется вместе
+с ним. Повтор с тем же ключом находит ответ одним запросом по
+уникальному индексу (scope, key) и возвращает его, не обращаясь
+к договорам и платежам.
+
+Параллельный повтор упирается в уникальный индекс: в PostgreSQL
+вставка ждет фиксации первой транзакции, после чего повтор получает
+сохраненный ответ. Ошибочные ответы (код >= 400) и исключения
+откатываются вместе с ключом, поэтому запрос можно повторить.
+Ключ хранится IDEMPOTENCY_KEY_TTL_SECONDS, истекшие удаляет задача
+purge_idempotency_keys.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from apps.payments.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+IDEMPOTENCY_FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyError(Exception):
+    """Ключ нельзя использовать: другие параметры или запрос еще выполняется."""
+
+    def __init__(self, message, status_code=409):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _ErrorResponse(Exception):
+    """Ошибочный ответ обработчика: транзакция с ключом откатывается."""
+
+    def __init__(self, status_code, body):
+        super().__init__(status_code)
+        self.status_code = status_code
+        self.body = body
+
+
+def get_request_key(request):
+    """Ключ из заголовка Idempotency-Key или поля формы idempotency_key."""
+    key = request.META.get(IDEMPOTENCY_HEADER)
+    if not key and request.method == 'POST':
+        key = request.POST.get(IDEMPOTENCY_FIELD)
+    return (key or '').strip() or None
+
+
+def make_scope(name, user=None):
+    """Область ключа: операция и пользователь (ключи разных клиентов не пересекаются)."""
+    user_id = getattr(user, 'pk', None)
+    return f'{name}:{user_id}' if user_id else name
+
+
+def request_fingerprint(params):
+    """SHA-256 от параметров запроса (без самого ключа)."""
+    params = {name: value for name, value in dict(params).items() if name != IDEMPOTENCY_FIELD}
+    raw = json.dumps(params, sort_keys=True, cls=JSONEncoder)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _check_key(key):
+    if len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(f'Ключ идемпотентности длиннее {MAX_KEY_LENGTH} символов', status_code=400)
+
+
+def find_response(scope, key, request_hash):
+    """
+    Сохраненный ответ по ключу (один запрос по уникальному индексу).
+
+    Returns:
+        IdempotencyKey или None
+
+    Raises:
+        IdempotencyError: ключ уже использован с другими параметрами
+    """
+    _check_key(key)
+    try:
+        record = IdempotencyKey.objects.get(scope=scope, key=key, expires_at__gt=timezone.now())
+    except IdempotencyKey.DoesNotExist:
+        return None
+    if record.request_hash != request_hash:
+        raise IdempotencyError(
+            'Ключ идемпотентности уже использован с другими параметрами', status_code=422
+        )
+    return record
+
+
+def execute_once(scope, key, request_hash, handler, ttl=None):
+    """
+    Выполняет handler в одной транзакции с записью ключа.
+
+    Args:
+        handler: функция без аргументов -> (status_code, body)
+
+    Returns:
+        tuple: (status_code, body, replayed)
+    """
+    _check_key(key)
+    ttl = ttl or getattr(settings, 'IDEMPOTENCY_KEY_TTL_SECONDS', 86400)
+    now = timezone.now()
+
+    try:
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    # Истекший ключ можно использовать заново
+                    IdempotencyKey.objects.filter(scope=scope, key=key, expires_at__lte=now).delete()
+                    record = IdempotencyKey.objects.create(
+                        scope=scope,
+                        key=key,
+                        request_hash=request_hash,
+                        expires_at=now + timedelta(seconds=ttl),
+                    )
+            except IntegrityError:
+                record = None
+
+            if record is not None:
+                status_code, body = handler()
+                # Ответ в том виде, в каком его отдаст JSON-рендерер DRF
+                body = json.loads(json.dumps(body, cls=JSONEncoder))
+                if status_code >= 400:
+                    raise _ErrorResponse(status_code, body)
+                record.response_code = status_code
+                record.response_body = body
+                record.save(update_fields=['response_code', 'response_body'])
+                return status_code, body, False
+    except _ErrorResponse as error:
+        return error.status_code, error.body, False
+
+    # Ключ записал параллельный запрос
+    record = find_response(scope, key, request_hash)
+    if record is None or record.response_code is None:
+        raise IdempotencyError('Запрос с этим ключом идемпотентности еще выполняется')
+    return record.response_code, record.response_body, True
+
+
+def run_idempotent(scope, key, params, handler, ttl=None):
+    """
+    Выполняет handler один раз на ключ; без ключа — просто выполняет.
+
+    Args:
+        scope: область ключа (make_scope)
+        key: ключ идемпотентности или None
+        params: параметры запроса для проверки повтора
+        handler: функция без аргументов -> (status_code, body)
+
+    Returns:
+        tuple: (status_code, body, replayed)
+    """
+    if not key:
+        status_code, body = handler()
+        return status_code, body, False
+
+    request_hash = request_fingerprint(params)
+    record = find_response(scope, key, request_hash)
+    if record is not None:
+        return record.response_code, record.response_body, True
+    return execute_once(scope, key, request_hash, handler, ttl=ttl)
+
+
+def idempotent_response(request, name, params, handler):
+    """
+    Обертка для DRF-действий: handler() возвращает Response.
+
+    Повторный ответ помечается заголовком Idempotent-Replayed: true.
+    """
+    from rest_framework.response import Response
+
+    def run():
+        response = handler()
+        return response.status_code, response.data
+
+    try:
+        status_code, body, replayed = run_idempotent(
+            make_scope(name, request.user), get_request_key(request), params, run
+        )
+    except IdempotencyError as e:
+        return Response({'error': str(e)}, status=e.status_code)
+
+    response = Response(body, status=status_code)
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def purge_expired_keys(batch_size=5000):
+    """
+    Удаляет истекшие ключи пачками по id.
+
+    Returns:
+        int: количество удаленных ключей
+    """
+    now = timezone.now()
+    deleted = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,32 @@
+"""
+Полный пересчет дневных сводок платежей (PaymentDailyAggregate).
+
+Пример:
+    python manage.py rebuild_payment_aggregates
+    python manage.py rebuild_payment_aggregates --date-from 2025-11-01 --date-to 2025-11-30
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.payments.aggregates import rebuild_payment_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Пересчет дневных сводок платежей по таблице платежей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', help='Начало периода YYYY-MM-DD (по умолчанию — все даты)')
+        parser.add_argument('--date-to', help='Конец периода YYYY-MM-DD включительно')
+
+    def handle(self, *args, **options):
+        try:
+            date_from = date.fromisoformat(options['date_from']) if options['date_from'] else None
+            date_to = date.fromisoformat(options['date_to']) if options['date_to'] else None
+        except ValueError:
+            raise CommandError('Дата должна быть в формате YYYY-MM-DD')
+
+        stats = rebuild_payment_aggregates(date_from=date_from, date_to=date_to)
+        self.stdout.write(self.style.SUCCESS(
+            f"Строк сводки: {stats['rows']}, учтено платежей: {stats['payments']}"
+        ))
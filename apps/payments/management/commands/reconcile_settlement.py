@@ -0,0 +1,58 @@
+"""
+Сверка реестра (settlement-файла) платежного шлюза за день.
+
+Пример:
+    python manage.py reconcile_settlement kaspi_2025-11-30.csv --gateway kaspi --date 2025-11-30
+"""
+from datetime import date
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.payments.settlement import reconcile_settlement_file
+
+
+class Command(BaseCommand):
+    help = 'Потоковая сверка реестра платежного шлюза с платежами (CSV/JSONL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу реестра')
+        parser.add_argument('--gateway', required=True, help='Платежный шлюз (kaspi, halyk, default)')
+        parser.add_argument('--date', required=True, help='Дата реестра YYYY-MM-DD')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Формат файла (по умолчанию — по расширению)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Размер пакета записей (по умолчанию settings.SETTLEMENT_BATCH_SIZE)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            settlement_date = date.fromisoformat(options['date'])
+        except ValueError:
+            raise CommandError('Дата должна быть в формате YYYY-MM-DD')
+        if not Path(options['path']).is_file():
+            raise CommandError(f"Файл не найден: {options['path']}")
+
+        report = reconcile_settlement_file(
+            options['path'],
+            options['gateway'],
+            settlement_date,
+            fmt=options['format'],
+            batch_size=options['batch_size'],
+        )
+        if report.status == 'failed':
+            raise CommandError(f'Сверка #{report.pk} завершилась с ошибкой: {report.error}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Сверка #{report.pk}: записей {report.records}, совпало {report.matched} "
+            f"на {report.matched_total} с, расхождение суммы {report.amount_mismatch}, "
+            f"не зачислено у нас {report.status_mismatch}, нет у нас {report.missing_local}, "
+            f"нет в реестре {report.missing_provider}, повторов {report.duplicate}, "
+            f"ошибочных строк {report.invalid}"
+        ))
+        self.stdout.write(f"Время: {report.elapsed} с")
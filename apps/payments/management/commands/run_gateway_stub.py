@@ -0,0 +1,43 @@
+"""
+Локальный HTTP-сервер заглушки платежного шлюза.
+
+Пример:
+    python manage.py run_gateway_stub --port 8099 --latency-ms 50 --error-rate 0.05
+    # PAYMENT_GATEWAY_URLS=kaspi=http://127.0.0.1:8099,halyk=http://127.0.0.1:8099
+"""
+from django.core.management.base import BaseCommand
+
+from apps.payments.gateway_stub_server import make_stub_server
+
+
+class Command(BaseCommand):
+    help = 'Запуск локальной заглушки платежного шлюза (HTTP)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Адрес (по умолчанию 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=8099, help='Порт (по умолчанию 8099)')
+        parser.add_argument('--latency-ms', type=int, default=0, help='Задержка ответа о статусе, мс')
+        parser.add_argument('--success-rate', type=float, default=0.9, help='Доля успешных платежей')
+        parser.add_argument('--pending-rate', type=float, default=0.0, help='Доля еще не оплаченных')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 503')
+        parser.add_argument('--verbose', action='store_true', help='Логировать каждый запрос')
+
+    def handle(self, *args, **options):
+        server = make_stub_server(
+            host=options['host'],
+            port=options['port'],
+            latency_ms=options['latency_ms'],
+            success_rate=options['success_rate'],
+            pending_rate=options['pending_rate'],
+            error_rate=options['error_rate'],
+            verbose=options['verbose'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Заглушка шлюза слушает http://{options["host"]}:{server.server_port}'
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,30 @@
+# Generated by Django 5.0 on 2026-10-17 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payments", "0002_alter_payment_amount_alter_payment_balance_after"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="payment",
+            name="payment_method",
+            field=models.CharField(
+                choices=[
+                    ("cash", "Наличные"),
+                    ("card", "Банковская карта"),
+                    ("bank_transfer", "Банковский перевод"),
+                    ("mobile_payment", "Мобильный платеж"),
+                    ("auto_payment", "Автоплатеж"),
+                    ("system", "Системная операция"),
+                    ("terminal", "Терминал самообслуживания"),
+                ],
+                default="cash",
+                max_length=20,
+                verbose_name="Способ оплаты",
+            ),
+        ),
+    ]
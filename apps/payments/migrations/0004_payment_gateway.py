@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-17 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payments", "0003_alter_payment_payment_method"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="gateway",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Имя шлюза для проверки статуса (kaspi, halyk, default)",
+                max_length=20,
+                verbose_name="Платежный шлюз",
+            ),
+        ),
+    ]
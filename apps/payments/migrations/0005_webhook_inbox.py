@@ -0,0 +1,126 @@
+# Generated by Django 5.0 on 2026-10-17 02:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payments", "0004_payment_gateway"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WebhookInboxEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "gateway",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        max_length=20,
+                        verbose_name="Платежный шлюз",
+                    ),
+                ),
+                (
+                    "transaction_id",
+                    models.CharField(
+                        db_index=True,
+                        help_text="transaction_id (или payment_id) из callback",
+                        max_length=100,
+                        verbose_name="ID транзакции",
+                    ),
+                ),
+                (
+                    "event_status",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        max_length=20,
+                        verbose_name="Статус в шлюзе",
+                    ),
+                ),
+                (
+                    "dedup_key",
+                    models.CharField(
+                        max_length=150, unique=True, verbose_name="Ключ дедупликации"
+                    ),
+                ),
+                (
+                    "payload",
+                    models.JSONField(default=dict, verbose_name="Данные callback"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Ожидает обработки"),
+                            ("processing", "Обрабатывается"),
+                            ("processed", "Обработан"),
+                            ("duplicate", "Дубликат"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="Попыток обработки"
+                    ),
+                ),
+                (
+                    "error",
+                    models.TextField(blank=True, default="", verbose_name="Ошибка"),
+                ),
+                (
+                    "received_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата получения"
+                    ),
+                ),
+                (
+                    "processed_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Дата обработки"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                (
+                    "payment",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="webhook_events",
+                        to="payments.payment",
+                        verbose_name="Платеж",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Callback платежного шлюза",
+                "verbose_name_plural": "Callback'и платежных шлюзов",
+                "ordering": ["-received_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "id"], name="payments_we_status_920841_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0 on 2026-10-17 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payments", "0006_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="confirm_after",
+            field=models.DateTimeField(
+                blank=True, db_index=True, null=True, verbose_name="Подтвердить после"
+            ),
+        ),
+    ]
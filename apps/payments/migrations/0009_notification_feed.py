@@ -0,0 +1,59 @@
+# Generated by Django 5.0 on 2026-10-17 02:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contracts", "0006_balance_journal"),
+        ("payments", "0008_notification_outbox"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationFeedEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("channel", models.CharField(max_length=10, verbose_name="Канал")),
+                ("text", models.TextField(verbose_name="Текст")),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Дата создания"
+                    ),
+                ),
+                (
+                    "contract",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed_entries",
+                        to="contracts.contract",
+                        verbose_name="Договор",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Запись ленты уведомлений",
+                "verbose_name_plural": "Лента уведомлений",
+                "ordering": ["-id"],
+                "indexes": [
+                    models.Index(
+                        fields=["contract", "-id"],
+                        name="payments_no_contrac_0b3e34_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0 on 2026-10-17 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contracts", "0006_balance_journal"),
+        ("payments", "0009_notification_feed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notificationoutbox",
+            name="merged_count",
+            field=models.PositiveSmallIntegerField(
+                default=1, verbose_name="Объединено уведомлений"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notificationoutbox",
+            index=models.Index(
+                fields=["contract", "channel", "status"],
+                name="payments_no_contrac_846f83_idx",
+            ),
+        ),
+    ]
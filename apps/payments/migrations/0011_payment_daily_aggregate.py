@@ -0,0 +1,127 @@
+# Generated by Django 5.0 on 2026-10-17 02:37
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_aggregates(apps, schema_editor):
+    """Начальное заполнение сводки по существующим платежам (как rebuild_payment_aggregates)."""
+    Payment = apps.get_model("payments", "Payment")
+    PaymentDailyAggregate = apps.get_model("payments", "PaymentDailyAggregate")
+    rows = (
+        Payment.objects.filter(status__in=["success", "completed", "failed", "refunded"])
+        .annotate(date=TruncDate("payment_date"))
+        .order_by()
+        .values("date", "transaction_type", "payment_method", "status")
+        .annotate(payments=Count("id"), total=Sum("amount"))
+    )
+    PaymentDailyAggregate.objects.bulk_create(
+        [
+            PaymentDailyAggregate(
+                date=row["date"],
+                transaction_type=row["transaction_type"],
+                payment_method=row["payment_method"],
+                status=row["status"],
+                count=row["payments"],
+                amount=row["total"] or Decimal("0"),
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payments", "0010_notification_coalescing"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentDailyAggregate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Дата")),
+                (
+                    "transaction_type",
+                    models.CharField(
+                        choices=[
+                            ("payment", "Пополнение"),
+                            ("charge", "Списание"),
+                            ("refund", "Возврат"),
+                            ("correction", "Корректировка"),
+                        ],
+                        max_length=20,
+                        verbose_name="Тип транзакции",
+                    ),
+                ),
+                (
+                    "payment_method",
+                    models.CharField(
+                        choices=[
+                            ("cash", "Наличные"),
+                            ("card", "Банковская карта"),
+                            ("bank_transfer", "Банковский перевод"),
+                            ("mobile_payment", "Мобильный платеж"),
+                            ("auto_payment", "Автоплатеж"),
+                            ("system", "Системная операция"),
+                            ("terminal", "Терминал самообслуживания"),
+                        ],
+                        max_length=20,
+                        verbose_name="Способ оплаты",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Ожидает обработки"),
+                            ("processing", "Обрабатывается"),
+                            ("success", "Успешно"),
+                            ("failed", "Отклонен"),
+                            ("refunded", "Возвращен"),
+                        ],
+                        max_length=20,
+                        verbose_name="Статус",
+                    ),
+                ),
+                ("count", models.IntegerField(default=0, verbose_name="Количество")),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0"),
+                        max_digits=16,
+                        verbose_name="Сумма (с)",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+            ],
+            options={
+                "verbose_name": "Дневная сводка платежей",
+                "verbose_name_plural": "Дневные сводки платежей",
+                "ordering": ["-date"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="paymentdailyaggregate",
+            constraint=models.UniqueConstraint(
+                fields=("date", "transaction_type", "payment_method", "status"),
+                name="unique_payment_daily_aggregate",
+            ),
+        ),
+        migrations.RunPython(fill_aggregates, migrations.RunPython.noop),
+    ]
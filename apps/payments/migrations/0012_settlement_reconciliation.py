@@ -0,0 +1,221 @@
+# Generated by Django 5.0 on 2026-10-17 02:42
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payments", "0011_payment_daily_aggregate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SettlementReport",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "gateway",
+                    models.CharField(max_length=20, verbose_name="Платежный шлюз"),
+                ),
+                (
+                    "settlement_date",
+                    models.DateField(db_index=True, verbose_name="Дата реестра"),
+                ),
+                (
+                    "file_name",
+                    models.CharField(blank=True, max_length=255, verbose_name="Файл"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("running", "Выполняется"),
+                            ("completed", "Завершена"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="running",
+                        max_length=20,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "records",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Записей в реестре"
+                    ),
+                ),
+                (
+                    "matched",
+                    models.PositiveIntegerField(default=0, verbose_name="Совпало"),
+                ),
+                (
+                    "amount_mismatch",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Расхождение суммы"
+                    ),
+                ),
+                (
+                    "status_mismatch",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Не зачислены у нас"
+                    ),
+                ),
+                (
+                    "missing_local",
+                    models.PositiveIntegerField(default=0, verbose_name="Нет у нас"),
+                ),
+                (
+                    "missing_provider",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Нет в реестре"
+                    ),
+                ),
+                (
+                    "invalid",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Ошибочных строк"
+                    ),
+                ),
+                (
+                    "provider_total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0"),
+                        max_digits=16,
+                        verbose_name="Сумма по реестру (с)",
+                    ),
+                ),
+                (
+                    "matched_total",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0"),
+                        max_digits=16,
+                        verbose_name="Сумма совпавших (с)",
+                    ),
+                ),
+                ("elapsed", models.FloatField(default=0, verbose_name="Время, с")),
+                ("error", models.TextField(blank=True, verbose_name="Ошибка")),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата создания"
+                    ),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Дата завершения"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Сверка реестра",
+                "verbose_name_plural": "Сверки реестров",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["gateway", "-settlement_date"],
+                        name="payments_se_gateway_179deb_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="SettlementDiscrepancy",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("amount_mismatch", "Расхождение суммы"),
+                            ("status_mismatch", "Не зачислен у нас"),
+                            ("missing_local", "Нет у нас"),
+                            ("missing_provider", "Нет в реестре"),
+                        ],
+                        max_length=20,
+                        verbose_name="Тип",
+                    ),
+                ),
+                (
+                    "transaction_id",
+                    models.CharField(max_length=100, verbose_name="ID транзакции"),
+                ),
+                (
+                    "provider_amount",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=10,
+                        null=True,
+                        verbose_name="Сумма в реестре (с)",
+                    ),
+                ),
+                (
+                    "local_amount",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=10,
+                        null=True,
+                        verbose_name="Сумма у нас (с)",
+                    ),
+                ),
+                (
+                    "local_status",
+                    models.CharField(
+                        blank=True, max_length=20, verbose_name="Статус у нас"
+                    ),
+                ),
+                (
+                    "payment",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="settlement_discrepancies",
+                        to="payments.payment",
+                        verbose_name="Платеж",
+                    ),
+                ),
+                (
+                    "report",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="discrepancies",
+                        to="payments.settlementreport",
+                        verbose_name="Сверка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Расхождение сверки",
+                "verbose_name_plural": "Расхождения сверки",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["report", "kind"], name="payments_se_report__3da8fb_idx"
+                    )
+                ],
+            },
+        ),
+    ]
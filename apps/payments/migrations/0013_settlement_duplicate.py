@@ -0,0 +1,34 @@
+# Generated by Django 5.0 on 2026-10-17 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payments", "0012_settlement_reconciliation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="settlementreport",
+            name="duplicate",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Повторов в реестре"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="settlementdiscrepancy",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("amount_mismatch", "Расхождение суммы"),
+                    ("status_mismatch", "Не зачислен у нас"),
+                    ("missing_local", "Нет у нас"),
+                    ("missing_provider", "Нет в реестре"),
+                    ("duplicate", "Повтор в реестре"),
+                ],
+                max_length=20,
+                verbose_name="Тип",
+            ),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from decimal import Decimal
 
 
@@ -100,6 +101,15 @@ class Payment(models.Model):
         help_text='Уникальный идентификатор транзакции во внешней платежной системе'
     )
 
+    # Платежный шлюз, через который создан платеж
+    gateway = models.CharField(
+        'Платежный шлюз',
+        max_length=20,
+        blank=True,
+        default='',
+        help_text='Имя шлюза для проверки статуса (kaspi, halyk, default)'
+    )
+
     # Описание платежа
     description = models.TextField(
         'Описание',
@@ -108,6 +118,15 @@ class Payment(models.Model):
         help_text='Назначение платежа или причина списания'
     )
 
+    # Отложенное подтверждение (терминал): платеж зачисляется задачей
+    # confirm_terminal_payments, когда наступит это время
+    confirm_after = models.DateTimeField(
+        'Подтвердить после',
+        null=True,
+        blank=True,
+        db_index=True
+    )
+
     # Информация об обработке
     processed_at = models.DateTimeField(
         'Дата обработки',
@@ -174,53 +193,129 @@ class Payment(models.Model):
         if self.transaction_type == 'charge' and self.amount <= 0:
             raise ValidationError({'amount': 'Сумма списания должна быть положительной'})
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Статус в базе: по нему save() переносит платеж в дневной сводке
+        instance._db_status = instance.__dict__.get('status')
+        return instance
+
     def save(self, *args, **kwargs):
-        """Переопределяем save для обработки платежа"""
-        is_new = self.pk is None
+        """
+        Переопределяем save для обработки платежа.
 
-        super().save(*args, **kwargs)
+        Новый успешный платеж применяется к балансу в той же транзакции
+        до INSERT: balance_after и processed_at записываются сразу,
+        без повторного UPDATE платежа и refresh_from_db договора.
+        Смена итогового статуса отражается в дневной сводке
+        (PaymentDailyAggregate) в той же транзакции.
+        """
+        from django.db import transaction as db_transaction
+        from apps.payments.aggregates import sync_payment_status
 
-        # Если платеж новый и статус "успешно", обрабатываем его
-        if is_new and self.status == 'success':
-            self.process()
+        old_status = None if self._state.adding else getattr(self, '_db_status', self.status)
+
+        if self.pk is not None or self.status != 'success' or self.processed_at:
+            with db_transaction.atomic():
+                super().save(*args, **kwargs)
+                sync_payment_status(self, old_status)
+            return
+
+        with db_transaction.atomic():
+            entry = self._apply_to_balance()
+            super().save(*args, **kwargs)
+            if entry is not None:
+                entry.save()
+            sync_payment_status(self, old_status)
+
+        self._after_processed()
+
+    def _apply_to_balance(self):
+        """
+        Применяет платеж к балансу договора (блокировка строки и один UPDATE),
+        заполняет balance_after и processed_at.
+
+        Вызывается внутри transaction.atomic().
+
+        Returns:
+            BalanceJournalEntry: несохраненная запись журнала или None
+        """
+        from django.utils import timezone
+
+        contract = self.contract
+        if self.transaction_type in ['payment', 'refund', 'charge']:
+            # Возврат (refund_payment) хранится с отрицательной суммой
+            invalid = not self.amount if self.transaction_type == 'refund' else self.amount <= 0
+            if invalid:
+                raise ValidationError({'amount': 'Сумма операции должна быть положительной'})
+
+            if self.transaction_type == 'payment':
+                # Пополнение баланса
+                entry = contract.apply_balance_delta(self.amount, self, self.description or 'Пополнение баланса')
+            elif self.transaction_type == 'charge':
+                # Списание с баланса
+                entry = contract.apply_balance_delta(-self.amount, self, self.description or 'Списание')
+            else:
+                # Возврат средств: сумма со знаком (отрицательная — отмена пополнения)
+                entry = contract.apply_balance_delta(self.amount, self, self.description or 'Возврат средств')
+        else:
+            entry = None
+
+        self._balance_changed = entry is not None
+        self.balance_after = contract.balance
+        self.processed_at = timezone.now()
+        return entry
+
+    def _after_processed(self):
+        """Побочные эффекты после фиксации платежа: статус договора и уведомления."""
+        from apps.payments.notifications import notify_payment_completed
+
+        if self._balance_changed:
+            self.contract.handle_balance_change()
+
+        # Отправляем уведомление об успешном платеже
+        if self.transaction_type in ['payment', 'refund']:
+            notify_payment_completed(self)
+            self._auto_charge_tariff_if_needed()
 
     def process(self):
-        """Обработка платежа (зачисление/списание средств)"""
+        """
+        Обработка ранее сохраненного платежа (зачисление/списание средств).
+
+        Платеж захватывается условным UPDATE по processed_at, поэтому при
+        параллельной обработке (вебхук, опрос шлюза, терминал) баланс
+        меняется ровно один раз.
+        """
         from django.utils import timezone
         from django.db import transaction as db_transaction
-        from apps.payments.notifications import notify_payment_completed
 
-        if self.status == 'success' and not self.processed_at:
-            with db_transaction.atomic():
-                # Блокируем договор для обновления
-                contract = self.contract
-
-                # Применяем транзакцию в зависимости от типа
-                if self.transaction_type == 'payment':
-                    # Пополнение баланса
-                    contract.add_balance(self.amount, self.description or 'Пополнение баланса')
-                elif self.transaction_type == 'charge':
-                    # Списание с баланса
-                    contract.deduct_balance(self.amount, self.description or 'Списание')
-                elif self.transaction_type == 'refund':
-                    # Возврат средств
-                    contract.add_balance(self.amount, self.description or 'Возврат средств')
-
-                # Сохраняем баланс после операции
-                contract.refresh_from_db()
-                self.balance_after = contract.balance
-                self.processed_at = timezone.now()
-                self.save(update_fields=['balance_after', 'processed_at'])
-
-                # Отправляем уведомление об успешном платеже
-                if self.transaction_type in ['payment', 'refund']:
-                    notify_payment_completed(self)
-                    self._auto_charge_tariff_if_needed()
+        if self.status != 'success' or self.processed_at:
+            return
+
+        with db_transaction.atomic():
+            claimed = Payment.objects.filter(
+                pk=self.pk, status='success', processed_at__isnull=True
+            ).update(processed_at=timezone.now())
+            if not claimed:
+                return
+
+            entry = self._apply_to_balance()
+            Payment.objects.filter(pk=self.pk).update(
+                balance_after=self.balance_after,
+                processed_at=self.processed_at,
+            )
+            if entry is not None:
+                entry.save()
+
+        self._after_processed()
 
     def _auto_charge_tariff_if_needed(self):
         """
         После пополнения проверяет, можно ли автоматически списать абонплату,
         чтобы продлить тариф и зафиксировать это списание.
+
+        Все просроченные периоды, которые покрывает новый баланс, списываются
+        за один проход (см. charge_catch_up_periods).
         """
         if self.transaction_type != 'payment':
             return
@@ -233,34 +328,23 @@ class Payment(models.Model):
         if not fee_amount or fee_amount <= 0:
             return
 
-        from django.utils import timezone
-        from dateutil.relativedelta import relativedelta
-
-        today = timezone.now().date()
-        due_date = contract.next_billing_date or today
+        from apps.contracts.services.billing import charge_catch_up_periods
 
-        # Обновляем информацию о балансе для цикла
-        contract.refresh_from_db(fields=['balance', 'next_billing_date'])
-        while due_date <= today and contract.balance >= fee_amount:
-            contract.charge_monthly_fee(billing_date=due_date)
-            contract.refresh_from_db(fields=['balance', 'next_billing_date'])
-            due_date = contract.next_billing_date or (due_date + relativedelta(months=1))
-            today = timezone.now().date()
+        if charge_catch_up_periods(contract.pk):
+            contract.refresh_from_db(fields=['balance', 'total_cost', 'journal_seq', 'next_billing_date'])
 
     def approve(self, user=None):
         """Подтверждение и обработка платежа"""
-        from django.utils import timezone
-
         if self.status != 'pending':
             raise ValidationError(f'Невозможно подтвердить платеж со статусом "{self.get_status_display()}"')
 
         self.status = 'success'
-        self.processed_at = timezone.now()
         if user:
             self.processed_by = user
-        self.save()
+        self.save(update_fields=['status', 'processed_by', 'updated_at'])
 
-        # Обработка произойдет автоматически в методе save()
+        # Зачисление/списание средств
+        self.process()
 
     def reject(self, reason='', user=None):
         """Отклонение платежа"""
@@ -279,7 +363,7 @@ class Payment(models.Model):
 
     def refund_payment(self, reason='', user=None):
         """Возврат платежа"""
-        from django.utils import timezone
+        from django.db import transaction as db_transaction
 
         if self.status != 'success':
             raise ValidationError(f'Невозможно вернуть платеж со статусом "{self.get_status_display()}"')
@@ -287,21 +371,22 @@ class Payment(models.Model):
         if self.transaction_type != 'payment':
             raise ValidationError('Возврат возможен только для платежей (пополнений)')
 
-        # Меняем статус текущего платежа
-        self.status = 'refunded'
-        self.save()
+        with db_transaction.atomic():
+            # Меняем статус текущего платежа
+            self.status = 'refunded'
+            self.save()
 
-        # Создаем транзакцию возврата (отрицательная сумма)
-        refund_payment = Payment.objects.create(
-            contract=self.contract,
-            transaction_type='refund',
-            amount=-self.amount,
-            status='success',
-            payment_method=self.payment_method,
-            description=f"Возврат платежа {self.id}. {reason}",
-            processed_by=user,
-            processed_at=timezone.now()
-        )
+            # Создаем транзакцию возврата (отрицательная сумма): save()
+            # применяет ее к балансу один раз
+            refund_payment = Payment.objects.create(
+                contract=self.contract,
+                transaction_type='refund',
+                amount=-self.amount,
+                status='success',
+                payment_method=self.payment_method,
+                description=f"Возврат платежа {self.id}. {reason}",
+                processed_by=user,
+            )
 
         return refund_payment
 
@@ -319,8 +404,6 @@ class Payment(models.Model):
         Returns:
             Payment: созданный платеж
         """
-        from django.utils import timezone
-
         payment = Payment.objects.create(
             contract=contract,
             transaction_type='charge',
@@ -328,13 +411,13 @@ class Payment(models.Model):
             status='success',
             payment_method=method,
             description=description or 'Списание с баланса',
-            processed_at=timezone.now()
         )
 
         return payment
 
     @staticmethod
-    def create_payment(contract, amount, description='', method='cash', transaction_id=None):
+    def create_payment(contract, amount, description='', method='cash', transaction_id=None,
+                       idempotency_key=None):
         """
         Создание пополнения баланса.
 
@@ -344,24 +427,38 @@ class Payment(models.Model):
             description: описание операции
             method: способ оплаты
             transaction_id: ID транзакции во внешней системе
+            idempotency_key: ключ идемпотентности; повторный вызов с тем же
+                             ключом возвращает уже созданный платеж
 
         Returns:
             Payment: созданный платеж
         """
-        from django.utils import timezone
-
-        payment = Payment.objects.create(
-            contract=contract,
-            transaction_type='payment',
-            amount=abs(amount),
-            status='success',
-            payment_method=method,
-            transaction_id=transaction_id,
-            description=description or 'Пополнение баланса',
-            processed_at=timezone.now()
-        )
-
-        return payment
+        from apps.payments.idempotency import run_idempotent
+
+        created = []
+
+        def create():
+            payment = Payment.objects.create(
+                contract=contract,
+                transaction_type='payment',
+                amount=abs(amount),
+                status='success',
+                payment_method=method,
+                transaction_id=transaction_id,
+                description=description or 'Пополнение баланса',
+            )
+            created.append(payment)
+            return 201, {'payment_id': payment.pk}
+
+        params = {
+            'contract': contract.pk,
+            'amount': str(abs(amount)),
+            'description': description,
+            'method': method,
+            'transaction_id': transaction_id,
+        }
+        _, body, _ = run_idempotent('payments.create_payment', idempotency_key, params, create)
+        return created[0] if created else Payment.objects.get(pk=body['payment_id'])
 
     @staticmethod
     def create_payment_link(contract, amount, description='', gateway='default', return_url=None):
@@ -391,6 +488,7 @@ class Payment(models.Model):
             amount=abs(amount),
             status='pending',
             payment_method='card' if gateway in ['kaspi', 'halyk'] else 'mobile_payment',
+            gateway=gateway,
             description=description or 'Пополнение баланса через платежный шлюз'
         )
 
@@ -427,7 +525,7 @@ class Payment(models.Model):
         if not self.transaction_id:
             raise ValidationError('У платежа нет transaction_id для проверки статуса')
 
-        gateway = get_payment_gateway()
+        gateway = get_payment_gateway(self.gateway or 'default')
         return gateway.check_payment_status(self.transaction_id)
 
     def process_gateway_callback(self, gateway_status_data):
@@ -442,9 +540,9 @@ class Payment(models.Model):
 
         if gateway_status_data['status'] == 'completed':
             self.status = 'success'
-            self.processed_at = timezone.now()
-            self.save()
-            # Платеж будет автоматически обработан в save()
+            self.save(update_fields=['status', 'updated_at'])
+            # Зачисление средств (однократно, см. process())
+            self.process()
         elif gateway_status_data['status'] == 'failed':
             self.status = 'failed'
             self.processed_at = timezone.now()
@@ -454,3 +552,511 @@ class Payment(models.Model):
 
             # Отправляем уведомление об ошибке
             notify_payment_error(self, error_msg)
+
+
+class WebhookInboxEntry(models.Model):
+    """
+    Входящий callback платежного шлюза (inbox).
+
+    Вебхук только проверяет подпись и сохраняет сырые данные, а применение
+    к платежам и балансу выполняет фоновый обработчик пачками
+    (см. webhook_inbox.py). Повтор того же callback'а (тот же шлюз,
+    транзакция и статус) отбрасывается при вставке по dedup_key.
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает обработки'),
+        ('processing', 'Обрабатывается'),
+        ('processed', 'Обработан'),
+        ('duplicate', 'Дубликат'),
+        ('failed', 'Ошибка'),
+    ]
+
+    gateway = models.CharField(
+        'Платежный шлюз',
+        max_length=20,
+        blank=True,
+        default=''
+    )
+    transaction_id = models.CharField(
+        'ID транзакции',
+        max_length=100,
+        db_index=True,
+        help_text='transaction_id (или payment_id) из callback'
+    )
+    event_status = models.CharField(
+        'Статус в шлюзе',
+        max_length=20,
+        blank=True,
+        default=''
+    )
+    dedup_key = models.CharField(
+        'Ключ дедупликации',
+        max_length=150,
+        unique=True
+    )
+    payload = models.JSONField(
+        'Данные callback',
+        default=dict
+    )
+
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        'Попыток обработки',
+        default=0
+    )
+    error = models.TextField(
+        'Ошибка',
+        blank=True,
+        default=''
+    )
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='webhook_events',
+        verbose_name='Платеж'
+    )
+
+    received_at = models.DateTimeField(
+        'Дата получения',
+        auto_now_add=True
+    )
+    processed_at = models.DateTimeField(
+        'Дата обработки',
+        null=True,
+        blank=True
+    )
+    updated_at = models.DateTimeField(
+        'Дата обновления',
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = 'Callback платежного шлюза'
+        verbose_name_plural = 'Callback\'и платежных шлюзов'
+        ordering = ['-received_at']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.gateway or 'default'}:{self.transaction_id} {self.event_status} ({self.get_status_display()})"
+
+    @staticmethod
+    def make_dedup_key(gateway, transaction_id, event_status):
+        return f"{gateway or 'default'}:{transaction_id}:{event_status}"[:150]
+
+
+class IdempotencyKey(models.Model):
+    """
+    Ключ идемпотентности запроса, создающего платеж или меняющего баланс.
+
+    Повтор запроса с тем же ключом (Idempotency-Key) в пределах срока
+    хранения получает сохраненный ответ первого запроса без обращения
+    к договорам и платежам (см. idempotency.py).
+    """
+
+    # Область ключа: операция и пользователь ('payments.create_payment_link:5')
+    scope = models.CharField(
+        'Область',
+        max_length=100
+    )
+    key = models.CharField(
+        'Ключ',
+        max_length=255
+    )
+    # Отпечаток параметров: тот же ключ с другими параметрами отклоняется
+    request_hash = models.CharField(
+        'Отпечаток запроса',
+        max_length=64
+    )
+
+    response_code = models.PositiveSmallIntegerField(
+        'Код ответа',
+        null=True,
+        blank=True
+    )
+    response_body = models.JSONField(
+        'Ответ',
+        null=True,
+        blank=True
+    )
+
+    created_at = models.DateTimeField(
+        'Дата создания',
+        auto_now_add=True
+    )
+    expires_at = models.DateTimeField(
+        'Действует до',
+        db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Ключ идемпотентности'
+        verbose_name_plural = 'Ключи идемпотентности'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'key'],
+                name='unique_idempotency_key'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Исходящее уведомление (outbox).
+
+    Запись создается в той же транзакции, что и вызвавшее уведомление
+    изменение (платеж, списание, приостановка): при откате транзакции
+    уведомление не отправляется. Отправку выполняет диспетчер пачками
+    по каналам (см. notification_dispatcher.py).
+
+    Уведомления договора по одному каналу, поступившие до отправки
+    ожидающей записи, дописываются в нее (сводка), а не создают новую.
+    """
+
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('sms', 'SMS'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает отправки'),
+        ('sending', 'Отправляется'),
+        ('sent', 'Отправлено'),
+        ('failed', 'Ошибка'),
+    ]
+
+    channel = models.CharField(
+        'Канал',
+        max_length=10,
+        choices=CHANNEL_CHOICES
+    )
+    recipient = models.CharField(
+        'Получатель',
+        max_length=255
+    )
+    subject = models.CharField(
+        'Тема',
+        max_length=255,
+        blank=True,
+        default=''
+    )
+    body = models.TextField('Текст')
+    contract = models.ForeignKey(
+        'contracts.Contract',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='outbox_notifications',
+        verbose_name='Договор'
+    )
+    # Сколько уведомлений объединено в эту запись (сводка, см. NOTIFICATION_COALESCE_SECONDS)
+    merged_count = models.PositiveSmallIntegerField(
+        'Объединено уведомлений',
+        default=1
+    )
+
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        'Попыток отправки',
+        default=0
+    )
+    next_attempt_at = models.DateTimeField(
+        'Следующая попытка',
+        default=timezone.now
+    )
+    last_error = models.TextField(
+        'Последняя ошибка',
+        blank=True,
+        default=''
+    )
+
+    created_at = models.DateTimeField(
+        'Дата создания',
+        auto_now_add=True
+    )
+    sent_at = models.DateTimeField(
+        'Дата отправки',
+        null=True,
+        blank=True
+    )
+    updated_at = models.DateTimeField(
+        'Дата обновления',
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = 'Исходящее уведомление'
+        verbose_name_plural = 'Исходящие уведомления'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'channel', 'next_attempt_at']),
+            models.Index(fields=['contract', 'channel', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_channel_display()} → {self.recipient} ({self.get_status_display()})"
+
+
+class NotificationFeedEntry(models.Model):
+    """
+    Запись ленты уведомлений для интерфейса.
+
+    Лента общая для всех веб- и Celery-процессов. Записи создаются в той
+    же транзакции, что и уведомление в outbox. Размер ограничен глобально
+    и на договор: лишнее удаляет задача trim_notification_feed.
+    """
+
+    channel = models.CharField(
+        'Канал',
+        max_length=10
+    )
+    text = models.TextField('Текст')
+    contract = models.ForeignKey(
+        'contracts.Contract',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='feed_entries',
+        verbose_name='Договор'
+    )
+    created_at = models.DateTimeField(
+        'Дата создания',
+        default=timezone.now
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты уведомлений'
+        verbose_name_plural = 'Лента уведомлений'
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['contract', '-id']),
+        ]
+
+    def __str__(self):
+        return f"{self.channel}: {self.text[:50]}"
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'channel': self.channel,
+            'text': self.text,
+            'timestamp': self.created_at,
+            'contract_id': self.contract_id,
+        }
+
+
+class PaymentDailyAggregate(models.Model):
+    """
+    Дневная сводка платежей: количество и сумма по дате, типу операции,
+    способу оплаты и статусу.
+
+    Учитываются только платежи в итоговых статусах (см.
+    apps/payments/aggregates.py). Строки обновляются инкрементально
+    в той же транзакции, что и платежи; полностью пересчитываются
+    командой rebuild_payment_aggregates.
+    """
+
+    date = models.DateField('Дата')
+    transaction_type = models.CharField(
+        'Тип транзакции',
+        max_length=20,
+        choices=Payment.TRANSACTION_TYPE_CHOICES
+    )
+    payment_method = models.CharField(
+        'Способ оплаты',
+        max_length=20,
+        choices=Payment.PAYMENT_METHOD_CHOICES
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=Payment.STATUS_CHOICES
+    )
+    count = models.IntegerField('Количество', default=0)
+    amount = models.DecimalField(
+        'Сумма (с)',
+        max_digits=16,
+        decimal_places=2,
+        default=Decimal('0')
+    )
+    updated_at = models.DateTimeField(
+        'Дата обновления',
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = 'Дневная сводка платежей'
+        verbose_name_plural = 'Дневные сводки платежей'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'transaction_type', 'payment_method', 'status'],
+                name='unique_payment_daily_aggregate',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.transaction_type}/{self.payment_method}/{self.status}: {self.count} шт., {self.amount}с"
+
+
+class SettlementReport(models.Model):
+    """
+    Итог сверки реестра (settlement-файла) платежного шлюза за день.
+
+    Хранятся только счетчики и расхождения (SettlementDiscrepancy):
+    совпавшие записи в отчет не пишутся (см. settlement.py).
+    """
+
+    STATUS_CHOICES = [
+        ('running', 'Выполняется'),
+        ('completed', 'Завершена'),
+        ('failed', 'Ошибка'),
+    ]
+
+    gateway = models.CharField(
+        'Платежный шлюз',
+        max_length=20
+    )
+    settlement_date = models.DateField(
+        'Дата реестра',
+        db_index=True
+    )
+    file_name = models.CharField(
+        'Файл',
+        max_length=255,
+        blank=True
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='running'
+    )
+
+    records = models.PositiveIntegerField('Записей в реестре', default=0)
+    matched = models.PositiveIntegerField('Совпало', default=0)
+    amount_mismatch = models.PositiveIntegerField('Расхождение суммы', default=0)
+    status_mismatch = models.PositiveIntegerField('Не зачислены у нас', default=0)
+    missing_local = models.PositiveIntegerField('Нет у нас', default=0)
+    missing_provider = models.PositiveIntegerField('Нет в реестре', default=0)
+    duplicate = models.PositiveIntegerField('Повторов в реестре', default=0)
+    invalid = models.PositiveIntegerField('Ошибочных строк', default=0)
+    provider_total = models.DecimalField(
+        'Сумма по реестру (с)',
+        max_digits=16,
+        decimal_places=2,
+        default=Decimal('0')
+    )
+    matched_total = models.DecimalField(
+        'Сумма совпавших (с)',
+        max_digits=16,
+        decimal_places=2,
+        default=Decimal('0')
+    )
+    elapsed = models.FloatField('Время, с', default=0)
+    error = models.TextField('Ошибка', blank=True)
+
+    created_at = models.DateTimeField(
+        'Дата создания',
+        auto_now_add=True
+    )
+    finished_at = models.DateTimeField(
+        'Дата завершения',
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = 'Сверка реестра'
+        verbose_name_plural = 'Сверки реестров'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['gateway', '-settlement_date']),
+        ]
+
+    def __str__(self):
+        return f"Сверка {self.gateway} за {self.settlement_date} ({self.get_status_display()})"
+
+
+class SettlementDiscrepancy(models.Model):
+    """Расхождение между реестром шлюза и платежами."""
+
+    KIND_CHOICES = [
+        ('amount_mismatch', 'Расхождение суммы'),
+        ('status_mismatch', 'Не зачислен у нас'),
+        ('missing_local', 'Нет у нас'),
+        ('missing_provider', 'Нет в реестре'),
+        ('duplicate', 'Повтор в реестре'),
+    ]
+
+    report = models.ForeignKey(
+        SettlementReport,
+        on_delete=models.CASCADE,
+        related_name='discrepancies',
+        verbose_name='Сверка'
+    )
+    kind = models.CharField(
+        'Тип',
+        max_length=20,
+        choices=KIND_CHOICES
+    )
+    transaction_id = models.CharField(
+        'ID транзакции',
+        max_length=100
+    )
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='settlement_discrepancies',
+        verbose_name='Платеж'
+    )
+    provider_amount = models.DecimalField(
+        'Сумма в реестре (с)',
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True
+    )
+    local_amount = models.DecimalField(
+        'Сумма у нас (с)',
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True
+    )
+    local_status = models.CharField(
+        'Статус у нас',
+        max_length=20,
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = 'Расхождение сверки'
+        verbose_name_plural = 'Расхождения сверки'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['report', 'kind']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.transaction_id}"
+
@@ -0,0 +1,368 @@
+"""
+Диспетчер исходящих уведомлений (outbox).
+
+Уведомления забираются пачками по каналам: строки блокируются с SKIP
+LOCKED и переводятся в статус 'sending', поэтому несколько воркеров не
+отправляют одно и то же. Email пачки уходит через одно SMTP-соединение
+(EMAIL_BACKEND), SMS — через HTTP-клиент провайдера с постоянным пулом
+соединений и circuit breaker (GatewayHttpClient) в ограниченном пуле
+потоков. Частота отправки ограничена на канал (NOTIFICATION_RATE_LIMITS).
+
+Число отправок на договор по каналу ограничено (NOTIFICATION_CONTRACT_CAPS,
+например 'sms:5/3600' — не больше 5 SMS в час): уведомления сверх лимита
+откладываются до освобождения окна, а новые уведомления договора тем
+временем дописываются в отложенную запись (сводка, см.
+NotificationService._enqueue).
+
+Неудачная отправка повторяется с экспоненциальной задержкой, после
+NOTIFICATION_MAX_ATTEMPTS попыток уведомление помечается 'failed'.
+Результаты пачки записываются двумя запросами: UPDATE отправленных
+и bulk_update неудачных.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from apps.payments.models import NotificationOutbox
+from apps.payments.status_poller import RateLimiter, parse_rate_limits
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = ('email', 'sms')
+
+_sms_client = None
+_sms_client_lock = threading.Lock()
+
+
+def get_sms_client():
+    """
+    HTTP-клиент SMS-провайдера (один на процесс) или None, если адрес
+    не настроен (отправка только в журнал — режим разработки).
+    """
+    global _sms_client
+    base_url = getattr(settings, 'NOTIFICATION_SMS_URL', '')
+    if not base_url:
+        return None
+    if _sms_client is None:
+        from apps.payments.gateway_client import GatewayHttpClient
+
+        with _sms_client_lock:
+            if _sms_client is None:
+                _sms_client = GatewayHttpClient(
+                    'sms',
+                    base_url,
+                    pool_size=getattr(settings, 'NOTIFICATION_DISPATCH_WORKERS', 8),
+                    connect_timeout=getattr(settings, 'PAYMENT_GATEWAY_CONNECT_TIMEOUT', 2.0),
+                    read_timeout=getattr(settings, 'PAYMENT_GATEWAY_READ_TIMEOUT', 5.0),
+                    retries=getattr(settings, 'PAYMENT_GATEWAY_RETRIES', 2),
+                )
+    return _sms_client
+
+
+class EmailSender:
+    """Отправка пачки писем через одно соединение почтового бэкенда."""
+
+    parallel = False
+
+    def __enter__(self):
+        self.connection = get_connection(fail_silently=False)
+        self.connection.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.connection.close()
+
+    def send(self, notification):
+        subject = notification.subject
+        if notification.merged_count > 1:
+            subject = f'{subject} (и еще {notification.merged_count - 1})'
+        EmailMessage(
+            subject,
+            notification.body,
+            settings.DEFAULT_FROM_EMAIL,
+            [notification.recipient],
+            connection=self.connection,
+        ).send()
+
+
+class SmsSender:
+    """Отправка SMS через HTTP API провайдера (пул соединений)."""
+
+    parallel = True
+
+    def __enter__(self):
+        self.client = get_sms_client()
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def send(self, notification):
+        if self.client is None:
+            logger.info('[SMS] To: %s, Message: %s', notification.recipient, notification.body)
+            return
+        self.client.request_json('POST', '/messages', {
+            'to': notification.recipient,
+            'text': notification.body,
+            'reference': notification.pk,
+        })
+
+
+SENDERS = {
+    'email': EmailSender,
+    'sms': SmsSender,
+}
+
+
+def parse_contract_caps(value):
+    """
+    'sms:5/3600,email:20/3600' -> {'sms': (5, 3600), 'email': (20, 3600)}
+    (не больше N отправок на договор за период в секундах).
+    """
+    caps = {}
+    for item in (value or '').split(','):
+        name, _, cap = item.partition(':')
+        count, _, period = cap.partition('/')
+        if name.strip() and count.strip() and period.strip():
+            caps[name.strip().lower()] = (int(count), int(period))
+    return caps
+
+
+def claim_outbox_batch(channel, batch_size, lease_seconds=None):
+    """
+    Захватывает пачку уведомлений канала, готовых к отправке.
+
+    Уведомление, застрявшее в 'sending' дольше аренды (воркер упал),
+    снова доступно для захвата.
+
+    Returns:
+        list: уведомления в статусе 'sending'
+    """
+    lease_seconds = lease_seconds or getattr(settings, 'NOTIFICATION_LEASE_SECONDS', 300)
+    now = timezone.now()
+    stale = now - timedelta(seconds=lease_seconds)
+
+    queryset = NotificationOutbox.objects.select_for_update(skip_locked=True).filter(
+        Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', updated_at__lt=stale),
+        channel=channel,
+    )
+    with transaction.atomic():
+        notifications = list(queryset.order_by('next_attempt_at')[:batch_size])
+        if notifications:
+            NotificationOutbox.objects.filter(pk__in=[item.pk for item in notifications]).update(
+                status='sending', attempts=F('attempts') + 1, updated_at=now
+            )
+    for item in notifications:
+        item.status = 'sending'
+        item.attempts += 1
+    return notifications
+
+
+class NotificationDispatcher:
+    """
+    Пакетная отправка уведомлений из outbox.
+
+    Пример:
+        stats = NotificationDispatcher().run()
+    """
+
+    def __init__(self, batch_size=None, workers=None, rate_limits=None, contract_caps=None):
+        self.batch_size = max(1, int(batch_size or getattr(settings, 'NOTIFICATION_BATCH_SIZE', 200)))
+        self.workers = max(1, int(workers or getattr(settings, 'NOTIFICATION_DISPATCH_WORKERS', 8)))
+        self.max_attempts = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+        self.retry_base = getattr(settings, 'NOTIFICATION_RETRY_BASE_SECONDS', 30)
+        if rate_limits is None:
+            rate_limits = parse_rate_limits(getattr(settings, 'NOTIFICATION_RATE_LIMITS', ''))
+        self.limiters = {name: RateLimiter(rate) for name, rate in rate_limits.items()}
+        if contract_caps is None:
+            contract_caps = parse_contract_caps(getattr(settings, 'NOTIFICATION_CONTRACT_CAPS', ''))
+        self.contract_caps = contract_caps
+
+    def apply_contract_caps(self, channel, notifications):
+        """
+        Откладывает уведомления договоров, исчерпавших лимит отправок канала.
+
+        Отправленные за период считаются одним агрегирующим запросом на пачку.
+
+        Returns:
+            tuple: (к отправке, отложенные)
+        """
+        cap = self.contract_caps.get(channel)
+        contract_ids = {item.contract_id for item in notifications if item.contract_id}
+        if not cap or not contract_ids:
+            return notifications, []
+
+        limit, period = cap
+        now = timezone.now()
+        recent = {
+            row['contract_id']: row
+            for row in NotificationOutbox.objects.filter(
+                channel=channel, status='sent', sent_at__gte=now - timedelta(seconds=period),
+                contract_id__in=contract_ids,
+            ).values('contract_id').annotate(sent=Count('id'), first_sent=Min('sent_at'))
+        }
+
+        used = {contract_id: row['sent'] for contract_id, row in recent.items()}
+        allowed = []
+        deferred = []
+        for item in notifications:
+            if item.contract_id is None or used.get(item.contract_id, 0) < limit:
+                if item.contract_id is not None:
+                    used[item.contract_id] = used.get(item.contract_id, 0) + 1
+                allowed.append(item)
+                continue
+            # Окно освободится, когда самая ранняя отправка выйдет за период
+            first_sent = recent[item.contract_id]['first_sent'] if item.contract_id in recent else now
+            item.next_attempt_at = max(first_sent + timedelta(seconds=period), now + timedelta(seconds=1))
+            item.status = 'pending'
+            item.attempts -= 1
+            item.updated_at = now
+            deferred.append(item)
+
+        if deferred:
+            NotificationOutbox.objects.bulk_update(
+                deferred, ['status', 'attempts', 'next_attempt_at', 'updated_at']
+            )
+        return allowed, deferred
+
+    def _send_one(self, sender, limiter, notification):
+        if limiter:
+            limiter.acquire()
+        try:
+            sender.send(notification)
+            return None
+        except Exception as e:
+            logger.warning('Ошибка отправки уведомления %s (%s): %s', notification.pk, notification.channel, e)
+            return str(e) or e.__class__.__name__
+
+    def send_batch(self, channel, notifications):
+        """
+        Отправляет пачку уведомлений канала.
+
+        Returns:
+            list: текст ошибки или None для каждого уведомления
+        """
+        limiter = self.limiters.get(channel)
+        try:
+            with SENDERS[channel]() as sender:
+                if sender.parallel and len(notifications) > 1:
+                    with ThreadPoolExecutor(max_workers=min(self.workers, len(notifications))) as executor:
+                        return list(executor.map(
+                            lambda item: self._send_one(sender, limiter, item), notifications
+                        ))
+                return [self._send_one(sender, limiter, item) for item in notifications]
+        except Exception as e:
+            # Провайдер недоступен целиком (например, SMTP-соединение не открылось)
+            logger.warning('Канал %s недоступен: %s', channel, e)
+            return [str(e) or e.__class__.__name__] * len(notifications)
+
+    def apply_results(self, notifications, errors):
+        """
+        Записывает результаты пачки.
+
+        Returns:
+            dict: количество sent / retry / failed
+        """
+        now = timezone.now()
+        sent = [item.pk for item, error in zip(notifications, errors) if error is None]
+        retry = []
+        failed = 0
+        for item, error in zip(notifications, errors):
+            if error is None:
+                continue
+            item.last_error = error[:1000]
+            item.updated_at = now
+            if item.attempts >= self.max_attempts:
+                item.status = 'failed'
+                failed += 1
+            else:
+                item.status = 'pending'
+                item.next_attempt_at = now + timedelta(
+                    seconds=min(self.retry_base * 2 ** (item.attempts - 1), 3600)
+                )
+            retry.append(item)
+
+        if sent:
+            NotificationOutbox.objects.filter(pk__in=sent).update(status='sent', sent_at=now, updated_at=now)
+        if retry:
+            NotificationOutbox.objects.bulk_update(
+                retry, ['status', 'next_attempt_at', 'last_error', 'updated_at']
+            )
+        return {'sent': len(sent), 'retry': len(retry) - failed, 'failed': failed}
+
+    def run(self, max_batches=None):
+        """
+        Отправляет уведомления всех каналов пачками, пока они есть.
+
+        Returns:
+            dict: итоги и тайминги по пачкам
+        """
+        summary = {'sent': 0, 'retry': 0, 'failed': 0, 'deferred': 0, 'batches': []}
+        batch_number = 0
+
+        for channel in CHANNELS:
+            while max_batches is None or batch_number < max_batches:
+                started = time.monotonic()
+                notifications = claim_outbox_batch(channel, self.batch_size)
+                if not notifications:
+                    break
+                batch_number += 1
+
+                allowed, deferred = self.apply_contract_caps(channel, notifications)
+                errors = self.send_batch(channel, allowed) if allowed else []
+                sent_at = time.monotonic()
+                counts = self.apply_results(allowed, errors)
+                counts['deferred'] = len(deferred)
+
+                batch = {
+                    'batch': batch_number,
+                    'channel': channel,
+                    'size': len(notifications),
+                    **counts,
+                    'send_sec': round(sent_at - started, 3),
+                    'total_sec': round(time.monotonic() - started, 3),
+                }
+                summary['batches'].append(batch)
+                for key in ('sent', 'retry', 'failed', 'deferred'):
+                    summary[key] += counts[key]
+                logger.info(
+                    'Отправка уведомлений, пачка %s (%s): %s шт. (отправлено %s, повтор %s, ошибок %s, '
+                    'отложено по лимиту %s) за %sс',
+                    batch_number, channel, len(notifications), counts['sent'], counts['retry'],
+                    counts['failed'], counts['deferred'], batch['total_sec'],
+                )
+
+        return summary
+
+
+def dispatch_notifications(batch_size=None, workers=None, max_batches=None):
+    """Отправка уведомлений из outbox (см. NotificationDispatcher)."""
+    return NotificationDispatcher(batch_size=batch_size, workers=workers).run(max_batches=max_batches)
+
+
+def purge_sent_notifications(days=None, batch_size=5000):
+    """
+    Удаляет отправленные уведомления старше срока хранения пачками по id.
+
+    Returns:
+        int: количество удаленных записей
+    """
+    days = days or getattr(settings, 'NOTIFICATION_OUTBOX_RETENTION_DAYS', 30)
+    border = timezone.now() - timedelta(days=days)
+    deleted = 0
+    while True:
+        ids = list(
+            NotificationOutbox.objects.filter(status='sent', sent_at__lt=border)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += NotificationOutbox.objects.filter(id__in=ids).delete()[0]
@@ -1,61 +1,181 @@
 """
 Система уведомлений для платежей и биллинга.
 
-В реальной системе здесь будет интеграция с:
-- Email сервисом (SendGrid, Mailgun)
-- SMS провайдером (Twilio, местный провайдер)
-- Push уведомлениями
+Уведомления записываются в outbox и отправляются асинхронно
+(см. notification_dispatcher.py): email — через EMAIL_BACKEND,
+SMS — через HTTP API провайдера (NOTIFICATION_SMS_URL).
 """
 import logging
 from decimal import Decimal
-from collections import deque
-
-from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
-# Храним последние уведомления, чтобы отображать их в интерфейсе
-NOTIFICATION_FEED = deque(maxlen=50)
-
 
 def add_notification_entry(channel: str, text: str, contract_id: int = None):
     """
-    Добавляет текстовое уведомление в общий поток для отображения в UI.
+    Добавляет текстовое уведомление в общую ленту для отображения в UI.
     """
-    NOTIFICATION_FEED.appendleft({
-        'channel': channel,
-        'text': text,
-        'timestamp': timezone.now(),
-        'contract_id': contract_id,
-    })
+    from apps.payments.models import NotificationFeedEntry
+
+    NotificationFeedEntry.objects.create(channel=channel, text=text, contract_id=contract_id)
 
 
-def get_notification_feed(limit: int = 10):
+def get_notification_feed(limit: int = 10, after: int = None):
     """
-    Возвращает последние уведомления для отображения.
+    Возвращает уведомления общей ленты.
+
+    Args:
+        limit: максимум записей
+        after: курсор (id последней полученной записи); если задан,
+               возвращаются записи новее курсора в порядке появления
+
+    Returns:
+        list: словари channel / text / timestamp / contract_id / id
     """
-    return list(NOTIFICATION_FEED)[:limit]
+    from apps.payments.models import NotificationFeedEntry
+
+    queryset = NotificationFeedEntry.objects.all()
+    if after:
+        queryset = queryset.filter(id__gt=after).order_by('id')
+    else:
+        queryset = queryset.order_by('-id')
+    return [entry.as_dict() for entry in queryset[:limit]]
 
 
 def get_notifications_for_contract(contract_id: int, limit: int = 10):
     """
-    Возвращает последние уведомления, относящиеся к конкретному договору.
+    Возвращает последние уведомления, относящиеся к конкретному договору
+    (индекс по договору и id: читается не больше limit записей).
     """
+    from apps.payments.models import NotificationFeedEntry
+
     if not contract_id:
         return []
-    matched = [entry for entry in NOTIFICATION_FEED if entry.get('contract_id') == contract_id]
-    return matched[:limit]
+    queryset = NotificationFeedEntry.objects.filter(contract_id=contract_id).order_by('-id')
+    return [entry.as_dict() for entry in queryset[:limit]]
+
+
+def trim_notification_feed(global_limit: int = None, contract_limit: int = None, batch_size: int = 5000):
+    """
+    Обрезает ленту: не больше global_limit записей всего
+    и contract_limit на договор (старые удаляются пачками по id).
+
+    Returns:
+        int: количество удаленных записей
+    """
+    from django.conf import settings
+    from django.db.models import Count
+    from apps.payments.models import NotificationFeedEntry
+
+    global_limit = global_limit or getattr(settings, 'NOTIFICATION_FEED_LIMIT', 100000)
+    contract_limit = contract_limit or getattr(settings, 'NOTIFICATION_FEED_CONTRACT_LIMIT', 50)
+    deleted = 0
+
+    def delete_up_to(queryset, border_id):
+        removed = 0
+        while True:
+            ids = list(queryset.filter(id__lte=border_id).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return removed
+            removed += NotificationFeedEntry.objects.filter(id__in=ids).delete()[0]
+
+    # Глобальная граница: id записи, следующей за последними global_limit
+    border = list(
+        NotificationFeedEntry.objects.order_by('-id').values_list('id', flat=True)[global_limit:global_limit + 1]
+    )
+    if border:
+        deleted += delete_up_to(NotificationFeedEntry.objects.all(), border[0])
+
+    # Договоры, у которых записей больше лимита
+    overflow = list(
+        NotificationFeedEntry.objects.filter(contract__isnull=False)
+        .values('contract_id')
+        .annotate(entries=Count('id'))
+        .filter(entries__gt=contract_limit)
+        .values_list('contract_id', flat=True)
+    )
+    for contract_id in overflow:
+        entries = NotificationFeedEntry.objects.filter(contract_id=contract_id)
+        border = list(entries.order_by('-id').values_list('id', flat=True)[contract_limit:contract_limit + 1])
+        if border:
+            deleted += delete_up_to(entries, border[0])
+
+    return deleted
 
 
 class NotificationService:
     """
     Базовый класс для сервиса уведомлений.
+
+    Уведомления не отправляются синхронно: они записываются в outbox
+    (NotificationOutbox) в текущей транзакции и отправляются диспетчером
+    (задача dispatch_notifications). Если транзакция откатится,
+    уведомление не уйдет.
     """
 
+    # Разделитель сообщений в сводке
+    DIGEST_SEPARATORS = {
+        'email': '\n' + '-' * 40 + '\n',
+        'sms': '\n',
+    }
+
+    @staticmethod
+    def _enqueue(channel: str, recipient: str, body: str, subject: str = '', contract_id: int = None):
+        """
+        Записывает уведомление в outbox.
+
+        Уведомление договора откладывается на окно NOTIFICATION_COALESCE_SECONDS;
+        если по договору, каналу и получателю уже есть ожидающая запись
+        в открытом окне, текст дописывается в нее одним UPDATE.
+        """
+        from datetime import timedelta
+        from django.conf import settings
+        from django.db.models import F, Subquery, TextField, Value
+        from django.db.models.functions import Concat
+        from django.utils import timezone
+        from apps.payments.models import NotificationOutbox
+
+        now = timezone.now()
+        window = getattr(settings, 'NOTIFICATION_COALESCE_SECONDS', 0) if contract_id else 0
+
+        if window:
+            open_digest = (
+                NotificationOutbox.objects.filter(
+                    contract_id=contract_id,
+                    channel=channel,
+                    recipient=recipient,
+                    status='pending',
+                    next_attempt_at__gt=now,
+                )
+                .order_by('-id')
+                .values('id')[:1]
+            )
+            merged = NotificationOutbox.objects.filter(pk=Subquery(open_digest)).update(
+                body=Concat(
+                    F('body'),
+                    Value(NotificationService.DIGEST_SEPARATORS.get(channel, '\n')),
+                    Value(body.strip()),
+                    output_field=TextField(),
+                ),
+                merged_count=F('merged_count') + 1,
+                updated_at=now,
+            )
+            if merged:
+                return
+
+        NotificationOutbox.objects.create(
+            channel=channel,
+            recipient=recipient,
+            subject=subject[:255],
+            body=body.strip(),
+            contract_id=contract_id,
+            next_attempt_at=now + timedelta(seconds=window),
+        )
+
     @staticmethod
     def send_email(to_email: str, subject: str, body: str, contract_id: int = None) -> bool:
         """
-        Отправка email уведомления.
+        Постановка email уведомления в очередь отправки.
 
         Args:
             to_email: адрес получателя
@@ -63,11 +183,10 @@ class NotificationService:
             body: текст письма
 
         Returns:
-            bool: успешность отправки
+            bool: уведомление поставлено в очередь
         """
-        # Заглушка - в реальной системе здесь будет отправка через SMTP или API
-        logger.info(f"[EMAIL] To: {to_email}, Subject: {subject}")
-        logger.info(f"[EMAIL] Body: {body}")
+        logger.debug('[EMAIL] В очередь: %s, %s', to_email, subject)
+        NotificationService._enqueue('email', to_email, body, subject=subject, contract_id=contract_id)
         notification_text = (
             f"--- EMAIL NOTIFICATION ---\n"
             f"To: {to_email}\n"
@@ -75,31 +194,29 @@ class NotificationService:
             f"Body:\n{body}\n"
             f"--- END EMAIL ---"
         )
-        print(f"\n{notification_text}\n")
         add_notification_entry('email', notification_text, contract_id=contract_id)
         return True
 
     @staticmethod
     def send_sms(phone: str, message: str, contract_id: int = None) -> bool:
         """
-        Отправка SMS уведомления.
+        Постановка SMS уведомления в очередь отправки.
 
         Args:
             phone: номер телефона
             message: текст сообщения
 
         Returns:
-            bool: успешность отправки
+            bool: уведомление поставлено в очередь
         """
-        # Заглушка - в реальной системе здесь будет отправка через SMS API
-        logger.info(f"[SMS] To: {phone}, Message: {message}")
+        logger.debug('[SMS] В очередь: %s', phone)
+        NotificationService._enqueue('sms', phone, message, contract_id=contract_id)
         notification_text = (
             f"--- SMS NOTIFICATION ---\n"
             f"To: {phone}\n"
             f"Message: {message}\n"
             f"--- END SMS ---"
         )
-        print(f"\n{notification_text}\n")
         add_notification_entry('sms', notification_text, contract_id=contract_id)
         return True
 
@@ -312,15 +429,18 @@ class ContractNotifications:
             NotificationService.send_sms(sms_phone, message, contract_id=contract.id)
 
     @staticmethod
-    def notify_monthly_charge(contract, amount: Decimal):
+    def notify_monthly_charge(contract, amount: Decimal, periods: int = 1):
         """
         Уведомление о списании абонентской платы.
 
         Args:
             contract: объект Contract
             amount: сумма списания
+            periods: количество оплаченных периодов (при погашении задолженности
+                     за несколько месяцев отправляется одно сводное уведомление)
         """
         customer = contract.customer
+        periods_note = f' за {periods} мес.' if periods > 1 else ''
 
         # Email уведомление
         if customer.email:
@@ -328,7 +448,7 @@ class ContractNotifications:
             body = f"""
 Здравствуйте, {customer.get_full_name()}!
 
-С вашего счета списана абонентская плата.
+С вашего счета списана абонентская плата{periods_note}.
 
 Номер договора: {contract.number}
 Сумма списания: {amount} c
@@ -345,7 +465,7 @@ class ContractNotifications:
         # SMS уведомление (отправляем только если баланс стал низким)
         sms_phone = getattr(contract.sim_card, 'msisdn', None) or customer.phone
         if sms_phone and contract.balance < 100:
-            message = f"Списано {amount} c. Баланс: {contract.balance} c. Договор {contract.number}"
+            message = f"Списано {amount} c{periods_note}. Баланс: {contract.balance} c. Договор {contract.number}"
             NotificationService.send_sms(sms_phone, message, contract_id=contract.id)
 
 
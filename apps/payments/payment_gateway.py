@@ -1,20 +1,84 @@
 """
-Заглушка платежного шлюза для демонстрации.
-В реальной системе здесь будет интеграция с реальным платежным провайдером.
+Платежные шлюзы.
+
+Если для провайдера задан адрес в PAYMENT_GATEWAY_URLS, запросы идут
+через HTTP-клиент с пулом соединений (gateway_client.py). Иначе шлюз
+работает как встроенная заглушка для демонстрации: ответы имитируются
+локально (simulate_payment_status), без сетевых запросов.
+
+Экземпляры шлюзов создаются один раз на процесс (get_payment_gateway).
 """
+import time
 import uuid
 from decimal import Decimal
 import random
 
+from django.conf import settings
+from django.utils import timezone
+
+
+def simulate_payment_status(payment_id: str, latency_ms: int = None,
+                            success_rate: float = None, pending_rate: float = None) -> dict:
+    """
+    Имитация ответа провайдера о статусе платежа.
+
+    Используется встроенной заглушкой и локальным HTTP-сервером заглушки
+    (для нагрузочных прогонов). Параметры по умолчанию берутся из настроек:
+
+    - PAYMENT_GATEWAY_STUB_LATENCY_MS — задержка ответа, мс (по умолчанию 0)
+    - PAYMENT_GATEWAY_STUB_SUCCESS_RATE — доля успешных (по умолчанию 0.9)
+    - PAYMENT_GATEWAY_STUB_PENDING_RATE — доля еще не оплаченных (по умолчанию 0)
+    """
+    if latency_ms is None:
+        latency_ms = getattr(settings, 'PAYMENT_GATEWAY_STUB_LATENCY_MS', 0)
+    if success_rate is None:
+        success_rate = getattr(settings, 'PAYMENT_GATEWAY_STUB_SUCCESS_RATE', 0.9)
+    if pending_rate is None:
+        pending_rate = getattr(settings, 'PAYMENT_GATEWAY_STUB_PENDING_RATE', 0.0)
+
+    if latency_ms:
+        time.sleep(latency_ms / 1000)
+
+    roll = random.random()
+    if roll < pending_rate:
+        return {
+            'payment_id': payment_id,
+            'status': 'pending',
+            'paid_at': None,
+            'error': None
+        }
+
+    success = roll < pending_rate + success_rate
+
+    return {
+        'payment_id': payment_id,
+        'status': 'completed' if success else 'failed',
+        'paid_at': timezone.now().isoformat() if success else None,
+        'error': None if success else 'Payment declined by issuer'
+    }
+
 
 class PaymentGateway:
     """
-    Заглушка платежного шлюза.
-    Имитирует работу реального платежного провайдера.
+    Платежный шлюз по умолчанию.
+
+    Без настроенного адреса имитирует работу реального платежного провайдера.
     """
 
-    @staticmethod
-    def create_payment_link(amount: Decimal, description: str, return_url: str = None) -> dict:
+    CODE = 'default'
+    GATEWAY_NAME = 'default'
+
+    def __init__(self, client=None):
+        """
+        Args:
+            client: GatewayHttpClient провайдера или None (встроенная заглушка)
+        """
+        self.client = client
+
+    def _stub_payment_url(self, payment_id: str) -> str:
+        return f'https://payment-gateway-demo.com/pay/{payment_id}'
+
+    def create_payment_link(self, amount: Decimal, description: str, return_url: str = None) -> dict:
         """
         Создает ссылку для оплаты.
 
@@ -26,39 +90,47 @@ class PaymentGateway:
                 'status': str
             }
         """
-        payment_id = str(uuid.uuid4())
+        if self.client:
+            data = self.client.request_json('POST', '/payments', {
+                'amount': str(amount),
+                'description': description,
+                'return_url': return_url,
+            })
+            payment_id = data['payment_id']
+            payment_url = data['payment_url']
+            status = data.get('status', 'pending')
+        else:
+            payment_id = str(uuid.uuid4())
+            payment_url = self._stub_payment_url(payment_id)
+            status = 'pending'
 
         return {
             'payment_id': payment_id,
-            'payment_url': f'https://payment-gateway-demo.com/pay/{payment_id}',
+            'payment_url': payment_url,
             'amount': amount,
-            'status': 'pending',
-            'description': description
+            'status': status,
+            'description': description,
+            'gateway': self.GATEWAY_NAME
         }
 
-    @staticmethod
-    def check_payment_status(payment_id: str) -> dict:
+    def check_payment_status(self, payment_id: str) -> dict:
         """
         Проверяет статус платежа.
 
-        В реальной системе это был бы API запрос к платежному провайдеру.
-        Здесь мы имитируем успешный платеж в 90% случаев.
+        Returns:
+            dict: {'payment_id', 'status' (pending/completed/failed), 'paid_at', 'error'}
         """
-        # Имитация проверки статуса
-        success = random.random() < 0.9  # 90% успешных платежей
-
-        return {
-            'payment_id': payment_id,
-            'status': 'completed' if success else 'failed',
-            'paid_at': '2025-11-12T12:00:00Z' if success else None,
-            'error': None if success else 'Payment declined by issuer'
-        }
+        if self.client:
+            return self.client.request_json('GET', f'/payments/{payment_id}')
+        return simulate_payment_status(payment_id)
 
-    @staticmethod
-    def process_refund(payment_id: str, amount: Decimal) -> dict:
+    def process_refund(self, payment_id: str, amount: Decimal) -> dict:
         """
         Обрабатывает возврат средств.
         """
+        if self.client:
+            return self.client.request_json('POST', f'/payments/{payment_id}/refund', {'amount': str(amount)})
+
         refund_id = str(uuid.uuid4())
 
         return {
@@ -66,11 +138,10 @@ class PaymentGateway:
             'payment_id': payment_id,
             'amount': amount,
             'status': 'completed',
-            'refunded_at': '2025-11-12T12:00:00Z'
+            'refunded_at': timezone.now().isoformat()
         }
 
-    @staticmethod
-    def verify_webhook_signature(payload: dict, signature: str) -> bool:
+    def verify_webhook_signature(self, payload: dict, signature: str) -> bool:
         """
         Проверяет подпись webhook от платежного шлюза.
 
@@ -79,55 +150,73 @@ class PaymentGateway:
         # Заглушка - всегда возвращает True
         return True
 
+    def metrics(self) -> dict:
+        """Метрики HTTP-клиента шлюза (пул, выключатель) или None для заглушки."""
+        return self.client.metrics() if self.client else None
+
 
 class KaspiPaymentGateway(PaymentGateway):
     """
-    Заглушка интеграции с Kaspi.kz (популярный казахстанский платежный провайдер).
+    Интеграция с Kaspi.kz (популярный казахстанский платежный провайдер).
     """
 
+    CODE = 'kaspi'
     GATEWAY_NAME = "Kaspi.kz"
     API_URL = "https://api.kaspi.kz/payments/v1"
 
-    @staticmethod
-    def create_payment_link(amount: Decimal, description: str, return_url: str = None) -> dict:
-        """Создает платежную ссылку через Kaspi"""
-        result = PaymentGateway.create_payment_link(amount, description, return_url)
-        result['payment_url'] = f'https://kaspi.kz/pay/{result["payment_id"]}'
-        result['gateway'] = KaspiPaymentGateway.GATEWAY_NAME
-        return result
+    def _stub_payment_url(self, payment_id: str) -> str:
+        return f'https://kaspi.kz/pay/{payment_id}'
 
 
 class HalykPaymentGateway(PaymentGateway):
     """
-    Заглушка интеграции с Halyk Bank.
+    Интеграция с Halyk Bank.
     """
 
+    CODE = 'halyk'
     GATEWAY_NAME = "Halyk Bank"
     API_URL = "https://api.halykbank.kz/api/v1"
 
-    @staticmethod
-    def create_payment_link(amount: Decimal, description: str, return_url: str = None) -> dict:
-        """Создает платежную ссылку через Halyk"""
-        result = PaymentGateway.create_payment_link(amount, description, return_url)
-        result['payment_url'] = f'https://epay.halykbank.kz/{result["payment_id"]}'
-        result['gateway'] = HalykPaymentGateway.GATEWAY_NAME
-        return result
+    def _stub_payment_url(self, payment_id: str) -> str:
+        return f'https://epay.halykbank.kz/{payment_id}'
+
+
+GATEWAY_CLASSES = {
+    'kaspi': KaspiPaymentGateway,
+    'halyk': HalykPaymentGateway,
+    'default': PaymentGateway
+}
+
+_gateways = {}
 
 
 def get_payment_gateway(gateway_name: str = 'default') -> PaymentGateway:
     """
     Возвращает нужный платежный шлюз по имени.
 
+    Экземпляр (и его пул соединений) создается один раз на процесс.
+
     Args:
         gateway_name: 'kaspi', 'halyk' или 'default'
 
     Returns:
         PaymentGateway instance
     """
-    gateways = {
-        'kaspi': KaspiPaymentGateway,
-        'halyk': HalykPaymentGateway,
-        'default': PaymentGateway
-    }
+    from apps.payments.gateway_client import get_gateway_client
+
+    code = (gateway_name or 'default').lower()
+    if code not in GATEWAY_CLASSES:
+        code = 'default'
+
+    gateway = _gateways.get(code)
+    if gateway is None:
+        gateway = _gateways[code] = GATEWAY_CLASSES[code](client=get_gateway_client(code))
+    return gateway
+
+
+def reset_payment_gateways():
+    """Сбрасывает кэш шлюзов и их HTTP-клиентов (смена настроек, тесты)."""
+    from apps.payments.gateway_client import reset_gateway_clients
 
-    return gateways.get(gateway_name.lower(), PaymentGateway)()
+    _gateways.clear()
+    reset_gateway_clients()
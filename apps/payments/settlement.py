@@ -0,0 +1,277 @@
+"""
+Сверка реестров (settlement-файлов) платежных шлюзов с платежами.
+
+Реестр CSV/JSONL читается построчно, поэтому память не зависит от
+размера файла. Записи обрабатываются пакетами: платежи пакета находятся
+одним запросом по индексу transaction_id, каждая запись получает
+результат:
+
+    matched          — платеж есть, зачислен, сумма совпадает
+    amount_mismatch  — сумма в реестре отличается от нашей
+    status_mismatch  — платеж есть, но у нас не зачислен
+    missing_local    — платежа с таким transaction_id у нас нет
+    duplicate        — transaction_id уже встречался в реестре
+
+Найденные платежи отмечаются в битовой карте по id в диапазоне id
+платежей шлюза за день (бит на платеж: ~125 КБ на миллион платежей);
+платежи вне диапазона и отсутствующие у нас transaction_id — их мало,
+каждый из них и так попадает в расхождения — запоминаются в множествах.
+Повтор записи в реестре (в том же или другом пакете) не перезаписывает
+первую, а отмечается расхождением duplicate.
+После чтения файла платежи шлюза за день потоково перебираются одним
+запросом, и неотмеченные попадают в missing_provider (anti-join без
+служебной таблицы и без множества всех transaction_id в памяти).
+В отчет (SettlementReport) пишутся счетчики и только расхождения.
+
+Формат записи (CSV-колонки или ключи JSON):
+    transaction_id  — ID транзакции шлюза (или payment_id)
+    amount          — сумма
+"""
+import csv
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from apps.payments.models import Payment, SettlementDiscrepancy, SettlementReport
+
+logger = logging.getLogger(__name__)
+
+JSONL_SUFFIXES = ('.jsonl', '.ndjson', '.json')
+# Платеж зачислен у нас (возврат оформлен позже отдельной операцией)
+CREDITED_STATUSES = ('success', 'completed', 'refunded')
+COUNTERS = ('records', 'matched', 'amount_mismatch', 'status_mismatch', 'missing_local',
+            'missing_provider', 'duplicate', 'invalid')
+
+
+def iter_settlement_rows(path, fmt=None):
+    """
+    Построчно читает реестр и отдает сырые записи (dict).
+
+    Нераспознаваемая строка JSONL отдается как None, чтобы быть
+    учтенной как ошибочная, а не прерывать сверку.
+    """
+    fmt = fmt or ('jsonl' if Path(path).suffix.lower() in JSONL_SUFFIXES else 'csv')
+    with open(path, newline='', encoding='utf-8') as stream:
+        if fmt == 'jsonl':
+            for line in stream:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    yield None
+        else:
+            yield from csv.DictReader(stream)
+
+
+def parse_settlement_row(row):
+    """
+    Приводит сырую запись к (transaction_id, сумма).
+
+    Raises:
+        ValueError: некорректная запись
+    """
+    if not isinstance(row, dict):
+        raise ValueError('Некорректная запись реестра')
+    transaction_id = str(row.get('transaction_id') or row.get('payment_id') or '').strip()
+    if not transaction_id:
+        raise ValueError('Не указан transaction_id')
+    try:
+        amount = Decimal(str(row.get('amount'))).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError) as e:
+        raise ValueError(f'Некорректная сумма: {e}') from e
+    return transaction_id, amount
+
+
+class SettlementReconciler:
+    """
+    Пакетная сверка реестра шлюза за день.
+
+    Пример:
+        reconciler = SettlementReconciler('kaspi', date(2025, 11, 30))
+        report = reconciler.reconcile(iter_settlement_rows('kaspi_2025-11-30.csv'))
+    """
+
+    def __init__(self, gateway, settlement_date, batch_size=None, file_name=''):
+        self.gateway = (gateway or 'default').lower()
+        self.settlement_date = settlement_date
+        self.batch_size = max(1, int(batch_size or getattr(settings, 'SETTLEMENT_BATCH_SIZE', 5000)))
+        self.file_name = str(file_name)[:255]
+        self.stats = {name: 0 for name in COUNTERS}
+        self.stats['provider_total'] = Decimal('0')
+        self.stats['matched_total'] = Decimal('0')
+
+    def reconcile(self, rows):
+        """
+        Сверяет поток записей реестра.
+
+        Returns:
+            SettlementReport: отчет со счетчиками (расхождения — report.discrepancies)
+        """
+        started = time.monotonic()
+        report = SettlementReport.objects.create(
+            gateway=self.gateway,
+            settlement_date=self.settlement_date,
+            file_name=self.file_name,
+        )
+        try:
+            self._init_seen()
+            rows = iter(rows)
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self._process_batch(report, batch)
+            self._find_missing_provider(report)
+        except Exception as e:
+            logger.exception('Ошибка сверки реестра %s за %s', self.gateway, self.settlement_date)
+            report.status = 'failed'
+            report.error = str(e)
+        else:
+            report.status = 'completed'
+
+        for name, value in self.stats.items():
+            setattr(report, name, value)
+        report.elapsed = round(time.monotonic() - started, 3)
+        report.finished_at = timezone.now()
+        report.save()
+        return report
+
+    def _day_payments(self):
+        """Зачисленные платежи шлюза за день (кандидаты в missing_provider)."""
+        day_start = timezone.make_aware(datetime.combine(self.settlement_date, datetime.min.time()))
+        return Payment.objects.filter(
+            gateway=self.gateway,
+            transaction_type='payment',
+            status__in=CREDITED_STATUSES,
+            transaction_id__isnull=False,
+            payment_date__gte=day_start,
+            payment_date__lt=day_start + timedelta(days=1),
+        )
+
+    def _init_seen(self):
+        """Битовая карта найденных платежей по диапазону id платежей дня."""
+        bounds = self._day_payments().aggregate(first=Min('pk'), last=Max('pk'))
+        self.first_pk = bounds['first'] or 0
+        self.last_pk = bounds['last'] if bounds['last'] is not None else -1
+        self.seen = bytearray((self.last_pk - self.first_pk + 1 + 7) // 8)
+        # Найденные платежи вне диапазона дня и transaction_id, которых нет у нас
+        self.seen_outside = set()
+        self.seen_missing = set()
+
+    def _mark_seen(self, pk):
+        offset = pk - self.first_pk
+        if 0 <= offset < len(self.seen) * 8:
+            self.seen[offset >> 3] |= 1 << (offset & 7)
+        else:
+            self.seen_outside.add(pk)
+
+    def _is_seen(self, pk):
+        offset = pk - self.first_pk
+        if 0 <= offset < len(self.seen) * 8:
+            return bool(self.seen[offset >> 3] & (1 << (offset & 7)))
+        return pk in self.seen_outside
+
+    def _process_batch(self, report, batch):
+        records = []
+        for row in batch:
+            self.stats['records'] += 1
+            try:
+                transaction_id, amount = parse_settlement_row(row)
+            except ValueError:
+                self.stats['invalid'] += 1
+                continue
+            records.append((transaction_id, amount))
+            self.stats['provider_total'] += amount
+        if not records:
+            return
+
+        payments = {
+            transaction_id: (pk, amount, status)
+            for pk, transaction_id, amount, status in Payment.objects.filter(
+                transaction_id__in={transaction_id for transaction_id, _ in records}
+            ).values_list('pk', 'transaction_id', 'amount', 'status')
+        }
+
+        discrepancies = []
+        for transaction_id, provider_amount in records:
+            found = payments.get(transaction_id)
+            if found is None:
+                if transaction_id in self.seen_missing:
+                    kind = 'duplicate'
+                else:
+                    self.seen_missing.add(transaction_id)
+                    kind = 'missing_local'
+            elif self._is_seen(found[0]):
+                kind = 'duplicate'
+            else:
+                self._mark_seen(found[0])
+                if found[2] not in CREDITED_STATUSES:
+                    kind = 'status_mismatch'
+                elif found[1] != provider_amount:
+                    kind = 'amount_mismatch'
+                else:
+                    self.stats['matched'] += 1
+                    self.stats['matched_total'] += provider_amount
+                    continue
+            self.stats[kind] += 1
+            discrepancies.append(SettlementDiscrepancy(
+                report=report,
+                kind=kind,
+                transaction_id=transaction_id,
+                payment_id=found[0] if found else None,
+                provider_amount=provider_amount,
+                local_amount=found[1] if found else None,
+                local_status=found[2] if found else '',
+            ))
+
+        SettlementDiscrepancy.objects.bulk_create(discrepancies)
+
+    def _find_missing_provider(self, report):
+        """Зачисленные платежи шлюза за день, которых нет в реестре."""
+        missing = (
+            (pk, transaction_id, amount, status)
+            # Платежи, созданные после начала сверки, в битовую карту не входят
+            for pk, transaction_id, amount, status in self._day_payments()
+            .filter(pk__range=(self.first_pk, self.last_pk))
+            .order_by()
+            .values_list('pk', 'transaction_id', 'amount', 'status')
+            .iterator(chunk_size=self.batch_size)
+            if not self._is_seen(pk)
+        )
+        while True:
+            chunk = list(islice(missing, self.batch_size))
+            if not chunk:
+                break
+            SettlementDiscrepancy.objects.bulk_create([
+                SettlementDiscrepancy(
+                    report=report,
+                    kind='missing_provider',
+                    transaction_id=transaction_id,
+                    payment_id=pk,
+                    local_amount=amount,
+                    local_status=status,
+                )
+                for pk, transaction_id, amount, status in chunk
+            ])
+            self.stats['missing_provider'] += len(chunk)
+
+
+def reconcile_settlement_file(path, gateway, settlement_date, fmt=None, batch_size=None):
+    """
+    Сверяет файл реестра шлюза за день.
+
+    Returns:
+        SettlementReport
+    """
+    reconciler = SettlementReconciler(gateway, settlement_date, batch_size=batch_size, file_name=Path(path).name)
+    return reconciler.reconcile(iter_settlement_rows(path, fmt=fmt))
@@ -0,0 +1,401 @@
+"""
+Опрос платежного шлюза по ожидающим платежам.
+
+Платежи захватываются пачками: строки блокируются с SKIP LOCKED
+и переводятся в статус 'processing', поэтому несколько воркеров
+не берут одни и те же платежи. Статусы запрашиваются параллельно
+в ограниченном пуле потоков с ограничением частоты запросов на каждый
+шлюз. Результаты применяются пакетно: зачисления — одним проходом
+по заблокированным договорам (как пакетные списания в биллинге),
+отказы и неизменившиеся статусы — set-based UPDATE.
+
+Платеж, застрявший в 'processing' дольше аренды (воркер упал),
+снова становится доступен для захвата.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, PositiveBigIntegerField, Q, TextField, Value, When
+from django.db.models.functions import Coalesce, Concat
+from django.utils import timezone
+
+from apps.payments.aggregates import record_payments
+from apps.payments.models import Payment
+from apps.payments.payment_gateway import get_payment_gateway
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты запросов (token bucket), общий для потоков пула.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Блокирует поток, пока не появится свободный токен."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def parse_rate_limits(value):
+    """
+    'kaspi:20,halyk:10,default:50' -> {'kaspi': 20.0, 'halyk': 10.0, 'default': 50.0}
+    (запросов в секунду на шлюз).
+    """
+    limits = {}
+    for item in (value or '').split(','):
+        name, _, rate = item.partition(':')
+        if name.strip() and rate.strip():
+            limits[name.strip().lower()] = float(rate)
+    return limits
+
+
+def _gateway_name(payment):
+    return (payment.gateway or 'default').lower()
+
+
+def claim_pending_payments(batch_size, lease_seconds=None, updated_before=None):
+    """
+    Захватывает пачку ожидающих платежей шлюза.
+
+    Берутся только платежи, созданные через шлюз (create_payment_link
+    заполняет gateway). Ручные и API-платежи с банковской ссылкой в
+    transaction_id остаются в pending до подтверждения оператором.
+
+    Args:
+        batch_size: размер пачки
+        lease_seconds: срок аренды захваченного платежа
+        updated_before: брать только платежи, не менявшиеся с этого момента
+                        (чтобы прогон не опрашивал повторно возвращенные в очередь)
+
+    Returns:
+        list: платежи в статусе 'processing'
+    """
+    lease_seconds = lease_seconds or getattr(settings, 'PAYMENT_POLL_LEASE_SECONDS', 300)
+    now = timezone.now()
+    stale = now - timedelta(seconds=lease_seconds)
+
+    queryset = (
+        Payment.objects.select_for_update(skip_locked=True)
+        .filter(Q(status='pending') | Q(status='processing', updated_at__lt=stale))
+        .filter(transaction_type='payment', transaction_id__isnull=False, processed_at__isnull=True)
+        .exclude(transaction_id='')
+        .exclude(gateway='')
+    )
+    if updated_before is not None:
+        queryset = queryset.filter(updated_at__lt=updated_before)
+
+    with transaction.atomic():
+        payments = list(queryset.order_by('payment_date')[:batch_size])
+        if payments:
+            Payment.objects.filter(pk__in=[payment.pk for payment in payments]).update(
+                status='processing', updated_at=now
+            )
+    for payment in payments:
+        payment.status = 'processing'
+    return payments
+
+
+class GatewayStatusPoller:
+    """
+    Параллельная проверка статусов в шлюзах.
+
+    Пример:
+        poller = GatewayStatusPoller()
+        stats = poller.run()
+    """
+
+    def __init__(self, batch_size=None, workers=None, rate_limits=None):
+        self.batch_size = max(1, int(batch_size or getattr(settings, 'PAYMENT_POLL_BATCH_SIZE', 200)))
+        self.workers = max(1, int(workers or getattr(settings, 'PAYMENT_POLL_WORKERS', 16)))
+        if rate_limits is None:
+            rate_limits = parse_rate_limits(getattr(settings, 'PAYMENT_GATEWAY_RATE_LIMITS', ''))
+        self.limiters = {name: RateLimiter(rate) for name, rate in rate_limits.items()}
+        self.gateways = {}
+
+    def _limiter(self, name):
+        return self.limiters.get(name) or self.limiters.get('default')
+
+    def _check(self, payment):
+        """Запрос статуса одного платежа (выполняется в потоке пула)."""
+        name = _gateway_name(payment)
+        limiter = self._limiter(name)
+        if limiter:
+            limiter.acquire()
+        try:
+            return self.gateways[name].check_payment_status(payment.transaction_id)
+        except Exception as e:
+            logger.warning('Ошибка запроса статуса платежа %s: %s', payment.pk, e)
+            return {'status': 'error', 'error': str(e)}
+
+    def poll(self, payments):
+        """
+        Запрашивает статусы пачки платежей параллельно.
+
+        Returns:
+            list: ответы шлюза в порядке payments
+        """
+        for payment in payments:
+            name = _gateway_name(payment)
+            if name not in self.gateways:
+                self.gateways[name] = get_payment_gateway(name)
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(payments))) as executor:
+            return list(executor.map(self._check, payments))
+
+    def run(self, max_batches=None):
+        """
+        Обрабатывает ожидающие платежи пачками, пока они есть.
+
+        Returns:
+            dict: итоги и тайминги по пачкам
+        """
+        summary = {'processed': 0, 'completed': 0, 'failed': 0, 'pending': 0, 'errors': 0, 'batches': []}
+        batch_number = 0
+        run_started = timezone.now()
+
+        while max_batches is None or batch_number < max_batches:
+            started = time.monotonic()
+            payments = claim_pending_payments(self.batch_size, updated_before=run_started)
+            if not payments:
+                break
+            batch_number += 1
+            claimed = time.monotonic()
+
+            results = self.poll(payments)
+            polled = time.monotonic()
+
+            counts = apply_gateway_results(payments, results)
+            applied = time.monotonic()
+
+            batch = {
+                'batch': batch_number,
+                'size': len(payments),
+                **counts,
+                'claim_sec': round(claimed - started, 3),
+                'poll_sec': round(polled - claimed, 3),
+                'apply_sec': round(applied - polled, 3),
+                'total_sec': round(applied - started, 3),
+            }
+            summary['batches'].append(batch)
+            for key in ('completed', 'failed', 'pending', 'errors'):
+                summary[key] += counts[key]
+            summary['processed'] += counts['completed'] + counts['failed']
+            logger.info(
+                'Опрос шлюза, пачка %s: %s платежей (успешно %s, отказ %s, ожидают %s, ошибок %s), '
+                'захват %sс, опрос %sс, применение %sс',
+                batch_number, len(payments), counts['completed'], counts['failed'], counts['pending'],
+                counts['errors'], batch['claim_sec'], batch['poll_sec'], batch['apply_sec'],
+            )
+
+        return summary
+
+
+def apply_completed_payments(payments, now=None):
+    """
+    Зачисляет подтвержденные шлюзом пополнения одним пакетом.
+
+    Платежи и договоры блокируются SELECT ... FOR UPDATE (в том же
+    порядке, что и в Payment.process()); платежи, уже обработанные
+    другим путем (вебхук, опрос, терминал), пропускаются. Записи журнала
+    баланса создаются через bulk_create, платежи — bulk_update,
+    баланс и journal_seq договоров меняются одним UPDATE с CASE по id.
+    Побочные эффекты (возобновление, уведомления, догоняющее списание)
+    выполняются после фиксации, как в Payment.process().
+
+    Returns:
+        list: фактически зачисленные платежи
+    """
+    from apps.contracts.models import BalanceJournalEntry, Contract
+
+    now = now or timezone.now()
+    applied = []
+
+    with transaction.atomic():
+        unprocessed = set(
+            Payment.objects.select_for_update()
+            .filter(pk__in=[payment.pk for payment in payments], processed_at__isnull=True)
+            .values_list('pk', flat=True)
+        )
+        payments = [payment for payment in payments if payment.pk in unprocessed]
+        if not payments:
+            return applied
+
+        contracts = {
+            contract.id: contract
+            for contract in Contract.objects.select_for_update(of=('self',))
+            .select_related('tariff', 'customer', 'sim_card')
+            .filter(id__in={payment.contract_id for payment in payments})
+        }
+        entries = []
+        deltas = defaultdict(Decimal)
+        counts = defaultdict(int)
+
+        for payment in sorted(payments, key=lambda item: item.pk):
+            contract = contracts[payment.contract_id]
+            if not hasattr(contract, '_balance_before_change'):
+                contract._balance_before_change = contract.balance
+            contract.balance += payment.amount
+
+            payment.contract = contract
+            payment.status = 'success'
+            payment.balance_after = contract.balance
+            payment.processed_at = now
+            payment.updated_at = now
+            payment._balance_changed = True
+            entries.append(contract.journal_entry(payment.amount, payment, payment.description or 'Пополнение баланса'))
+            deltas[contract.id] += payment.amount
+            counts[contract.id] += 1
+            applied.append(payment)
+
+        Payment.objects.bulk_update(applied, ['status', 'balance_after', 'processed_at', 'updated_at'])
+        BalanceJournalEntry.objects.bulk_create(entries)
+        record_payments(applied)
+
+        contract_ids = list(deltas)
+        if contract_ids:
+            Contract.objects.filter(pk__in=contract_ids).update(
+                balance=F('balance') + Case(
+                    *[When(pk=contract_id, then=Value(deltas[contract_id])) for contract_id in contract_ids],
+                    output_field=DecimalField(max_digits=10, decimal_places=2),
+                ),
+                journal_seq=F('journal_seq') + Case(
+                    *[When(pk=contract_id, then=Value(counts[contract_id])) for contract_id in contract_ids],
+                    output_field=PositiveBigIntegerField(),
+                ),
+                updated_at=now,
+            )
+
+    for payment in applied:
+        try:
+            payment._after_processed()
+        except Exception as e:
+            logger.warning('Ошибка обработки зачисления платежа %s: %s', payment.pk, e)
+    return applied
+
+
+def fail_payments(payments, errors, now=None):
+    """
+    Отмечает платежи отклоненными одним UPDATE (причина дописывается
+    в описание) и уведомляет абонентов.
+
+    Обновляются только еще не обработанные платежи в статусах
+    'pending'/'processing' — повторный или запоздавший отказ не меняет
+    уже зачисленный платеж.
+
+    Args:
+        payments: платежи-кандидаты
+        errors: {id платежа: причина отказа}
+
+    Returns:
+        list: отклоненные платежи
+    """
+    from apps.payments.notifications import notify_payment_error
+
+    now = now or timezone.now()
+    with transaction.atomic():
+        failed_ids = set(
+            Payment.objects.select_for_update()
+            .filter(pk__in=list(errors), status__in=['pending', 'processing'], processed_at__isnull=True)
+            .values_list('pk', flat=True)
+        )
+        if failed_ids:
+            Payment.objects.filter(pk__in=failed_ids).update(
+                status='failed',
+                processed_at=now,
+                updated_at=now,
+                description=Concat(
+                    Coalesce(F('description'), Value('')),
+                    Case(
+                        *[When(pk=pk, then=Value(f'\nОшибка: {errors[pk]}')) for pk in failed_ids],
+                        output_field=TextField(),
+                    ),
+                    output_field=TextField(),
+                ),
+            )
+
+        failed = [payment for payment in payments if payment.pk in failed_ids]
+        for payment in failed:
+            payment.status = 'failed'
+            payment.processed_at = now
+        record_payments(failed)
+
+    for payment in failed:
+        try:
+            notify_payment_error(payment, errors[payment.pk])
+        except Exception as e:
+            logger.warning('Ошибка уведомления об отказе платежа %s: %s', payment.pk, e)
+    return failed
+
+
+def apply_gateway_results(payments, results):
+    """
+    Применяет ответы шлюза к захваченной пачке.
+
+    Returns:
+        dict: количество completed / failed / pending / errors
+    """
+    now = timezone.now()
+    completed = []
+    failed = {}
+    release = []
+    errors = 0
+
+    for payment, result in zip(payments, results):
+        status = (result or {}).get('status')
+        if status == 'completed' and payment.amount > 0:
+            completed.append(payment)
+        elif status == 'failed':
+            failed[payment.pk] = result.get('error') or 'Неизвестная ошибка'
+        elif status == 'completed':
+            failed[payment.pk] = 'Некорректная сумма платежа'
+        else:
+            # Еще не оплачен или ошибка запроса: вернется в очередь опроса
+            if status == 'error':
+                errors += 1
+            release.append(payment.pk)
+
+    if completed:
+        completed = apply_completed_payments(completed, now)
+
+    if failed:
+        failed = fail_payments(payments, failed, now)
+
+    if release:
+        Payment.objects.filter(pk__in=release, status='processing').update(status='pending', updated_at=now)
+
+    return {
+        'completed': len(completed),
+        'failed': len(failed),
+        'pending': len(release) - errors,
+        'errors': errors,
+    }
+
+
+def poll_pending_payments(batch_size=None, workers=None, max_batches=None):
+    """Опрос шлюза по всем ожидающим платежам (см. GatewayStatusPoller)."""
+    return GatewayStatusPoller(batch_size=batch_size, workers=workers).run(max_batches=max_batches)
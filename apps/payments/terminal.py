@@ -0,0 +1,103 @@
+"""
+Отложенное подтверждение платежей терминала самообслуживания.
+
+Терминал создает платеж в статусе 'pending' со временем подтверждения
+confirm_after (через 20–30 секунд). Периодическая задача
+confirm_terminal_payments забирает наступившие подтверждения пачками
+(SKIP LOCKED, статус 'processing') и зачисляет их одним пакетом через
+apply_completed_payments. Очередь хранится в таблице платежей, поэтому
+переживает перезапуск веб-процесса, а веб-воркеры не держат спящих
+потоков и соединений с базой.
+
+Платеж, застрявший в 'processing' дольше аренды (воркер упал), снова
+доступен для захвата.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, TextField, Value
+from django.db.models.functions import Coalesce, Concat
+from django.utils import timezone
+
+from apps.payments.models import Payment
+from apps.payments.status_poller import apply_completed_payments
+
+logger = logging.getLogger(__name__)
+
+CONFIRMATION_NOTE = '\nПлатеж подтвержден терминалом.'
+
+
+def claim_due_terminal_payments(batch_size, lease_seconds=None):
+    """
+    Захватывает пачку платежей терминала, время подтверждения которых наступило.
+
+    Returns:
+        list: платежи в статусе 'processing' (с отметкой о подтверждении в описании)
+    """
+    lease_seconds = lease_seconds or getattr(settings, 'PAYMENT_POLL_LEASE_SECONDS', 300)
+    now = timezone.now()
+    stale = now - timedelta(seconds=lease_seconds)
+
+    queryset = (
+        Payment.objects.select_for_update(skip_locked=True)
+        .select_related('contract')
+        .filter(Q(status='pending') | Q(status='processing', updated_at__lt=stale))
+        .filter(confirm_after__lte=now, processed_at__isnull=True)
+    )
+
+    with transaction.atomic():
+        payments = list(queryset.order_by('confirm_after')[:batch_size])
+        if payments:
+            Payment.objects.filter(pk__in=[payment.pk for payment in payments]).update(
+                status='processing',
+                updated_at=now,
+                description=Concat(
+                    Coalesce(F('description'), Value('')),
+                    Value(CONFIRMATION_NOTE),
+                    output_field=TextField(),
+                ),
+            )
+    for payment in payments:
+        payment.status = 'processing'
+        payment.description = (payment.description or '') + CONFIRMATION_NOTE
+    return payments
+
+
+def confirm_terminal_payments(batch_size=None, max_batches=None):
+    """
+    Зачисляет наступившие платежи терминала пачками.
+
+    Returns:
+        dict: количество зачисленных платежей и тайминги по пачкам
+    """
+    batch_size = max(1, int(batch_size or getattr(settings, 'TERMINAL_CONFIRM_BATCH_SIZE', 500)))
+    summary = {'confirmed': 0, 'batches': []}
+    batch_number = 0
+
+    while max_batches is None or batch_number < max_batches:
+        started = time.monotonic()
+        payments = claim_due_terminal_payments(batch_size)
+        if not payments:
+            break
+        batch_number += 1
+
+        # Нулевые и отрицательные суммы отсекает форма терминала
+        confirmed = apply_completed_payments([payment for payment in payments if payment.amount > 0])
+
+        batch = {
+            'batch': batch_number,
+            'size': len(payments),
+            'confirmed': len(confirmed),
+            'total_sec': round(time.monotonic() - started, 3),
+        }
+        summary['batches'].append(batch)
+        summary['confirmed'] += len(confirmed)
+        logger.info(
+            'Подтверждение терминала, пачка %s: %s платежей, зачислено %s за %sс',
+            batch_number, len(payments), len(confirmed), batch['total_sec'],
+        )
+
+    return summary
@@ -0,0 +1,94 @@
+"""
+Платежи, созданные через create_payment/create_charge/refund_payment,
+меняют баланс договора ровно один раз.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.contracts.models import BalanceJournalEntry, Contract
+from apps.customers.models import Customer
+from apps.payments.models import Payment
+from apps.sims.models import SIM
+from apps.tariffs.models import Tariff
+
+
+class PaymentBalanceTests(TestCase):
+    def setUp(self):
+        tariff = Tariff.objects.create(
+            name='Тест',
+            monthly_fee=Decimal('0.00'),
+            minutes_included=100,
+            sms_included=50,
+            data_gb_included=Decimal('5'),
+            minute_overage_cost=Decimal('1.50'),
+            sms_overage_cost=Decimal('1.00'),
+            data_gb_overage_cost=Decimal('100.00'),
+        )
+        customer = Customer.objects.create(
+            first_name='Иван',
+            last_name='Петров',
+            passport_series='AN',
+            passport_number='000001',
+            phone='+996555000001',
+            email='ivan@example.kg',
+        )
+        contract = Contract.objects.create(
+            customer=customer,
+            tariff=tariff,
+            signed_date=timezone.localdate(),
+            status='draft',
+            balance=Decimal('1000.00'),
+        )
+        sim = SIM.objects.create(iccid='8999600000000000001', imsi='437010000000001', msisdn='+996700000001')
+        contract.activate(sim)
+        Contract.objects.filter(pk=contract.pk).update(
+            next_billing_date=timezone.localdate() + timedelta(days=30)
+        )
+        self.contract = Contract.objects.get(pk=contract.pk)
+        self.start_balance = self.contract.balance
+        self.start_entries = BalanceJournalEntry.objects.filter(contract=self.contract).count()
+
+    def assertBalance(self, delta, entries):
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.balance, self.start_balance + delta)
+        self.assertEqual(
+            BalanceJournalEntry.objects.filter(contract=self.contract).count(),
+            self.start_entries + entries,
+        )
+
+    def test_create_payment_credits_once(self):
+        payment = Payment.create_payment(self.contract, Decimal('250.00'))
+
+        self.assertIsNotNone(payment.processed_at)
+        self.assertEqual(payment.balance_after, self.start_balance + Decimal('250.00'))
+        self.assertBalance(Decimal('250.00'), 1)
+
+        # Повторная обработка не меняет баланс
+        payment.process()
+        Payment.objects.get(pk=payment.pk).process()
+        self.assertBalance(Decimal('250.00'), 1)
+
+    def test_create_charge_debits_once(self):
+        charge = Payment.create_charge(self.contract, Decimal('40.00'))
+
+        self.assertIsNotNone(charge.processed_at)
+        self.assertBalance(Decimal('-40.00'), 1)
+
+        charge.process()
+        self.assertBalance(Decimal('-40.00'), 1)
+
+    def test_refund_reverses_payment_once(self):
+        payment = Payment.create_payment(self.contract, Decimal('300.00'))
+        refund = payment.refund_payment(reason='Ошибочный платеж')
+
+        self.assertEqual(refund.amount, Decimal('-300.00'))
+        self.assertIsNotNone(refund.processed_at)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'refunded')
+        self.assertBalance(Decimal('0.00'), 2)
+
+        refund.process()
+        self.assertBalance(Decimal('0.00'), 2)
@@ -0,0 +1,170 @@
+"""
+GatewayHttpClient против локальной заглушки шлюза (make_stub_server
+на свободном порту): пул соединений, таймауты с повторами, circuit
+breaker и метрики.
+"""
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from apps.payments.gateway_client import (
+    CircuitBreaker,
+    CircuitOpenError,
+    GatewayError,
+    GatewayHttpClient,
+)
+from apps.payments.gateway_stub_server import make_stub_server, start_stub_server_thread
+
+
+class GatewayHttpClientTests(SimpleTestCase):
+    def setUp(self):
+        self.server = make_stub_server(port=0, success_rate=1.0)
+        # Ответ на запрос, по которому клиент уже отвалился по таймауту, — BrokenPipe
+        self.server.handle_error = lambda request, client_address: None
+        start_stub_server_thread(self.server)
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def make_client(self, **kwargs):
+        options = {
+            'pool_size': 2,
+            'connect_timeout': 1.0,
+            'read_timeout': 1.0,
+            'retries': 0,
+            'backoff_base': 0.01,
+            'backoff_max': 0.05,
+        }
+        options.update(kwargs)
+        client = GatewayHttpClient('stub', self.base_url, **options)
+        self.clients.append(client)
+        return client
+
+    def test_connection_reused_across_requests(self):
+        client = self.make_client()
+
+        for index in range(10):
+            data = client.request_json('GET', f'/payments/p{index}')
+            self.assertEqual(data['payment_id'], f'p{index}')
+
+        pool = client.metrics()['pool']
+        self.assertEqual(pool['connections_opened'], 1)
+        self.assertEqual(pool['requests_sent'], 10)
+        self.assertEqual(pool['in_use'], 0)
+        self.assertEqual(pool['idle'], 1)
+
+    def test_read_timeout_retried_with_backoff(self):
+        self.server.latency_ms = 300
+        client = self.make_client(read_timeout=0.05, retries=2)
+
+        with mock.patch.object(client, '_backoff', wraps=client._backoff) as backoff:
+            with self.assertRaises(GatewayError):
+                client.request_json('GET', '/payments/slow')
+
+        self.assertEqual(backoff.call_args_list, [mock.call(0), mock.call(1)])
+        stats = client.metrics()['requests']
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['timeouts'], 3)
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['failed'], 1)
+
+    def test_read_timeout_not_retried_when_not_idempotent(self):
+        self.server.latency_ms = 300
+        client = self.make_client(read_timeout=0.05, retries=2)
+
+        with self.assertRaises(GatewayError):
+            client.request_json('GET', '/payments/slow', idempotent=False)
+
+        stats = client.metrics()['requests']
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['retries'], 0)
+
+    def test_backoff_uses_full_jitter_within_cap(self):
+        client = self.make_client(backoff_base=0.1, backoff_max=0.3)
+
+        for attempt, cap in ((0, 0.1), (1, 0.2), (2, 0.3), (5, 0.3)):
+            delays = [client._backoff(attempt) for _ in range(50)]
+            self.assertTrue(all(0 <= delay <= cap for delay in delays))
+            self.assertGreater(len(set(delays)), 1)
+
+    def test_circuit_breaker_cycle(self):
+        self.server.error_rate = 1.0
+        client = self.make_client(breaker_threshold=2, breaker_reset_timeout=0.2)
+
+        for _ in range(2):
+            with self.assertRaises(GatewayError) as ctx:
+                client.request_json('GET', '/payments/p1')
+            self.assertEqual(ctx.exception.status, 503)
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+        with self.assertRaises(CircuitOpenError):
+            client.request_json('GET', '/payments/p1')
+        sent = client.metrics()['pool']['requests_sent']
+
+        # Пробный запрос в half_open падает — выключатель снова размыкается
+        time.sleep(0.25)
+        with self.assertRaises(GatewayError):
+            client.request_json('GET', '/payments/p1')
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(client.metrics()['pool']['requests_sent'], sent + 1)
+
+        # Провайдер восстановился: пропускается один пробный запрос
+        self.server.error_rate = 0.0
+        time.sleep(0.25)
+        self.assertTrue(client.breaker.allow())
+        self.assertEqual(client.breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            client.request_json('GET', '/payments/p1')
+        client.breaker.record_failure()
+
+        time.sleep(0.25)
+        data = client.request_json('GET', '/payments/p1')
+        self.assertEqual(data['status'], 'completed')
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+        breaker = client.metrics()['breaker']
+        self.assertEqual(breaker['state'], CircuitBreaker.CLOSED)
+        self.assertEqual(breaker['consecutive_failures'], 0)
+        self.assertEqual(breaker['opened_count'], 3)
+        self.assertEqual(breaker['rejected'], 2)
+
+    def test_client_errors_do_not_open_breaker(self):
+        client = self.make_client(breaker_threshold=1)
+
+        with self.assertRaises(GatewayError) as ctx:
+            client.request_json('GET', '/unknown')
+
+        self.assertEqual(ctx.exception.status, 404)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_metrics_counters(self):
+        self.server.latency_ms = 5
+        client = self.make_client(retries=1)
+
+        for index in range(3):
+            client.request_json('GET', f'/payments/p{index}')
+        client.request_json('POST', '/payments', {'amount': '100.00'})
+        with self.assertRaises(GatewayError):
+            client.request_json('GET', '/unknown')
+
+        metrics = client.metrics()
+        self.assertEqual(metrics['gateway'], 'stub')
+        self.assertEqual(metrics['base_url'], self.base_url)
+        self.assertEqual(metrics['requests'], {
+            'requests': 5,
+            'succeeded': 4,
+            'failed': 1,
+            'retries': 0,
+            'timeouts': 0,
+            'short_circuited': 0,
+            'avg_latency_ms': metrics['requests']['avg_latency_ms'],
+        })
+        self.assertGreater(metrics['requests']['avg_latency_ms'], 0)
+        self.assertEqual(metrics['pool']['maxsize'], 2)
+        self.assertEqual(metrics['pool']['requests_sent'], 5)
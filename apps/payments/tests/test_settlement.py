@@ -0,0 +1,93 @@
+"""
+Сверка реестра шлюза: повторы transaction_id в реестре.
+"""
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.contracts.models import Contract
+from apps.customers.models import Customer
+from apps.payments.models import Payment
+from apps.payments.settlement import SettlementReconciler
+from apps.sims.models import SIM
+from apps.tariffs.models import Tariff
+
+
+class SettlementDuplicateTests(TestCase):
+    def setUp(self):
+        tariff = Tariff.objects.create(
+            name='Тест',
+            monthly_fee=Decimal('0.00'),
+            minutes_included=100,
+            sms_included=50,
+            data_gb_included=Decimal('5'),
+            minute_overage_cost=Decimal('1.50'),
+            sms_overage_cost=Decimal('1.00'),
+            data_gb_overage_cost=Decimal('100.00'),
+        )
+        customer = Customer.objects.create(
+            first_name='Иван',
+            last_name='Петров',
+            passport_series='AN',
+            passport_number='000001',
+            phone='+996555000001',
+            email='ivan@example.kg',
+        )
+        contract = Contract.objects.create(
+            customer=customer,
+            tariff=tariff,
+            signed_date=timezone.localdate(),
+            status='draft',
+            balance=Decimal('0.00'),
+        )
+        contract.activate(SIM.objects.create(
+            iccid='8999600000000000001', imsi='437010000000001', msisdn='+996700000001'
+        ))
+        for transaction_id in ('T1', 'T2', 'T3'):
+            Payment.create_payment(contract, Decimal('100.00'), transaction_id=transaction_id)
+        Payment.objects.update(gateway='kaspi')
+
+    def reconcile(self, rows):
+        reconciler = SettlementReconciler('kaspi', timezone.localdate(), batch_size=3)
+        return reconciler.reconcile(rows)
+
+    def test_repeated_transaction_reported_as_duplicate(self):
+        report = self.reconcile([
+            {'transaction_id': 'T1', 'amount': '100.00'},
+            {'transaction_id': 'T1', 'amount': '100.00'},  # повтор в том же пакете
+            {'transaction_id': 'T2', 'amount': '100.00'},
+            {'transaction_id': 'T2', 'amount': '100.00'},  # повтор в следующем пакете
+            {'transaction_id': 'X9', 'amount': '5.00'},
+            {'transaction_id': 'X9', 'amount': '5.00'},
+            {'transaction_id': 'T3', 'amount': '100.00'},
+        ])
+
+        self.assertEqual(report.status, 'completed')
+        self.assertEqual(report.records, 7)
+        self.assertEqual(report.matched, 3)
+        self.assertEqual(report.missing_local, 1)
+        self.assertEqual(report.duplicate, 3)
+        self.assertEqual(report.missing_provider, 0)
+        self.assertEqual(
+            report.records,
+            report.matched + report.amount_mismatch + report.status_mismatch
+            + report.missing_local + report.duplicate + report.invalid,
+        )
+        self.assertEqual(report.provider_total, Decimal('510.00'))
+        self.assertEqual(report.matched_total, Decimal('300.00'))
+        self.assertEqual(
+            sorted(report.discrepancies.filter(kind='duplicate').values_list('transaction_id', flat=True)),
+            ['T1', 'T2', 'X9'],
+        )
+
+    def test_unique_registry_has_no_duplicates(self):
+        report = self.reconcile([
+            {'transaction_id': 'T1', 'amount': '100.00'},
+            {'transaction_id': 'T2', 'amount': '90.00'},
+        ])
+
+        self.assertEqual(report.matched, 1)
+        self.assertEqual(report.amount_mismatch, 1)
+        self.assertEqual(report.missing_provider, 1)
+        self.assertEqual(report.duplicate, 0)
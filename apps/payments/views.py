@@ -36,6 +36,20 @@ class PaymentViewSet(viewsets.ModelViewSet):
             return PaymentCreateSerializer
         return PaymentSerializer
 
+    def create(self, request, *args, **kwargs):
+        """
+        Создание платежа (pending).
+
+        Поддерживает заголовок Idempotency-Key: повтор запроса с тем же
+        ключом возвращает первый ответ, не создавая платеж повторно.
+        """
+        from apps.payments.idempotency import idempotent_response
+
+        return idempotent_response(
+            request, 'payments.create', request.data,
+            lambda: super(PaymentViewSet, self).create(request, *args, **kwargs)
+        )
+
     @action(detail=True, methods=['post'])
     def process(self, request, pk=None):
         """Обработать платеж"""
@@ -104,31 +118,46 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def statistics(self, request):
-        """Получить статистику по платежам"""
-        from django.db.models import Sum, Count, Avg
+        """
+        Получить статистику по платежам.
 
-        successful_qs = Payment.objects.filter(status__in=SUCCESS_STATUSES)
+        Итоговые статусы читаются из дневной сводки (PaymentDailyAggregate),
+        ожидающие платежи считаются по индексу статуса.
+        """
+        from decimal import Decimal
+        from django.db.models import Sum
+        from apps.payments.aggregates import TRACKED_STATUSES, aggregate_queryset, payment_totals
+
+        by_status = dict(
+            aggregate_queryset(TRACKED_STATUSES)
+            .values('status')
+            .annotate(total=Sum('count'))
+            .values_list('status', 'total')
+        )
+        successful = payment_totals()
+        pending = Payment.objects.filter(status='pending').count()
+        processing = Payment.objects.filter(status='processing').count()
 
         stats = {
-            'total': Payment.objects.count(),
-            'pending': Payment.objects.filter(status='pending').count(),
-            'processing': Payment.objects.filter(status='processing').count(),
-            'completed': successful_qs.count(),
-            'failed': Payment.objects.filter(status='failed').count(),
-            'refunded': Payment.objects.filter(status='refunded').count(),
-            'total_amount': successful_qs.aggregate(total=Sum('amount'))['total'] or 0,
-            'avg_payment': successful_qs.aggregate(avg=Avg('amount'))['avg'] or 0,
+            'total': sum(by_status.values()) + pending + processing,
+            'pending': pending,
+            'processing': processing,
+            'completed': successful['count'],
+            'failed': by_status.get('failed', 0),
+            'refunded': by_status.get('refunded', 0),
+            'total_amount': successful['amount'],
+            'avg_payment': (
+                (successful['amount'] / successful['count']).quantize(Decimal('0.01'))
+                if successful['count'] else 0
+            ),
             'by_method': dict(
-                successful_qs.values('payment_method')
-                .annotate(count=Count('id'), total=Sum('amount'))
+                aggregate_queryset()
+                .values('payment_method')
+                .annotate(total=Sum('amount'))
                 .values_list('payment_method', 'total')
             ),
-            'deposits': successful_qs.filter(
-                transaction_type='payment'
-            ).aggregate(total=Sum('amount'))['total'] or 0,
-            'deductions': successful_qs.filter(
-                transaction_type='charge'
-            ).aggregate(total=Sum('amount'))['total'] or 0,
+            'deposits': payment_totals(transaction_type='payment')['amount'],
+            'deductions': payment_totals(transaction_type='charge')['amount'],
         }
         return Response(stats)
 
@@ -143,7 +172,17 @@ class PaymentViewSet(viewsets.ModelViewSet):
             description: описание (опционально)
             gateway: платежный шлюз ('kaspi', 'halyk', 'default')
             return_url: URL для возврата (опционально)
+
+        Поддерживает заголовок Idempotency-Key.
         """
+        from apps.payments.idempotency import idempotent_response
+
+        return idempotent_response(
+            request, 'payments.create_payment_link', request.data,
+            lambda: self._create_payment_link(request)
+        )
+
+    def _create_payment_link(self, request):
         from apps.contracts.models import Contract
 
         contract_id = request.data.get('contract_id')
@@ -175,7 +214,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
             )
 
             return Response({
-                'payment_id': result['payment']['id'],
+                'payment_id': result['payment'].id,
                 'transaction_id': result['payment_id'],
                 'payment_url': result['payment_url'],
                 'gateway': result['gateway'],
@@ -210,46 +249,49 @@ class PaymentViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['get'])
+    def gateway_metrics(self, request):
+        """
+        Метрики HTTP-клиентов платежных шлюзов: пул соединений,
+        состояние circuit breaker, счетчики запросов и повторов.
+        """
+        from apps.payments.gateway_client import gateway_client_metrics
+
+        return Response({'gateways': gateway_client_metrics()})
+
     @action(detail=False, methods=['post'])
     def webhook(self, request):
         """
-        Webhook для обработки callback'ов от платежных шлюзов.
+        Webhook для callback'ов от платежных шлюзов.
+
+        Callback только проверяется и сохраняется в inbox; платеж и баланс
+        обновляет фоновая задача drain_webhook_inbox. Повторный callback
+        (та же транзакция и статус) принимается, но не сохраняется.
 
         Body:
             payment_id: ID платежа в нашей системе или transaction_id
             status: статус платежа ('completed', 'failed')
+            gateway: платежный шлюз ('kaspi', 'halyk', 'default')
             signature: подпись для верификации
             ... другие данные от шлюза
         """
         from apps.payments.payment_gateway import get_payment_gateway
+        from apps.payments.webhook_inbox import ingest_webhook
 
-        payment_id = request.data.get('payment_id')
-        transaction_id = request.data.get('transaction_id', payment_id)
-        signature = request.data.get('signature', '')
+        payload = request.data.dict() if hasattr(request.data, 'dict') else dict(request.data)
+        gateway_name = payload.get('gateway') or 'default'
+        signature = payload.get('signature', '')
 
         # Проверяем подпись
-        gateway = get_payment_gateway()
-        if not gateway.verify_webhook_signature(request.data, signature):
+        gateway = get_payment_gateway(gateway_name)
+        if not gateway.verify_webhook_signature(payload, signature):
             return Response({'error': 'Неверная подпись'}, status=status.HTTP_403_FORBIDDEN)
 
-        # Находим платеж
-        try:
-            if transaction_id:
-                payment = Payment.objects.get(transaction_id=transaction_id)
-            else:
-                payment = Payment.objects.get(id=payment_id)
-        except Payment.DoesNotExist:
-            return Response({'error': 'Платеж не найден'}, status=status.HTTP_404_NOT_FOUND)
-
-        # Обрабатываем callback
-        try:
-            payment.process_gateway_callback(request.data)
+        if not (payload.get('transaction_id') or payload.get('payment_id')):
+            return Response({'error': 'transaction_id или payment_id обязателен'}, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response({
-                'status': 'ok',
-                'payment_id': payment.id,
-                'new_status': payment.status
-            })
-
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        entry = ingest_webhook(payload, gateway=gateway_name)
+        return Response({
+            'status': 'accepted' if entry else 'duplicate',
+            'inbox_id': entry.id if entry else None,
+        }, status=status.HTTP_202_ACCEPTED)
@@ -1,16 +1,18 @@
 """Frontend views для платежей."""
 import random
-import threading
+from datetime import timedelta
 
 from django.views.generic import ListView, DetailView, FormView
-from django.db.models import Q, Sum
 from django.contrib import messages
+from django.http import JsonResponse
+from django.shortcuts import redirect
 from django.urls import reverse_lazy
-from django.db import close_old_connections
+from django.utils import timezone
 
+from apps.payments.aggregates import payment_totals
 from apps.payments.models import Payment
 from apps.payments.forms import PaymentTerminalForm
-from apps.users.permissions import RoleRequiredMixin
+from apps.users.permissions import RoleRequiredMixin, role_required
 
 
 class PaymentListView(ListView):
@@ -31,9 +33,9 @@ class PaymentListView(ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        completed_qs = Payment.objects.filter(status__in=['success', 'completed'])
-        context['total_count'] = completed_qs.count()
-        context['total_amount'] = completed_qs.aggregate(Sum('amount'))['amount__sum'] or 0
+        completed = payment_totals()
+        context['total_count'] = completed['count']
+        context['total_amount'] = completed['amount']
         context['pending_count'] = Payment.objects.filter(status='pending').count()
         context['current_status'] = self.request.GET.get('status', '')
         context['current_type'] = self.request.GET.get('type', '')
@@ -52,45 +54,114 @@ class PaymentTerminalView(RoleRequiredMixin, FormView):
     allowed_roles = ['admin', 'operator', 'supervisor']
     success_url = reverse_lazy('payment_terminal')
 
-    def form_valid(self, form):
-        contract = form.cleaned_data['contract']
-        payment = Payment.objects.create(
-            contract=contract,
-            transaction_type='payment',
-            amount=form.cleaned_data['amount'],
-            status='pending',
-            payment_method='terminal',
-            description=form.cleaned_data.get('description') or 'Пополнение через терминал самообслуживания',
-        )
-        messages.info(
-            self.request,
-            f'Платеж #{payment.id} принят в обработку. Средства будут зачислены в течение 20–30 секунд.'
+    def _idempotency(self):
+        """Область, ключ (скрытое поле формы) и отпечаток запроса."""
+        from apps.payments.idempotency import get_request_key, make_scope, request_fingerprint
+
+        params = {name: self.request.POST.get(name, '') for name in ('phone', 'amount', 'description')}
+        return (
+            make_scope('payments.terminal', self.request.user),
+            get_request_key(self.request),
+            request_fingerprint(params),
         )
-        self._schedule_completion(payment.id)
+
+    def post(self, request, *args, **kwargs):
+        from apps.payments.idempotency import IdempotencyError, find_response
+
+        # Повторная отправка формы: ответ по ключу, без проверки договора
+        scope, key, request_hash = self._idempotency()
+        if key:
+            try:
+                record = find_response(scope, key, request_hash)
+            except IdempotencyError as e:
+                messages.error(request, str(e))
+                return redirect(self.success_url)
+            if record is not None:
+                messages.info(request, f'Платеж #{record.response_body["payment_id"]} уже принят в обработку.')
+                return redirect(self.success_url)
+        return super().post(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        from apps.payments.idempotency import IdempotencyError, execute_once
+
+        def create():
+            # Подтверждение терминала через 20–30 секунд выполнит
+            # периодическая задача confirm_terminal_payments
+            payment = Payment.objects.create(
+                contract=form.cleaned_data['contract'],
+                transaction_type='payment',
+                amount=form.cleaned_data['amount'],
+                status='pending',
+                payment_method='terminal',
+                description=form.cleaned_data.get('description') or 'Пополнение через терминал самообслуживания',
+                confirm_after=timezone.now() + timedelta(seconds=random.randint(20, 30)),
+            )
+            return 201, {'payment_id': payment.id}
+
+        scope, key, request_hash = self._idempotency()
+        try:
+            if key:
+                _, body, replayed = execute_once(scope, key, request_hash, create)
+            else:
+                _, body = create()
+                replayed = False
+        except IdempotencyError as e:
+            messages.error(self.request, str(e))
+            return redirect(self.success_url)
+
+        if replayed:
+            messages.info(self.request, f'Платеж #{body["payment_id"]} уже принят в обработку.')
+        else:
+            messages.info(
+                self.request,
+                f'Платеж #{body["payment_id"]} принят в обработку. Средства будут зачислены в течение 20–30 секунд.'
+            )
         return super().form_valid(form)
 
     def get_context_data(self, **kwargs):
+        import uuid
+
         context = super().get_context_data(**kwargs)
+        # Ключ идемпотентности формы: повторная отправка не создаст второй платеж
+        context['idempotency_key'] = self.request.POST.get('idempotency_key') or uuid.uuid4().hex
         context['recent_terminal_payments'] = Payment.objects.filter(
             payment_method='terminal'
         ).select_related('contract', 'contract__customer').order_by('-payment_date')[:10]
         return context
 
-    def _schedule_completion(self, payment_id):
-        delay = random.randint(20, 30)
 
-        def complete():
-            close_old_connections()
-            try:
-                payment = Payment.objects.get(pk=payment_id)
-            except Payment.DoesNotExist:
-                return
-            if payment.status == 'pending':
-                payment.status = 'success'
-                note = '\nПлатеж подтвержден терминалом.'
-                payment.description = (payment.description or '') + note
-                payment.save(update_fields=['status', 'description'])
-                payment.process()
-            close_old_connections()
-
-        threading.Timer(delay, complete).start()
+# Лента содержит ФИО, телефоны и балансы абонентов всех договоров
+NOTIFICATION_FEED_ROLES = ('admin', 'operator', 'supervisor')
+
+
+@role_required(*NOTIFICATION_FEED_ROLES)
+def notification_feed(request):
+    """
+    Лента уведомлений для опроса из base.html (только сотрудники
+    с ролями NOTIFICATION_FEED_ROLES).
+
+    ?after=<id> — записи новее курсора (не больше 20), без курсора —
+    5 последних. latest_id — курсор для следующего запроса.
+    """
+    from apps.payments.notifications import get_notification_feed
+
+    try:
+        after = int(request.GET.get('after') or 0)
+    except ValueError:
+        after = 0
+
+    if after:
+        entries = get_notification_feed(limit=20, after=after)
+    else:
+        entries = list(reversed(get_notification_feed(limit=5)))
+
+    return JsonResponse({
+        'latest_id': entries[-1]['id'] if entries else after,
+        'entries': [{
+            'id': entry['id'],
+            'channel': entry['channel'],
+            'text': entry['text'][:300],
+            'contract_id': entry['contract_id'],
+            'created_at': entry['timestamp'].isoformat(),
+        } for entry in entries],
+    })
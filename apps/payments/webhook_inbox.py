@@ -0,0 +1,237 @@
+"""
+Асинхронная обработка callback'ов платежных шлюзов.
+
+Вебхук проверяет подпись, записывает сырой callback в inbox
+(WebhookInboxEntry) одним INSERT и сразу отвечает 202. Повтор того же
+callback'а отбрасывается уникальным dedup_key еще при вставке.
+
+Фоновые воркеры разбирают inbox пачками: записи захватываются
+с SKIP LOCKED (несколько воркеров не берут одни и те же строки),
+платежи пачки находятся одним запросом, несколько callback'ов одной
+транзакции сводятся к одному решению. Зачисления применяются через
+apply_completed_payments — баланс каждого договора меняется одним
+UPDATE на пачку, сколько бы платежей по нему ни пришло; отказы —
+одним UPDATE через fail_payments.
+
+Callback, пришедший раньше, чем платеж зафиксирован в базе, остается
+в очереди и повторяется до WEBHOOK_INBOX_MAX_ATTEMPTS раз.
+"""
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.payments.models import Payment, WebhookInboxEntry
+from apps.payments.status_poller import apply_completed_payments, fail_payments
+
+logger = logging.getLogger(__name__)
+
+# Статусы callback'а, которые меняют платеж
+FINAL_EVENT_STATUSES = ('completed', 'failed')
+
+
+def ingest_webhook(payload, gateway=''):
+    """
+    Сохраняет callback в inbox.
+
+    Args:
+        payload: данные callback (dict)
+        gateway: имя шлюза
+
+    Returns:
+        WebhookInboxEntry: новая запись или None, если такой callback уже получен
+    """
+    transaction_id = str(payload.get('transaction_id') or payload.get('payment_id') or '')
+    event_status = str(payload.get('status') or '')
+    entry = WebhookInboxEntry(
+        gateway=(gateway or '').lower(),
+        transaction_id=transaction_id,
+        event_status=event_status,
+        dedup_key=WebhookInboxEntry.make_dedup_key(gateway, transaction_id, event_status),
+        payload=payload,
+    )
+    try:
+        with transaction.atomic():
+            entry.save()
+    except IntegrityError:
+        return None
+    return entry
+
+
+def claim_inbox_batch(batch_size, lease_seconds=None, updated_before=None):
+    """
+    Захватывает пачку необработанных callback'ов.
+
+    Запись, застрявшая в 'processing' дольше аренды (воркер упал),
+    снова доступна для захвата.
+
+    Args:
+        batch_size: размер пачки
+        lease_seconds: срок аренды захваченной записи
+        updated_before: брать только записи, не менявшиеся с этого момента
+                        (чтобы прогон не брал повторно отложенные им же)
+
+    Returns:
+        list: записи в статусе 'processing'
+    """
+    lease_seconds = lease_seconds or getattr(settings, 'WEBHOOK_INBOX_LEASE_SECONDS', 300)
+    now = timezone.now()
+    stale = now - timedelta(seconds=lease_seconds)
+
+    queryset = WebhookInboxEntry.objects.select_for_update(skip_locked=True).filter(
+        Q(status='pending') | Q(status='processing', updated_at__lt=stale)
+    )
+    if updated_before is not None:
+        queryset = queryset.filter(updated_at__lt=updated_before)
+
+    with transaction.atomic():
+        entries = list(queryset.order_by('id')[:batch_size])
+        if entries:
+            WebhookInboxEntry.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+                status='processing', attempts=F('attempts') + 1, updated_at=now
+            )
+    for entry in entries:
+        entry.status = 'processing'
+        entry.attempts += 1
+    return entries
+
+
+def _find_payments(transaction_ids):
+    """Платежи пачки одним запросом: по transaction_id или по id."""
+    numeric_ids = [int(value) for value in transaction_ids if value.isdigit()]
+    payments = Payment.objects.select_related('contract').filter(
+        Q(transaction_id__in=transaction_ids) | Q(pk__in=numeric_ids)
+    )
+    found = {}
+    for payment in payments:
+        if payment.transaction_id:
+            found[payment.transaction_id] = payment
+        found.setdefault(str(payment.pk), payment)
+    return found
+
+
+def process_inbox_batch(entries, max_attempts=None):
+    """
+    Применяет пачку callback'ов.
+
+    Returns:
+        dict: количество completed / failed / duplicate / retry / errors
+    """
+    max_attempts = max_attempts or getattr(settings, 'WEBHOOK_INBOX_MAX_ATTEMPTS', 5)
+    now = timezone.now()
+    counts = {'completed': 0, 'failed': 0, 'duplicate': 0, 'retry': 0, 'errors': 0}
+
+    by_transaction = defaultdict(list)
+    for entry in entries:
+        by_transaction[entry.transaction_id].append(entry)
+    payments = _find_payments(list(by_transaction))
+
+    # Одно решение на транзакцию: 'completed' важнее 'failed',
+    # остальные callback'и той же транзакции — дубликаты
+    decisions = {}
+    to_complete = []
+    to_fail = {}
+    for transaction_id, group in by_transaction.items():
+        payment = payments.get(transaction_id)
+        final = [entry for entry in group if entry.event_status in FINAL_EVENT_STATUSES]
+        decisive = next((entry for entry in final if entry.event_status == 'completed'), None) or \
+            (final[0] if final else None)
+
+        for entry in group:
+            entry.payment = payment
+            if payment is None:
+                if entry.attempts < max_attempts:
+                    entry.status = 'pending'
+                    counts['retry'] += 1
+                else:
+                    entry.status = 'failed'
+                    entry.error = 'Платеж не найден'
+                    counts['errors'] += 1
+            elif entry is not decisive:
+                # Промежуточный статус ('pending') или повтор
+                entry.status = 'processed' if entry.event_status not in FINAL_EVENT_STATUSES else 'duplicate'
+            elif payment.processed_at is not None:
+                entry.status = 'duplicate'
+            else:
+                decisions[payment.pk] = entry
+                if entry.event_status == 'completed' and payment.transaction_type == 'payment' and payment.amount > 0:
+                    to_complete.append(payment)
+                elif entry.event_status == 'completed':
+                    to_fail[payment.pk] = 'Некорректная сумма платежа'
+                else:
+                    to_fail[payment.pk] = entry.payload.get('error') or 'Неизвестная ошибка'
+
+    applied = set()
+    if to_complete:
+        applied = {payment.pk for payment in apply_completed_payments(to_complete, now)}
+    failed = set()
+    if to_fail:
+        candidates = {payment.pk: payment for payment in payments.values() if payment.pk in to_fail}
+        failed = {payment.pk for payment in fail_payments(list(candidates.values()), to_fail, now)}
+
+    for payment_pk, entry in decisions.items():
+        if payment_pk in applied:
+            entry.status = 'processed'
+            counts['completed'] += 1
+        elif payment_pk in failed:
+            entry.status = 'processed'
+            counts['failed'] += 1
+        else:
+            # Платеж успели обработать параллельно (опрос шлюза, терминал)
+            entry.status = 'duplicate'
+
+    for entry in entries:
+        if entry.status == 'duplicate':
+            counts['duplicate'] += 1
+        if entry.status != 'pending':
+            entry.processed_at = now
+        entry.updated_at = now
+
+    WebhookInboxEntry.objects.bulk_update(entries, ['status', 'payment', 'error', 'processed_at', 'updated_at'])
+    return counts
+
+
+def drain_webhook_inbox(batch_size=None, max_batches=None):
+    """
+    Разбирает inbox пачками, пока в нем есть необработанные записи.
+
+    Returns:
+        dict: итоги и тайминги по пачкам
+    """
+    batch_size = max(1, int(batch_size or getattr(settings, 'WEBHOOK_INBOX_BATCH_SIZE', 500)))
+    summary = {'received': 0, 'completed': 0, 'failed': 0, 'duplicate': 0, 'retry': 0, 'errors': 0, 'batches': []}
+    batch_number = 0
+    run_started = timezone.now()
+
+    while max_batches is None or batch_number < max_batches:
+        started = time.monotonic()
+        entries = claim_inbox_batch(batch_size, updated_before=run_started)
+        if not entries:
+            break
+        batch_number += 1
+
+        counts = process_inbox_batch(entries)
+
+        batch = {
+            'batch': batch_number,
+            'size': len(entries),
+            **counts,
+            'total_sec': round(time.monotonic() - started, 3),
+        }
+        summary['batches'].append(batch)
+        summary['received'] += len(entries)
+        for key in counts:
+            summary[key] += counts[key]
+        logger.info(
+            'Inbox вебхуков, пачка %s: %s callback\'ов (зачислено %s, отказ %s, дубликатов %s, '
+            'отложено %s, ошибок %s) за %sс',
+            batch_number, len(entries), counts['completed'], counts['failed'], counts['duplicate'],
+            counts['retry'], counts['errors'], batch['total_sec'],
+        )
+
+    return summary
@@ -215,3 +215,20 @@ class Tariff(models.Model):
             total_cost += data_over * self.data_gb_overage_cost
 
         return total_cost
+
+    def calculate_overage_costs(self, minutes_used, sms_used, data_gb_used):
+        """
+        Пакетный расчет стоимости превышений для многих абонентов тарифа.
+
+        Args:
+            minutes_used: массив использованных минут (по договорам)
+            sms_used: массив использованных SMS
+            data_gb_used: массив использованного трафика в ГБ
+
+        Returns:
+            list[Decimal]: стоимость превышений по каждому договору,
+            округленная до тыйына
+        """
+        from apps.tariffs.rating import rate_overage, tyiyn_to_decimal
+
+        return tyiyn_to_decimal(rate_overage(self, minutes_used, sms_used, data_gb_used))
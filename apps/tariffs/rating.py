@@ -0,0 +1,152 @@
+"""
+Пакетная тарификация превышений лимитов на NumPy.
+
+Tariff.calculate_overage_cost() считает одного абонента в Decimal.
+Здесь потребление целого периода по всем договорам тарифицируется
+за один векторный проход. Чтобы округление оставалось точным, все
+вычисления ведутся в целых числах:
+
+- деньги — в тыйынах (1 сом = 100 тыйын);
+- интернет — в сотых долях МБ (1 ГБ = 1024 МБ): с такой точностью
+  хранится UsageRecord.data_mb, а лимиты тарифа (0.01 ГБ) переводятся
+  без потерь, поэтому превышение считается точно.
+
+Стоимость интернета округляется до тыйына один раз, по правилу
+ROUND_HALF_UP, поэтому совпадает с результатом
+Tariff.calculate_overage_cost(), округленным до тыйына. Минуты и SMS
+тарифицируются точно. Лимит 0 означает безлимит, как и в
+Tariff.calculate_overage_cost().
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+# Точность хранения интернет-трафика: 1/100 МБ
+DATA_UNITS_PER_GB = 1024 * 100
+TYIYN_PER_SOM = 100
+
+
+def _to_int_units(values, units_per_one):
+    """
+    Переводит значения (int/float/Decimal/строки) в целые единицы.
+
+    Decimal и строки переводятся точно (ROUND_HALF_UP), числовые
+    массивы — векторно через np.rint.
+    """
+    array = np.asarray(values)
+    if array.dtype.kind in 'iu':
+        return array.astype(np.int64) * units_per_one
+    if array.dtype.kind == 'f':
+        return np.rint(array * units_per_one).astype(np.int64)
+
+    quantum = Decimal(1)
+    return np.fromiter(
+        (
+            int((Decimal(str(value)) * units_per_one).quantize(quantum, rounding=ROUND_HALF_UP))
+            for value in array.ravel()
+        ),
+        dtype=np.int64,
+        count=array.size,
+    ).reshape(array.shape)
+
+
+def money_to_tyiyn(values):
+    """Суммы в сомах -> целые тыйыны (np.int64)."""
+    return _to_int_units(values, TYIYN_PER_SOM)
+
+
+def data_gb_to_units(values):
+    """
+    Объем в ГБ -> целые сотые доли МБ (np.int64).
+
+    Значения вида data_mb / 1024 переводятся точно; более мелкие доли
+    округляются до точности хранения UsageRecord.data_mb.
+    """
+    return _to_int_units(values, DATA_UNITS_PER_GB)
+
+
+def tyiyn_to_decimal(values):
+    """Массив тыйынов -> список Decimal в сомах с двумя знаками."""
+    return [Decimal(int(value)).scaleb(-2) for value in np.asarray(values).ravel()]
+
+
+def tariff_rating_params(tariffs):
+    """
+    Параметры тарификации для набора тарифов в виде столбцов.
+
+    Returns:
+        dict: имя параметра -> np.ndarray длиной len(tariffs)
+    """
+    tariffs = list(tariffs)
+    return {
+        'minutes_included': np.array([t.minutes_included for t in tariffs], dtype=np.int64),
+        'sms_included': np.array([t.sms_included for t in tariffs], dtype=np.int64),
+        'data_included': data_gb_to_units([t.data_gb_included for t in tariffs]),
+        'minute_price': money_to_tyiyn([t.minute_overage_cost for t in tariffs]),
+        'sms_price': money_to_tyiyn([t.sms_overage_cost for t in tariffs]),
+        'data_price': money_to_tyiyn([t.data_gb_overage_cost for t in tariffs]),
+    }
+
+
+def _overage(used, included):
+    """Превышение лимита; при лимите 0 (безлимит) — ноль."""
+    return np.where(included > 0, np.maximum(used - included, 0), 0)
+
+
+def rate_overage_units(minutes, sms, data_units, params):
+    """
+    Ядро тарификации: все входы — целочисленные массивы одинаковой
+    длины (или скаляры), params — столбцы из tariff_rating_params().
+
+    Returns:
+        np.ndarray: стоимость превышений в тыйынах (np.int64)
+    """
+    minutes = np.asarray(minutes, dtype=np.int64)
+    sms = np.asarray(sms, dtype=np.int64)
+    data_units = np.asarray(data_units, dtype=np.int64)
+
+    minutes_cost = _overage(minutes, params['minutes_included']) * params['minute_price']
+    sms_cost = _overage(sms, params['sms_included']) * params['sms_price']
+
+    # Единственное округление half-up до тыйына в целых числах: (x + D/2) // D
+    data_cost_scaled = _overage(data_units, params['data_included']) * params['data_price']
+    data_cost = (data_cost_scaled + DATA_UNITS_PER_GB // 2) // DATA_UNITS_PER_GB
+
+    return minutes_cost + sms_cost + data_cost
+
+
+def rate_overage(tariff, minutes_used, sms_used, data_gb_used):
+    """
+    Тарификация превышений для многих договоров одного тарифа.
+
+    Args:
+        tariff: объект Tariff
+        minutes_used: массив использованных минут
+        sms_used: массив использованных SMS
+        data_gb_used: массив использованного трафика в ГБ
+
+    Returns:
+        np.ndarray: стоимость превышений в тыйынах (np.int64)
+    """
+    params = {key: value[0] for key, value in tariff_rating_params([tariff]).items()}
+    return rate_overage_units(minutes_used, sms_used, data_gb_to_units(data_gb_used), params)
+
+
+def rate_overage_mixed(tariffs, tariff_ids, minutes_used, sms_used, data_gb_used):
+    """
+    Тарификация превышений для договоров на разных тарифах за один проход.
+
+    Args:
+        tariffs: итерируемое тарифов, на которые ссылается tariff_ids
+        tariff_ids: массив id тарифа для каждой строки потребления
+        minutes_used, sms_used, data_gb_used: массивы потребления
+
+    Returns:
+        np.ndarray: стоимость превышений в тыйынах (np.int64)
+    """
+    tariffs = list(tariffs)
+    params = tariff_rating_params(tariffs)
+    positions = {tariff.id: index for index, tariff in enumerate(tariffs)}
+    rows = np.fromiter((positions[tariff_id] for tariff_id in tariff_ids), dtype=np.intp)
+    row_params = {key: column[rows] for key, column in params.items()}
+    return rate_overage_units(minutes_used, sms_used, data_gb_to_units(data_gb_used), row_params)
@@ -0,0 +1,95 @@
+"""
+Векторная тарификация (rating.py) совпадает с Tariff.calculate_overage_cost(),
+округленным до тыйына, в том числе на границах округления.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.test import SimpleTestCase
+
+from apps.tariffs.models import Tariff
+from apps.tariffs.rating import rate_overage_mixed, tyiyn_to_decimal
+
+MB_PER_GB = Decimal('1024')
+KOPECK = Decimal('0.01')
+
+
+def make_tariff(pk, data_gb_included, data_gb_overage_cost):
+    return Tariff(
+        id=pk,
+        name=f'Тариф {pk}',
+        minutes_included=100,
+        sms_included=50,
+        data_gb_included=Decimal(data_gb_included),
+        minute_overage_cost=Decimal('1.50'),
+        sms_overage_cost=Decimal('1.00'),
+        data_gb_overage_cost=Decimal(data_gb_overage_cost),
+    )
+
+
+class OverageRatingTests(SimpleTestCase):
+    def assertMatchesScalar(self, tariff, minutes, sms, data_gb):
+        vector = tariff.calculate_overage_costs(minutes, sms, data_gb)
+        scalar = [
+            tariff.calculate_overage_cost(m, s, d).quantize(KOPECK, rounding=ROUND_HALF_UP)
+            for m, s, d in zip(minutes, sms, data_gb)
+        ]
+        self.assertEqual(vector, scalar)
+        return vector
+
+    def test_data_rounding_boundaries(self):
+        tariff = make_tariff(1, '5.00', '100.00')
+        data_gb = [
+            Decimal('4.99'), Decimal('5'), Decimal('5.0004'),
+            Decimal('5.0049'), Decimal('5.005'), Decimal('5.0051'),
+        ]
+
+        costs = self.assertMatchesScalar(tariff, [0] * 6, [0] * 6, data_gb)
+
+        self.assertEqual(costs, [
+            Decimal('0.00'), Decimal('0.00'), Decimal('0.04'),
+            Decimal('0.49'), Decimal('0.50'), Decimal('0.51'),
+        ])
+
+    def test_usage_record_data_matches_scalar(self):
+        # Потребление хранится в МБ с точностью 0.01: перебираем каждую
+        # сотую МБ сверх лимита, включая границы половины тыйына
+        for included, price in (('5.00', '100.00'), ('0.01', '123.45'), ('12.34', '9999.99')):
+            with self.subTest(included=included, price=price):
+                tariff = make_tariff(1, included, price)
+                limit = int(Decimal(included) * MB_PER_GB * 100)
+                data_gb = [Decimal(limit + step) / 100 / MB_PER_GB for step in range(-5, 2000)]
+                count = len(data_gb)
+
+                self.assertMatchesScalar(tariff, [0] * count, [0] * count, data_gb)
+
+    def test_minutes_sms_and_unlimited(self):
+        tariff = make_tariff(1, '0.00', '100.00')
+
+        costs = self.assertMatchesScalar(
+            tariff, [99, 100, 130], [50, 60, 0], [Decimal('999'), Decimal('0'), Decimal('1')]
+        )
+
+        self.assertEqual(costs, [Decimal('0.00'), Decimal('10.00'), Decimal('45.00')])
+
+    def test_mixed_tariffs_match_scalar(self):
+        tariffs = [make_tariff(1, '5.00', '100.00'), make_tariff(2, '1.50', '37.77')]
+        rows = [
+            (1, 120, 55, Decimal('5120.05') / MB_PER_GB),
+            (2, 100, 50, Decimal('1536.13') / MB_PER_GB),
+            (1, 0, 0, Decimal('5.0049')),
+            (2, 101, 51, Decimal('2.2222')),
+        ]
+
+        costs = tyiyn_to_decimal(rate_overage_mixed(
+            tariffs,
+            [row[0] for row in rows],
+            [row[1] for row in rows],
+            [row[2] for row in rows],
+            [row[3] for row in rows],
+        ))
+
+        by_id = {tariff.id: tariff for tariff in tariffs}
+        self.assertEqual(costs, [
+            by_id[tariff_id].calculate_overage_cost(m, s, d).quantize(KOPECK, rounding=ROUND_HALF_UP)
+            for tariff_id, m, s, d in rows
+        ])
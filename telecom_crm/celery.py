@@ -35,6 +35,20 @@ app.conf.beat_schedule = {
         'options': {'expires': 3600}  # Задача истекает через 1 час
     },
 
+    # Закрытие периодов потребления (после списания абонплаты)
+    'close-usage-periods-daily': {
+        'task': 'apps.contracts.tasks.close_usage_periods',
+        'schedule': crontab(hour=3, minute=0),
+        'options': {'expires': 3600}
+    },
+
+    # Снимки баланса на начало месяца (1-го числа в 00:30)
+    'snapshot-balances-monthly': {
+        'task': 'apps.contracts.tasks.snapshot_balances',
+        'schedule': crontab(day_of_month=1, hour=0, minute=30),
+        'options': {'expires': 3600}
+    },
+
     # Проверка низких балансов каждые 6 часов
     'check-low-balance-every-6h': {
         'task': 'apps.contracts.tasks.check_and_suspend_low_balance',
@@ -48,6 +62,55 @@ app.conf.beat_schedule = {
         'schedule': crontab(minute='*/15'),
         'options': {'expires': 900}  # Задача истекает через 15 минут
     },
+
+    # Подтверждение платежей терминала каждые 5 секунд
+    'confirm-terminal-payments-every-5s': {
+        'task': 'apps.contracts.tasks.confirm_terminal_payments',
+        'schedule': 5.0,
+        'options': {'expires': 5}
+    },
+
+    # Отправка уведомлений из outbox каждые 10 секунд
+    'dispatch-notifications-every-10s': {
+        'task': 'apps.contracts.tasks.dispatch_notifications',
+        'schedule': 10.0,
+        'options': {'expires': 10}
+    },
+
+    # Ограничение размера ленты уведомлений каждые 5 минут
+    'trim-notification-feed-every-5m': {
+        'task': 'apps.contracts.tasks.trim_notification_feed',
+        'schedule': crontab(minute='*/5'),
+        'options': {'expires': 300}
+    },
+
+    # Очистка отправленных уведомлений (ежедневно в 04:15)
+    'purge-sent-notifications-daily': {
+        'task': 'apps.contracts.tasks.purge_sent_notifications',
+        'schedule': crontab(hour=4, minute=15),
+        'options': {'expires': 3600}
+    },
+
+    # Удаление метрик трафика и сводок старше срока хранения (ежедневно в 04:30)
+    'prune-traffic-metrics-daily': {
+        'task': 'apps.contracts.tasks.prune_traffic_metrics',
+        'schedule': crontab(hour=4, minute=30),
+        'options': {'expires': 3600}
+    },
+
+    # Удаление истекших ключей идемпотентности (ежедневно в 04:00)
+    'purge-idempotency-keys-daily': {
+        'task': 'apps.contracts.tasks.purge_idempotency_keys',
+        'schedule': crontab(hour=4, minute=0),
+        'options': {'expires': 3600}
+    },
+
+    # Разбор inbox callback'ов платежных шлюзов каждые 10 секунд
+    'drain-webhook-inbox-every-10s': {
+        'task': 'apps.contracts.tasks.drain_webhook_inbox',
+        'schedule': 10.0,
+        'options': {'expires': 10}
+    },
 }
 
 # Дополнительные настройки Celery
@@ -105,6 +105,29 @@ else:
         }
     }
 
+# Общий кэш (снимок статистики главной страницы и т.п.).
+# Без CACHE_URL — кэш в памяти процесса (только для разработки:
+# каждый воркер считает статистику сам)
+CACHE_URL = config('CACHE_URL', default='')
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'telecom_crm',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Главная страница: срок жизни снимка статистики, секунд (0 — без кэша)
+DASHBOARD_CACHE_SECONDS = config('DASHBOARD_CACHE_SECONDS', default=15, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -208,6 +231,64 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Биллинг абонентской платы
+BILLING_BULK_MODE = config('BILLING_BULK_MODE', default=True, cast=bool)
+BILLING_CHUNK_SIZE = config('BILLING_CHUNK_SIZE', default=500, cast=int)
+# Параллельный прогон: должники делятся на партиции по id и расходятся по воркерам
+BILLING_PARALLEL = config('BILLING_PARALLEL', default=True, cast=bool)
+BILLING_PARTITION_SIZE = config('BILLING_PARTITION_SIZE', default=20000, cast=int)
+BILLING_MAX_PARTITIONS = config('BILLING_MAX_PARTITIONS', default=8, cast=int)
+BILLING_QUEUE = config('BILLING_QUEUE', default='')
+
+# Загрузка CDR: количество записей в одном пакете тарификации
+CDR_BATCH_SIZE = config('CDR_BATCH_SIZE', default=5000, cast=int)
+
+# Эмулятор трафика: количество договоров в одной транзакции списаний
+EMULATOR_BATCH_SIZE = config('EMULATOR_BATCH_SIZE', default=1000, cast=int)
+
+# Метрики трафика: срок хранения сырых метрик и сводок, дней (0 — хранить всегда)
+TRAFFIC_METRIC_RETENTION_DAYS = config('TRAFFIC_METRIC_RETENTION_DAYS', default=7, cast=int)
+TRAFFIC_ROLLUP_MINUTE_RETENTION_DAYS = config('TRAFFIC_ROLLUP_MINUTE_RETENTION_DAYS', default=14, cast=int)
+TRAFFIC_ROLLUP_HOUR_RETENTION_DAYS = config('TRAFFIC_ROLLUP_HOUR_RETENTION_DAYS', default=180, cast=int)
+TRAFFIC_ROLLUP_DAY_RETENTION_DAYS = config('TRAFFIC_ROLLUP_DAY_RETENTION_DAYS', default=0, cast=int)
+TRAFFIC_METRIC_PRUNE_BATCH_SIZE = config('TRAFFIC_METRIC_PRUNE_BATCH_SIZE', default=5000, cast=int)
+
+# Сверка реестров платежных шлюзов: количество записей в одном пакете
+SETTLEMENT_BATCH_SIZE = config('SETTLEMENT_BATCH_SIZE', default=5000, cast=int)
+
+# Опрос платежного шлюза по ожидающим платежам
+PAYMENT_POLL_BATCH_SIZE = config('PAYMENT_POLL_BATCH_SIZE', default=200, cast=int)
+PAYMENT_POLL_WORKERS = config('PAYMENT_POLL_WORKERS', default=16, cast=int)
+# Через сколько секунд захваченный, но не обработанный платеж снова доступен для опроса
+PAYMENT_POLL_LEASE_SECONDS = config('PAYMENT_POLL_LEASE_SECONDS', default=300, cast=int)
+# Ограничение запросов в секунду на шлюз: 'kaspi:20,halyk:20,default:50'
+PAYMENT_GATEWAY_RATE_LIMITS = config('PAYMENT_GATEWAY_RATE_LIMITS', default='kaspi:20,halyk:20,default:50')
+# Inbox callback'ов шлюзов: размер пачки, число попыток для callback'а
+# без платежа и срок аренды захваченной записи
+WEBHOOK_INBOX_BATCH_SIZE = config('WEBHOOK_INBOX_BATCH_SIZE', default=500, cast=int)
+WEBHOOK_INBOX_MAX_ATTEMPTS = config('WEBHOOK_INBOX_MAX_ATTEMPTS', default=5, cast=int)
+WEBHOOK_INBOX_LEASE_SECONDS = config('WEBHOOK_INBOX_LEASE_SECONDS', default=300, cast=int)
+# Подтверждение платежей терминала: размер пачки
+TERMINAL_CONFIRM_BATCH_SIZE = config('TERMINAL_CONFIRM_BATCH_SIZE', default=500, cast=int)
+# Срок хранения ключей идемпотентности (Idempotency-Key), секунд
+IDEMPOTENCY_KEY_TTL_SECONDS = config('IDEMPOTENCY_KEY_TTL_SECONDS', default=86400, cast=int)
+# HTTP-клиенты шлюзов: адреса провайдеров 'kaspi=https://...,halyk=https://...'
+# (провайдер без адреса работает через встроенную заглушку)
+PAYMENT_GATEWAY_URLS = config('PAYMENT_GATEWAY_URLS', default='')
+PAYMENT_GATEWAY_POOL_SIZE = config('PAYMENT_GATEWAY_POOL_SIZE', default=10, cast=int)
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = config('PAYMENT_GATEWAY_CONNECT_TIMEOUT', default=2.0, cast=float)
+PAYMENT_GATEWAY_READ_TIMEOUT = config('PAYMENT_GATEWAY_READ_TIMEOUT', default=5.0, cast=float)
+PAYMENT_GATEWAY_RETRIES = config('PAYMENT_GATEWAY_RETRIES', default=2, cast=int)
+PAYMENT_GATEWAY_BACKOFF_BASE = config('PAYMENT_GATEWAY_BACKOFF_BASE', default=0.2, cast=float)
+PAYMENT_GATEWAY_BACKOFF_MAX = config('PAYMENT_GATEWAY_BACKOFF_MAX', default=2.0, cast=float)
+# Circuit breaker: ошибок подряд до размыкания и пауза перед пробным запросом
+PAYMENT_GATEWAY_BREAKER_THRESHOLD = config('PAYMENT_GATEWAY_BREAKER_THRESHOLD', default=5, cast=int)
+PAYMENT_GATEWAY_BREAKER_RESET_SECONDS = config('PAYMENT_GATEWAY_BREAKER_RESET_SECONDS', default=30, cast=int)
+# Заглушка шлюза (локальная замена для нагрузочных прогонов)
+PAYMENT_GATEWAY_STUB_LATENCY_MS = config('PAYMENT_GATEWAY_STUB_LATENCY_MS', default=0, cast=int)
+PAYMENT_GATEWAY_STUB_SUCCESS_RATE = config('PAYMENT_GATEWAY_STUB_SUCCESS_RATE', default=0.9, cast=float)
+PAYMENT_GATEWAY_STUB_PENDING_RATE = config('PAYMENT_GATEWAY_STUB_PENDING_RATE', default=0.0, cast=float)
+
 # Email Configuration
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='localhost')
@@ -217,6 +298,25 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@asman-crm.kg')
 
+# Outbox уведомлений: размер пачки, потоки отправки SMS, ограничение
+# отправок в секунду на канал ('email:50,sms:20'), повторы
+NOTIFICATION_BATCH_SIZE = config('NOTIFICATION_BATCH_SIZE', default=200, cast=int)
+NOTIFICATION_DISPATCH_WORKERS = config('NOTIFICATION_DISPATCH_WORKERS', default=8, cast=int)
+NOTIFICATION_RATE_LIMITS = config('NOTIFICATION_RATE_LIMITS', default='email:50,sms:20')
+NOTIFICATION_MAX_ATTEMPTS = config('NOTIFICATION_MAX_ATTEMPTS', default=5, cast=int)
+NOTIFICATION_RETRY_BASE_SECONDS = config('NOTIFICATION_RETRY_BASE_SECONDS', default=30, cast=int)
+NOTIFICATION_LEASE_SECONDS = config('NOTIFICATION_LEASE_SECONDS', default=300, cast=int)
+NOTIFICATION_OUTBOX_RETENTION_DAYS = config('NOTIFICATION_OUTBOX_RETENTION_DAYS', default=30, cast=int)
+# Объединение уведомлений договора по каналу в сводку: окно, секунд (0 — без объединения)
+NOTIFICATION_COALESCE_SECONDS = config('NOTIFICATION_COALESCE_SECONDS', default=30, cast=int)
+# Лимит отправок на договор: 'sms:5/3600,email:20/3600' (N за период в секундах)
+NOTIFICATION_CONTRACT_CAPS = config('NOTIFICATION_CONTRACT_CAPS', default='sms:5/3600,email:20/3600')
+# Лента уведомлений в интерфейсе: максимум записей всего и на договор
+NOTIFICATION_FEED_LIMIT = config('NOTIFICATION_FEED_LIMIT', default=100000, cast=int)
+NOTIFICATION_FEED_CONTRACT_LIMIT = config('NOTIFICATION_FEED_CONTRACT_LIMIT', default=50, cast=int)
+# HTTP API SMS-провайдера (пусто — SMS только пишутся в журнал)
+NOTIFICATION_SMS_URL = config('NOTIFICATION_SMS_URL', default='')
+
 # Security Settings (for production)
 if not DEBUG:
     SECURE_SSL_REDIRECT = True